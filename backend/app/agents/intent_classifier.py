@@ -0,0 +1,307 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from app.config import get_settings
+from app.db.vector_backend import normalize
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, where workers don't share the log safely
+    fcntl = None
+
+settings = get_settings()
+
+INTENTS = ("SEARCH", "GENERAL")
+# Longer questions (e.g. pasted text) are not learned from
+MAX_LEARNED_QUESTION_CHARS = 300
+
+# Starting examples; decisions the LLM makes for unsure questions are added over time
+SEED_EXAMPLES = {
+    "SEARCH": [
+        "What did I write about machine learning?",
+        "Find my notes on databases",
+        "Show me the lecture notes from last week",
+        "Which assignments are due this week?",
+        "When is the project deadline?",
+        "Summarize my notes on operating systems",
+        "What does the statistics chapter say about variance?",
+        "Where did I save the budget report?",
+        "List the tasks from my fitness plan",
+        "Tell me about the research paper on gradient descent",
+        "Do I have anything on personal finance?",
+        "What are the key points of the exam review?",
+        "Explain the database index design from my notes",
+        "Who is presenting at the meeting about the experiment results?",
+        "What's due for CS-101?",
+        "Compare the two network training approaches in my documents",
+        "Give me an overview of my career growth notes",
+        "What were the results of the latency experiment?",
+        "How did I plan the web development project?",
+        "Remind me what the lecture said about caching",
+    ],
+    "GENERAL": [
+        "Hi",
+        "Hello there",
+        "Hey, how are you?",
+        "Good morning",
+        "Thanks!",
+        "Thank you so much",
+        "Who are you?",
+        "What can you do?",
+        "How does this app work?",
+        "Tell me a joke",
+        "Nice, that helps",
+        "Okay",
+        "Bye",
+        "Can you help me?",
+        "What's up?",
+        "I'm feeling tired today",
+        "You're great",
+        "Good night",
+        "How's it going?",
+        "Cool, thanks for the help",
+    ],
+}
+
+
+class IntentClassifier:
+    """
+    Nearest-centroid SEARCH / GENERAL classifier over question embeddings
+
+    Each intent is the normalized mean of its example embeddings. A
+    question gets the intent whose centroid is closest; confidence is the
+    margin between the two cosine similarities, so callers can fall back
+    to the LLM below a threshold. Questions the LLM decides are appended
+    to log_path and folded into the centroids, here and when the log is
+    loaded at startup, so the classifier keeps learning from real traffic.
+
+    Learning is bounded: each intent keeps only its max_learned most
+    recent learned questions next to the seed examples, a question asked
+    again replaces its earlier decision, and the log is compacted to the
+    same entries. A wrong LLM answer is one example among many and ages
+    out instead of steering routing for good.
+    """
+
+    def __init__(self, embedding_function, log_path: str | None = None, max_learned: int = 200):
+        self.embedding_function = embedding_function
+        self.log_path = log_path
+        self.max_learned = max(0, max_learned)
+        self.local_decisions = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+        self._seed_sums = {}
+        self._seed_counts = {}
+        self._learned = {intent: OrderedDict() for intent in INTENTS}  # question key -> embedding
+        self._log_entries = 0
+        self._centroids = None
+
+        for intent, questions in SEED_EXAMPLES.items():
+            vectors = self.embed(questions)
+            self._seed_sums[intent] = vectors.sum(axis=0)
+            self._seed_counts[intent] = len(vectors)
+        logged = self._load_log()
+        if logged:
+            for (question, intent), vector in zip(logged, self.embed([question for question, _ in logged])):
+                self._learn(question, intent, vector)
+        self._update_centroids()
+
+    def embed(self, questions: list[str]) -> np.ndarray:
+        return normalize(np.asarray(self.embedding_function(questions), dtype=np.float32))
+
+    def predict(self, question_embedding: np.ndarray) -> tuple[str, float]:
+        """
+        Classify an embedded question
+
+        Returns:
+            Tuple of (intent, confidence), confidence being the margin
+            between the closest and the other centroid's cosine similarity
+        """
+        query = normalize(np.asarray(question_embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            similarity = self._centroids @ query
+        best = int(np.argmax(similarity))
+        return INTENTS[best], float(similarity[best] - similarity[1 - best])
+
+    def record(self, question: str, question_embedding: np.ndarray, intent: str):
+        """Learn an intent decided elsewhere (the LLM) and log it for the next start"""
+        if not self._learnable(question, intent):
+            return
+        vector = normalize(np.asarray(question_embedding, dtype=np.float32).reshape(1, -1))[0]
+        with self._lock:
+            self._learn(question, intent, vector)
+            self._update_centroids()
+        if self.log_path:
+            try:
+                self._append_log(question, intent)
+            except OSError as e:
+                print(f"✗ Could not log intent decision: {e}")
+
+    def count_decision(self, local: bool):
+        """Count a question decided locally, or one that needed the LLM"""
+        with self._lock:
+            if local:
+                self.local_decisions += 1
+            else:
+                self.fallbacks += 1
+
+    def evaluate(self, examples: list[tuple[str, str]], min_margin: float) -> dict:
+        """
+        Offline accuracy on labelled (question, intent) examples
+
+        Returns:
+            accuracy over all examples, coverage (share decided locally at
+            min_margin) and accuracy over the locally decided ones
+        """
+        if not examples:
+            return {"examples": 0}
+        embeddings = self.embed([question for question, _ in examples])
+        correct = confident = confident_correct = 0
+        for (_, label), embedding in zip(examples, embeddings):
+            intent, margin = self.predict(embedding)
+            correct += intent == label
+            if margin >= min_margin:
+                confident += 1
+                confident_correct += intent == label
+        return {
+            "examples": len(examples),
+            "accuracy": round(correct / len(examples), 3),
+            "coverage": round(confident / len(examples), 3),
+            "confident_accuracy": round(confident_correct / confident, 3) if confident else None
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            examples = {intent: self._seed_counts[intent] + len(self._learned[intent]) for intent in INTENTS}
+            local, fallbacks = self.local_decisions, self.fallbacks
+        decisions = local + fallbacks
+        return {
+            "examples": examples,
+            "local_decisions": local,
+            "llm_fallbacks": fallbacks,
+            "local_rate": local / decisions if decisions else 0.0
+        }
+
+    def _learnable(self, question, intent) -> bool:
+        return (
+            self.max_learned > 0
+            and intent in INTENTS
+            and isinstance(question, str)
+            and 0 < len(question.strip()) <= MAX_LEARNED_QUESTION_CHARS
+        )
+
+    def _learn(self, question: str, intent: str, vector: np.ndarray):
+        key = question_key(question)
+        for learned in self._learned.values():
+            learned.pop(key, None)
+        learned = self._learned[intent]
+        learned[key] = vector
+        while len(learned) > self.max_learned:
+            learned.popitem(last=False)
+
+    def _update_centroids(self):
+        centroids = []
+        for intent in INTENTS:
+            learned = list(self._learned[intent].values())
+            total = self._seed_sums[intent] + (np.sum(learned, axis=0) if learned else 0.0)
+            centroids.append(total / (self._seed_counts[intent] + len(learned)))
+        self._centroids = normalize(np.stack(centroids))
+
+    def _compact(self, entries: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """The entries learning keeps: the latest decision per question, max_learned per intent"""
+        latest = {}
+        for question, intent in entries:
+            if self._learnable(question, intent):
+                key = question_key(question)
+                latest.pop(key, None)
+                latest[key] = (question, intent)
+        kept = []
+        counts = dict.fromkeys(INTENTS, 0)
+        for question, intent in reversed(list(latest.values())):
+            if counts[intent] < self.max_learned:
+                counts[intent] += 1
+                kept.append((question, intent))
+        return kept[::-1]
+
+    def _load_log(self) -> list[tuple[str, str]]:
+        """Learned entries from the log, compacting it when it holds more"""
+        if not self.log_path or self.max_learned == 0 or not os.path.exists(self.log_path):
+            return []
+        try:
+            with _locked_log(self.log_path) as log:
+                entries = _read_entries(log)
+                kept = self._compact(entries)
+                if len(kept) < len(entries):
+                    _rewrite(log, kept)
+        except OSError as e:
+            print(f"✗ Could not read the intent log: {e}")
+            return []
+        self._log_entries = len(kept)
+        return kept
+
+    def _append_log(self, question: str, intent: str):
+        """Append a decision, compacting the log once it has grown well past what learning keeps"""
+        with _locked_log(self.log_path) as log:
+            log.write(json.dumps({"question": question, "intent": intent}) + "\n")
+            self._log_entries += 1
+            if self._log_entries > 2 * self.max_learned * len(INTENTS):
+                log.flush()
+                kept = self._compact(_read_entries(log))
+                _rewrite(log, kept)
+                self._log_entries = len(kept)
+
+
+def question_key(question: str) -> str:
+    """Questions differing only in case or spacing are the same example"""
+    return " ".join(question.lower().split())
+
+
+@contextmanager
+def _locked_log(path: str):
+    """The log opened for reading and appending, under an exclusive lock shared by all workers"""
+    with open(path, "a+", encoding="utf-8") as log:
+        if fcntl is not None:
+            fcntl.flock(log, fcntl.LOCK_EX)
+        yield log  # Closing the file releases the lock
+
+
+def _read_entries(log) -> list[tuple[str, str]]:
+    log.seek(0)
+    entries = []
+    for line in log:
+        try:
+            entry = json.loads(line)
+            entries.append((entry["question"], entry["intent"]))
+        except (ValueError, KeyError, TypeError):
+            continue  # A line cut short by a crash
+    return entries
+
+
+def _rewrite(log, entries: list[tuple[str, str]]):
+    log.seek(0)
+    log.truncate()
+    log.writelines(json.dumps({"question": question, "intent": intent}) + "\n" for question, intent in entries)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(embedding_function) -> IntentClassifier:
+    """Get the process-wide intent classifier for an embedding function"""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None or _classifier.embedding_function is not embedding_function:
+            _classifier = IntentClassifier(
+                embedding_function,
+                settings.intent_log_path,
+                max_learned=settings.intent_max_learned
+            )
+        return _classifier
+
+
+def get_intent_stats() -> dict | None:
+    """Statistics of the intent classifier, if one was loaded in this process"""
+    return _classifier.stats() if _classifier is not None else None
@@ -1,21 +1,48 @@
-from groq import Groq
+from app.agents.intent_classifier import INTENTS, get_intent_classifier
 from app.config import get_settings
+from app.utils.llm_client import chat_completion
+from app.utils.llm_scheduler import INTERACTIVE
 
 settings = get_settings()
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
 
-
-def route_intent(question: str) -> str:
+def route_intent(question: str, vector_store=None, question_embedding=None) -> str:
     """
     Route user question to appropriate agent
     
+    With the intent classifier enabled (and a vector store to embed with),
+    the question is classified locally from its embedding; only when the
+    classifier is unsure does the LLM decide, and the classifier learns
+    from its answer when it is exactly one intent. Otherwise a keyword
+    check runs first and the LLM decides the rest.
+    
+    Args:
+        question: User question
+        vector_store: VectorStore whose embedding function embeds the question
+        question_embedding: The question's embedding, if already computed
+    
     Returns:
         "SEARCH" - Query requires document search
         "GENERAL" - General conversation
     """
+    if settings.intent_classifier_enabled and vector_store is not None:
+        classifier = get_intent_classifier(vector_store.embedding_function)
+        if question_embedding is None:
+            question_embedding = vector_store.embed([question])[0]
+        intent, confidence = classifier.predict(question_embedding)
+        if confidence >= settings.intent_min_margin:
+            classifier.count_decision(local=True)
+            return intent
+        
+        classifier.count_decision(local=False)
+        answer = ask_llm_intent(question)
+        if answer is None:
+            return "SEARCH"  # Default to search
+        if answer in INTENTS:
+            # Anything but a clean label is still routed, but not learned from
+            classifier.record(question, question_embedding, answer)
+        return intent_from_answer(answer)
+    
     # Quick keyword check first
     search_keywords = ["find", "search", "show me", "what", "where", "which", "list", "tell me about"]
     question_lower = question.lower()
@@ -25,7 +52,21 @@ def route_intent(question: str) -> str:
             return "SEARCH"
     
     # Use LLM for ambiguous cases
-    client = get_groq_client()
+    return classify_with_llm(question) or "SEARCH"  # Default to search
+
+
+def classify_with_llm(question: str) -> str | None:
+    """Ask the LLM for the question's intent; None if the call fails"""
+    answer = ask_llm_intent(question)
+    return intent_from_answer(answer) if answer is not None else None
+
+
+def intent_from_answer(answer: str) -> str:
+    return "SEARCH" if "SEARCH" in answer else "GENERAL"
+
+
+def ask_llm_intent(question: str) -> str | None:
+    """The LLM's answer to the routing prompt, upper-cased without quotes or a full stop; None if the call fails"""
     prompt = f"""Classify this user question into one category:
 - SEARCH: User wants to find information from their documents
 - GENERAL: General conversation or greeting
@@ -35,16 +76,17 @@ Question: {question}
 Return ONLY "SEARCH" or "GENERAL", nothing else."""
     
     try:
-        response = client.chat.completions.create(
+        response = chat_completion(
+            "route_intent:v1",
+            priority=INTERACTIVE,
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.1,
             max_tokens=10
         )
         
-        result = response.choices[0].message.content.strip().upper()
-        return "SEARCH" if "SEARCH" in result else "GENERAL"
+        return response.strip().strip("\"'.").upper()
     
     except Exception as e:
         print(f"Router error: {e}")
-        return "SEARCH"  # Default to search
+        return None
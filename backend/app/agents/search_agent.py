@@ -1,56 +1,279 @@
-from groq import Groq
+import time
+import numpy as np
+from sqlalchemy import select
 from app.config import get_settings
+from app.db.document_index import get_document_index, metadata_timestamp
+from app.db.lexical_index import get_lexical_index
+from app.db.sql_models import DocTopicMap
+from app.db.sql_session import engine
+from app.utils.context_packer import pack_context
+from app.utils.llm_client import chat_completion
+from app.utils.llm_scheduler import INTERACTIVE
+from app.utils.mmr import mmr_select
 
 settings = get_settings()
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+# Reciprocal rank fusion constant: larger values flatten the weight of top ranks
+RRF_K = 60
+# Candidates each retriever contributes to fusion, per requested chunk
+FUSION_DEPTH = 4
+# Document ids start at 1, so a filter on this one matches nothing
+NO_DOCUMENT = 0
 
+RAG_ERROR_ANSWER = "I encountered an error generating the answer. Please try again."
 
-def search_documents(vector_store, question: str, top_k: int = 5) -> dict:
+
+def search_documents(
+    vector_store,
+    question: str,
+    top_k: int | None = None,
+    filters=None,
+    retrieval_mode: str | None = None,
+    query_embedding=None
+) -> dict:
     """
-    Search documents using vector similarity and generate answer
+    Search documents and generate an answer from the retrieved chunks
+    
+    With mmr_enabled, mmr_fetch_k candidates are retrieved along with their
+    embeddings and the final top_k are picked by Maximal Marginal
+    Relevance, so one long document can't fill every slot.
     
     Args:
-        vector_store: ChromaDB collection
+        vector_store: VectorStore
         question: User question
-        top_k: Number of chunks to retrieve
+        top_k: Number of chunks to retrieve (defaults to settings.rag_top_k)
+        filters: Optional ChatFilters limiting which documents are searched
+        retrieval_mode: "vector", "lexical" or "hybrid" (defaults to settings.retrieval_mode)
+        query_embedding: The question's embedding, if already computed
     
     Returns:
-        Dictionary with answer and source document IDs
+        Dictionary with answer, source document IDs, context token counts
+        and per-stage timings in milliseconds
     """
-    # Query vector store
-    results = vector_store.query(
-        query_texts=[question],
-        n_results=top_k
-    )
+    top_k = top_k or settings.rag_top_k
+    where = build_where(filters)
+    timings = {}
+    
+    start = time.perf_counter()
+    if settings.mmr_enabled:
+        if query_embedding is None:
+            query_embedding = vector_store.embed([question])[0]
+            start = _record_stage(timings, "embed_ms", start)
+        candidates = retrieve_chunks(
+            vector_store,
+            question,
+            max(settings.mmr_fetch_k, top_k),
+            where,
+            retrieval_mode,
+            include_embeddings=True,
+            query_embedding=query_embedding
+        )
+        start = _record_stage(timings, "retrieve_ms", start)
+        hits = diversify(candidates, query_embedding, top_k, settings.mmr_diversity)
+        start = _record_stage(timings, "mmr_ms", start)
+    else:
+        hits = retrieve_chunks(vector_store, question, top_k, where, retrieval_mode, query_embedding=query_embedding)
+        start = _record_stage(timings, "retrieve_ms", start)
     
-    if not results["documents"] or not results["documents"][0]:
+    if not hits:
         return {
             "answer": "I couldn't find any relevant information in your documents.",
-            "sources": []
+            "sources": [],
+            "timings": timings
         }
     
-    # Extract chunks and metadata
-    chunks = results["documents"][0]
-    metadatas = results["metadatas"][0]
-    
-    # Build context from retrieved chunks
-    context = "\n\n".join([f"[Chunk {i+1}]: {chunk}" for i, chunk in enumerate(chunks)])
-    
-    # Extract unique document IDs
-    doc_ids = list(set([meta["document_id"] for meta in metadatas]))
+    # Build context from retrieved chunks: no duplicates or repeated overlap, within the token budget
+    context = pack_context(hits, settings.context_token_budget)
+    start = _record_stage(timings, "pack_ms", start)
     
     # Generate answer using RAG
-    answer = generate_rag_answer(question, context)
+    answer = generate_rag_answer(question, context.text)
+    _record_stage(timings, "generate_ms", start)
     
     return {
         "answer": answer,
-        "sources": doc_ids
+        "sources": context.document_ids,
+        "context_tokens": context.tokens,
+        "context_tokens_saved": context.tokens_saved,
+        "timings": timings
     }
 
 
+def _record_stage(timings: dict, stage: str, start: float) -> float:
+    """Record the milliseconds since start under stage and return the new start"""
+    now = time.perf_counter()
+    timings[stage] = round((now - start) * 1000, 2)
+    return now
+
+
+def diversify(hits: list, query_embedding, top_k: int, diversity: float) -> list:
+    """
+    Rerank candidates by Maximal Marginal Relevance
+    
+    Args:
+        hits: SearchHit candidates with embeddings
+        query_embedding: Query vector
+        top_k: Number of hits to keep
+        diversity: Weight of redundancy against relevance, 0 to 1
+    
+    Returns:
+        Up to top_k SearchHit in pick order
+    """
+    if len(hits) <= 1 or any(hit.embedding is None for hit in hits):
+        return hits[:top_k]
+    picked = mmr_select(query_embedding, np.stack([hit.embedding for hit in hits]), top_k, diversity)
+    return [hits[i] for i in picked]
+
+
+def retrieve_chunks(
+    vector_store,
+    question: str,
+    top_k: int,
+    where: dict | None = None,
+    mode: str | None = None,
+    include_embeddings: bool = False,
+    query_embedding=None
+) -> list:
+    """
+    Retrieve the chunks most relevant to a question
+    
+    "vector" ranks by embedding similarity (through the closest documents
+    on large corpora), "lexical" by BM25 over the chunk text, and
+    "hybrid" fuses both rankings by reciprocal rank, so exact identifiers
+    and names are found even when their embeddings aren't close.
+    
+    Args:
+        vector_store: VectorStore
+        question: User question
+        top_k: Number of chunks to retrieve
+        where: Optional metadata filter
+        mode: Retrieval mode (defaults to settings.retrieval_mode)
+        include_embeddings: Load each hit's stored embedding too
+        query_embedding: The question's embedding, if already computed
+    
+    Returns:
+        List of SearchHit, best first; in hybrid mode score is the fused score
+    """
+    mode = mode or settings.retrieval_mode
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode: {mode}")
+    
+    def vector_search(depth: int) -> list:
+        return get_document_index(vector_store).search(
+            question,
+            depth,
+            where=where,
+            include_embeddings=include_embeddings,
+            query_embedding=query_embedding
+        )
+    
+    if mode == "vector":
+        return vector_search(top_k)
+    if mode == "lexical":
+        return lexical_search(vector_store, question, top_k, where, include_embeddings)
+    
+    depth = top_k * FUSION_DEPTH
+    rankings = [
+        vector_search(depth),
+        lexical_search(vector_store, question, depth, where, include_embeddings)
+    ]
+    return reciprocal_rank_fusion(rankings, top_k)
+
+
+def lexical_search(
+    vector_store,
+    question: str,
+    top_k: int,
+    where: dict | None = None,
+    include_embeddings: bool = False
+) -> list:
+    """BM25 matches from the lexical index, loaded from the vector store and filtered by where"""
+    # Over-fetch when filtering, as the index can't apply metadata filters itself
+    matches = get_lexical_index(vector_store).search(question, top_k * FUSION_DEPTH if where else top_k)
+    if not matches:
+        return []
+    
+    hits = {
+        hit.id: hit for hit in vector_store.get(
+            ids=[chunk_id for chunk_id, _ in matches],
+            where=where,
+            include_embeddings=include_embeddings
+        )
+    }
+    ranked = []
+    for chunk_id, score in matches:
+        hit = hits.get(chunk_id)
+        if hit is not None:
+            hit.score = score
+            ranked.append(hit)
+    return ranked[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: list[list], top_k: int) -> list:
+    """
+    Merge rankings by summing 1 / (RRF_K + rank) per chunk
+    
+    Args:
+        rankings: Lists of SearchHit, each best first
+        top_k: Number of hits to return
+    
+    Returns:
+        Up to top_k SearchHit, best first, with the fused score
+    """
+    scores, hits = {}, {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            scores[hit.id] = scores.get(hit.id, 0.0) + 1.0 / (RRF_K + rank)
+            hits.setdefault(hit.id, hit)
+    
+    fused = sorted(scores, key=scores.get, reverse=True)[:top_k]
+    for chunk_id in fused:
+        hits[chunk_id].score = scores[chunk_id]
+    return [hits[chunk_id] for chunk_id in fused]
+
+
+def build_where(filters) -> dict | None:
+    """
+    Translate ChatFilters into a vector store where filter on chunk metadata
+    
+    Topics are looked up in doc_topic_map and become a document_id filter,
+    so chunks carry no per-topic fields.
+    
+    Args:
+        filters: ChatFilters or None
+    
+    Returns:
+        where filter, or None when nothing is filtered
+    """
+    if filters is None:
+        return None
+    
+    clauses = []
+    if filters.para_types:
+        clauses.append({"para_type": {"$in": filters.para_types}})
+    if filters.created_after:
+        clauses.append({"created_at": {"$gte": metadata_timestamp(filters.created_after)}})
+    if filters.created_before:
+        clauses.append({"created_at": {"$lte": metadata_timestamp(filters.created_before)}})
+    if filters.document_ids:
+        clauses.append({"document_id": {"$in": filters.document_ids}})
+    if filters.topic_ids:
+        clauses.append({"document_id": {"$in": topic_document_ids(filters.topic_ids) or [NO_DOCUMENT]}})
+    
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def topic_document_ids(topic_ids: list[int]) -> list[int]:
+    """Ids of the documents linked to any of these topics"""
+    with engine.connect() as conn:
+        return list(conn.execute(
+            select(DocTopicMap.doc_id).where(DocTopicMap.topic_id.in_(topic_ids)).distinct()
+        ).scalars())
+
+
 def generate_rag_answer(question: str, context: str) -> str:
     """
     Generate answer using retrieved context
@@ -74,16 +297,15 @@ Question: {question}
 Answer:"""
     
     try:
-        client = get_groq_client()
-        response = client.chat.completions.create(
+        return chat_completion(
+            "rag_answer:v1",
+            priority=INTERACTIVE,
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.5,
             max_tokens=500
         )
-        
-        return response.choices[0].message.content.strip()
     
     except Exception as e:
         print(f"RAG generation error: {e}")
-        return "I encountered an error generating the answer. Please try again."
+        return RAG_ERROR_ANSWER
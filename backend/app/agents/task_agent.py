@@ -1,14 +1,10 @@
-from groq import Groq
 from app.config import get_settings
 from app.utils.date_extract import extract_first_date
+from app.utils.llm_client import chat_completion
 import json
 
 settings = get_settings()
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
-
 
 def extract_tasks(text: str, document_id: int) -> list[dict]:
     """
@@ -39,16 +35,14 @@ Example output:
 Return ONLY the JSON array, nothing else."""
     
     try:
-        client = get_groq_client()
-        response = client.chat.completions.create(
+        result = chat_completion(
+            "extract_tasks:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=500
         )
         
-        result = response.choices[0].message.content.strip()
-        
         # Clean up the response - remove markdown code blocks if present
         if result.startswith("```"):
             result = result.split("```")[1]
@@ -68,30 +62,7 @@ Return ONLY the JSON array, nothing else."""
         if not isinstance(tasks_raw, list):
             return []
         
-        # Process tasks and extract dates
-        tasks = []
-        for task_raw in tasks_raw:
-            if not isinstance(task_raw, dict):
-                continue
-                
-            title = task_raw.get("title", "").strip()
-            if not title:
-                continue
-            
-            # Extract due date
-            due_date = None
-            due_date_text = task_raw.get("due_date_text")
-            if due_date_text:
-                due_date = extract_first_date(due_date_text)
-            
-            tasks.append({
-                "title": title,
-                "due_date": due_date,
-                "status": "pending",
-                "document_id": document_id
-            })
-        
-        return tasks
+        return normalize_tasks(tasks_raw, document_id)
     
     except json.JSONDecodeError as e:
         print(f"Task extraction JSON error: {e}")
@@ -100,3 +71,39 @@ Return ONLY the JSON array, nothing else."""
     except Exception as e:
         print(f"Task extraction error: {e}")
         return []
+
+
+def normalize_tasks(tasks_raw: list, document_id: int) -> list[dict]:
+    """
+    Turn raw LLM task objects into task dictionaries
+    
+    Args:
+        tasks_raw: List of {"title", "due_date_text"} objects
+        document_id: ID of source document
+    
+    Returns:
+        List of task dictionaries with title, due_date, status
+    """
+    tasks = []
+    for task_raw in tasks_raw:
+        if not isinstance(task_raw, dict):
+            continue
+        
+        title = (task_raw.get("title") or "").strip()
+        if not title:
+            continue
+        
+        # Extract due date
+        due_date = None
+        due_date_text = task_raw.get("due_date_text")
+        if due_date_text and due_date_text != "null":
+            due_date = extract_first_date(due_date_text)
+        
+        tasks.append({
+            "title": title,
+            "due_date": due_date,
+            "status": "pending",
+            "document_id": document_id
+        })
+    
+    return tasks
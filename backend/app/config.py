@@ -5,12 +5,114 @@ from functools import lru_cache
 class Settings(BaseSettings):
     database_url: str = "sqlite:///./personalmind.db"
     chroma_persist_dir: str = "./chroma_data"
+    chroma_mode: str = "embedded"  # "embedded" (in-process, one API worker) or "server" (shared server, any number of workers)
+    chroma_server_host: str = "127.0.0.1"
+    chroma_server_port: int = 8001
+    chroma_server_autostart: bool = True  # Start a server on chroma_persist_dir when none answers
+    leader_lock_path: str = "./personalmind.leader.lock"  # Only the worker holding it runs the scheduler
     collection_name: str = "pm_chunks"
+    vector_backend: str = "chroma"  # "chroma" or "numpy" (in-process exact search, one API worker)
+    numpy_store_dir: str = "./vector_data"
+    # "none" or "int8" (int8 scan, float re-scoring) converts collection_name; empty keeps its stored mode
+    numpy_store_quantization: str = ""
     groq_api_key: str = ""
-    chunk_size: int = 500
+    groq_base_url: str = ""  # Override the Groq API endpoint (e.g. a local fake server)
+    chunk_strategy: str = "fixed"  # "fixed" (character windows) or "structured" (sentence/paragraph/heading aware)
+    chunk_max_tokens: int = 200  # Token budget per structured chunk
+    chunk_overlap_tokens: int = 32  # Largest sentence repeated between structured chunks
+    chunk_size: int = 500  # Characters per fixed chunk
     chunk_overlap: int = 50
     knowledge_base_folder: str = ""  # Path to local folder with documents
     
+    # Bulk ingestion pipeline
+    ingest_parse_workers: int = 0  # Parser processes (0 = one per CPU core)
+    ingest_llm_workers: int = 4  # Concurrent LLM enrichment calls
+    ingest_embed_batch_size: int = 256  # Chunks per ChromaDB write
+    ingest_embed_flush_seconds: float = 0.5  # Longest a chunk waits for its batch to fill
+    
+    # Two-stage retrieval (closest documents by centroid, then their chunks)
+    two_stage_search: bool = True
+    two_stage_min_chunks: int = 50000  # Smaller corpora are searched flat
+    two_stage_top_documents: int = 20  # Documents whose chunks the second stage searches
+    
+    # Retrieval: "vector", "lexical" (BM25 full-text) or "hybrid" (both, fused by reciprocal rank)
+    retrieval_mode: str = "vector"
+    lexical_index_path: str = "./lexical_index.db"
+    
+    # Answer context: chunks retrieved per question, packed best first into a token budget
+    rag_top_k: int = 5
+    # Estimated prompt tokens of retrieved context, sized to hold rag_top_k full structured chunks
+    context_token_budget: int = 1000
+    
+    # Diversity reranking: pick the final chunks from mmr_fetch_k candidates by Maximal Marginal Relevance
+    mmr_enabled: bool = False
+    mmr_fetch_k: int = 30
+    mmr_diversity: float = 0.3  # 0 = relevance only, 1 = novelty only
+    
+    # Answer cache (/ask search answers reused for near-identical questions until the knowledge base changes)
+    answer_cache_enabled: bool = False
+    answer_cache_threshold: float = 0.95  # Cosine similarity between question embeddings
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_max_mb: float = 32.0  # Per worker
+    
+    # Intent routing: local nearest-centroid classifier, with the LLM deciding only unsure questions
+    intent_classifier_enabled: bool = False
+    intent_min_margin: float = 0.05  # Cosine similarity margin between intents needed to skip the LLM
+    intent_log_path: str = "./intent_log.jsonl"  # LLM decisions the classifier learns from
+    intent_max_learned: int = 200  # Most recent LLM decisions kept per intent, in memory and in the log (0 = don't learn)
+    
+    # Parser sandbox (worker processes shared by uploads and bulk ingestion)
+    parse_timeout_seconds: float = 120.0  # Wall time a file may spend waiting on its parser
+    parse_cpu_seconds: int = 60  # CPU time per file before the worker is killed
+    parse_memory_mb: int = 1024  # Address space limit per worker (0 = unlimited)
+    parse_max_file_mb: int = 100  # Larger files are rejected without parsing
+    parse_max_tasks_per_worker: int = 50  # Recycle workers after this many files
+    
+    # Embedding cache (skips re-embedding boilerplate and re-ingested chunks)
+    embedding_cache_enabled: bool = True
+    embedding_cache_dir: str = "./embedding_cache"
+    embedding_cache_max_entries: int = 200000  # ~300 MB of vectors at 384 dimensions
+    
+    # Embedding service (one model process shared by all API workers)
+    embedding_service_mode: str = "off"  # "off" (embed in-process), "auto" (start it when missing) or "external" (connect only)
+    embedding_service_socket: str = "./embedding.sock"
+    embedding_service_max_batch: int = 64  # Texts per model call when coalescing requests
+    embedding_service_max_wait_ms: float = 0.0  # Extra wait for requests to batch with (0 = batch whatever queued while the model was busy)
+    embedding_service_idle_seconds: float = 600.0  # An auto-started service exits after this long without clients
+    embedding_service_timeout_seconds: float = 120.0
+    embedding_threads: int = 0  # ONNX inference threads (0 = onnxruntime default, one per core)
+    
+    # Shared LLM client
+    llm_max_concurrency: int = 8  # Requests in flight per process
+    llm_max_connections: int = 20  # Pooled keep-alive HTTP connections
+    llm_timeout_seconds: float = 30.0
+    
+    # LLM rate limiting. Defaults are Groq's free-tier limits for llama-3.1-8b-instant; set your plan's.
+    # Shared limits are kept in the database and hold across all API workers together; with
+    # llm_shared_rate_limits=False each worker process enforces the full limits on its own
+    llm_requests_per_minute: int = 30
+    llm_tokens_per_minute: int = 6000
+    llm_shared_rate_limits: bool = True
+    llm_interactive_reserve: float = 0.2  # Share of each limit background work may not use
+    llm_max_retries: int = 3  # Retries after a 429
+    
+    # Background job queue
+    job_workers: int = 2
+    job_max_attempts: int = 3
+    job_retry_delay_seconds: float = 10.0  # Multiplied by the attempt number
+    job_poll_interval_seconds: float = 1.0
+    job_heartbeat_seconds: float = 10.0  # How often a process marks the jobs it runs as alive
+    job_heartbeat_timeout_seconds: float = 60.0  # Running jobs silent this long are requeued
+    
+    # LLM enrichment: "separate" (three calls) or "combined" (one structured call), to A/B test them
+    llm_enrichment_mode: str = "separate"
+    
+    # Disk-backed cache for deterministic LLM completions
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = "./llm_cache.db"
+    llm_cache_max_entries: int = 20000
+    llm_cache_max_temperature: float = 0.3  # Only calls at or below this are cached
+    
     # S3 Configuration
     s3_bucket_name: str = ""
     aws_region: str = "us-east-1"
@@ -0,0 +1,39 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.db.sql_models import DataVersion
+from app.db.sql_session import engine
+
+ROW_ID = 1
+
+
+def get_data_version() -> int:
+    """Current version of the knowledge base's searchable content"""
+    with engine.connect() as conn:
+        version = conn.execute(select(DataVersion.version).where(DataVersion.id == ROW_ID)).scalar()
+    return version or 0
+
+
+def bump_data_version() -> int:
+    """
+    Move the data version on after documents were added, replaced or deleted
+
+    Kept in the database so every API worker sees the change.
+
+    Returns:
+        The new version
+    """
+    for _ in range(2):
+        try:
+            with engine.begin() as conn:
+                updated = conn.execute(
+                    update(DataVersion)
+                    .where(DataVersion.id == ROW_ID)
+                    .values(version=DataVersion.version + 1)
+                ).rowcount
+                if not updated:
+                    conn.execute(insert(DataVersion).values(id=ROW_ID, version=1))
+                return conn.execute(select(DataVersion.version).where(DataVersion.id == ROW_ID)).scalar()
+        except IntegrityError:
+            # Another worker created the row first; increment it instead
+            continue
+    raise RuntimeError("Could not update the data version")
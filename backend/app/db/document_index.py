@@ -0,0 +1,156 @@
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from app.config import get_settings
+from app.db.vector_backend import SearchHit, VectorStore, normalize
+
+settings = get_settings()
+
+# Metadata every chunk carries about its document; centroids carry the same,
+# so where filters on these work in both stages
+DOCUMENT_FIELDS = ("document_id", "title", "para_type", "storage_type", "created_at")
+# Bumped when document-level metadata changes; older documents are re-indexed at startup
+INDEX_VERSION = 2
+
+
+def document_key(document_id: int) -> str:
+    return f"doc_{document_id}"
+
+
+def metadata_timestamp(value: datetime) -> int:
+    """Unix seconds for metadata; naive datetimes are UTC, as SQLite stores them"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def is_document_filter(where: dict) -> bool:
+    """Whether a where filter only uses document-level fields"""
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            if not all(is_document_filter(clause) for clause in condition):
+                return False
+        elif key not in DOCUMENT_FIELDS:
+            return False
+    return True
+
+
+class DocumentIndex:
+    """
+    One centroid embedding per document, for two-stage retrieval
+
+    A document's centroid is the normalized mean of its stored chunk
+    embeddings, kept in a sibling store named "<chunk store>_docs". Once
+    the chunk store holds min_chunks chunks, search() first picks the
+    top_documents documents closest to the query, then searches only
+    their chunks through a document_id filter; below that a flat search
+    is cheap enough and exact. Centroids are maintained even while
+    two-stage search is disabled, so it can be switched on at any time.
+    """
+
+    def __init__(self, chunk_store: VectorStore, enabled: bool, min_chunks: int, top_documents: int):
+        self.chunk_store = chunk_store
+        self.store = chunk_store.open_sibling(f"{chunk_store.name}_docs")
+        self.enabled = enabled
+        self.min_chunks = min_chunks
+        self.top_documents = top_documents
+
+    def update(self, document_id: int, metadata: dict):
+        """
+        (Re)compute a document's centroid from its chunks in the chunk store
+
+        Args:
+            document_id: Document ID
+            metadata: The document-level metadata its chunks carry
+        """
+        vectors = self.chunk_store.get_embeddings({"document_id": document_id})
+        if len(vectors) == 0:
+            self.delete(document_id)
+            return
+        centroid = normalize(normalize(vectors).mean(axis=0, keepdims=True))
+        self.store.add(
+            ids=[document_key(document_id)],
+            documents=[metadata.get("title") or ""],
+            metadatas=[{**metadata, "chunks": len(vectors), "index_version": INDEX_VERSION}],
+            embeddings=centroid
+        )
+
+    def refresh(self, document_id: int, metadata: dict):
+        """Rewrite the document-level metadata of a document's chunks, then its centroid"""
+        self.chunk_store.update_metadata({"document_id": document_id}, metadata)
+        self.update(document_id, metadata)
+
+    def delete(self, document_id: int):
+        self.store.delete(ids=[document_key(document_id)])
+
+    def indexed_documents(self) -> set[int]:
+        """Ids of the documents indexed at the current INDEX_VERSION"""
+        return {int(key.split("_", 1)[1]) for key in self.store.ids(where={"index_version": INDEX_VERSION})}
+
+    def select_documents(self, query_embedding: np.ndarray, top_n: int, where: dict | None = None) -> list[int]:
+        """Ids of the top_n documents (matching where) whose centroid is closest to the query"""
+        hits = self.store.search("", top_n, where=where, query_embedding=query_embedding)
+        return [int(hit.metadata["document_id"]) for hit in hits]
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+        query_embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        """
+        Search chunks, restricted to the closest documents once the corpus is large
+
+        A where filter on document-level fields applies to both stages, so
+        the documents picked all match it; any other filter falls back to
+        a flat search.
+        """
+        indexed = self.store.count() if self.enabled else 0
+        if (
+            indexed == 0
+            or self.chunk_store.count() < self.min_chunks
+            or (where and not is_document_filter(where))
+        ):
+            return self.chunk_store.search(
+                query,
+                top_k,
+                where=where,
+                include_embeddings=include_embeddings,
+                query_embedding=query_embedding
+            )
+
+        if query_embedding is None:
+            query_embedding = self.chunk_store.embed([query])[0]
+        document_ids = self.select_documents(query_embedding, min(self.top_documents, indexed), where)
+        if not document_ids:
+            return []
+        documents = {"document_id": {"$in": document_ids}}
+        return self.chunk_store.search(
+            query,
+            top_k,
+            where={"$and": [where, documents]} if where else documents,
+            include_embeddings=include_embeddings,
+            query_embedding=query_embedding
+        )
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_document_index(vector_store: VectorStore) -> DocumentIndex:
+    """Get the document index of a chunk store"""
+    key = vector_store.name
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None or index.chunk_store is not vector_store:
+            index = DocumentIndex(
+                vector_store,
+                enabled=settings.two_stage_search,
+                min_chunks=settings.two_stage_min_chunks,
+                top_documents=settings.two_stage_top_documents
+            )
+            _indexes[key] = index
+        return index
@@ -0,0 +1,175 @@
+import re
+import sqlite3
+import threading
+from app.config import get_settings
+from app.db.vector_backend import VectorStore
+
+settings = get_settings()
+
+# Words and identifiers such as CS-101, v2.3 or 2026-03-01
+TOKEN_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+# How FTS5's default tokenizer splits a term
+FTS_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a about an and any are as at be by can could did do does for from had has have how i in is it its "
+    "me my of on or our so that the their there these this to was we were what when where which who "
+    "why will with would you your".split()
+)
+# Longest query kept; later terms are dropped
+MAX_QUERY_TERMS = 32
+# Rarest terms actually matched; common terms barely move BM25 but each
+# one makes every chunk containing it a candidate to score
+MAX_MATCH_TERMS = 8
+# Terms in more than this share of chunks are dropped while rarer ones remain
+COMMON_TERM_RATIO = 0.5
+
+
+def query_terms(text: str) -> list[str]:
+    """Distinct non-stopword terms of a query, in order"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS and token not in terms:
+            terms.append(token)
+    return terms[:MAX_QUERY_TERMS]
+
+
+class LexicalIndex:
+    """
+    Full-text index over a chunk store's chunks, ranked by BM25
+
+    Catches what embeddings blur: exact identifiers, course codes and
+    names. Chunk text lives in an SQLite FTS5 table; a side table maps
+    its rows to chunk and document ids, so a document's chunks can be
+    replaced without scanning the index. Like the document index, a
+    document is (re)indexed from the chunk store once its chunks are
+    written.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.name = name
+        self._fts = f'"{name}_fts"'
+        self._chunks = f'"{name}_fts_chunks"'
+        self._vocab = f'"{name}_fts_vocab"'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._fts} USING fts5(text)")
+        self._conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {self._vocab} USING fts5vocab('{name}_fts', 'row')")
+        self._conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS {self._chunks} (
+                rowid INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL UNIQUE,
+                document_id INTEGER NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}_fts_chunks_document" ON {self._chunks} (document_id)'
+        )
+        self._conn.commit()
+
+    def index_document(self, document_id: int, chunks: list[tuple[str, str]]):
+        """
+        Replace a document's chunks in the index
+
+        Args:
+            document_id: Document ID
+            chunks: (chunk_id, text) of every chunk of the document
+        """
+        with self._lock:
+            try:
+                self._delete(document_id)
+                for chunk_id, text in chunks:
+                    cursor = self._conn.execute(
+                        f"INSERT INTO {self._chunks} (chunk_id, document_id) VALUES (?, ?)",
+                        (chunk_id, document_id)
+                    )
+                    self._conn.execute(
+                        f"INSERT INTO {self._fts} (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text)
+                    )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+
+    def delete_document(self, document_id: int):
+        with self._lock:
+            self._delete(document_id)
+            self._conn.commit()
+
+    def clear(self):
+        """Remove every chunk"""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self._fts}")
+            self._conn.execute(f"DELETE FROM {self._chunks}")
+            self._conn.commit()
+
+    def indexed_documents(self) -> set[int]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute(f"SELECT DISTINCT document_id FROM {self._chunks}")}
+
+    def search(self, query: str, top_k: int) -> list[tuple[str, float]]:
+        """
+        Chunks containing any of the query's terms, best BM25 match first
+
+        Returns:
+            List of (chunk_id, score), higher scores are better matches
+        """
+        terms = query_terms(query)
+        if not terms or top_k <= 0:
+            return []
+        with self._lock:
+            terms = self._selective_terms(terms)
+            if not terms:
+                return []
+            # Quoted, so identifiers match as phrases (CS-101 -> "cs" followed by "101")
+            match = " OR ".join(f'"{term}"' for term in terms)
+            rows = self._conn.execute(
+                f"""SELECT c.chunk_id, bm25({self._fts}) AS rank
+                    FROM {self._fts} JOIN {self._chunks} AS c ON c.rowid = {self._fts}.rowid
+                    WHERE {self._fts} MATCH ?
+                    ORDER BY rank LIMIT ?""",
+                (match, top_k)
+            ).fetchall()
+        # FTS5's bm25() is negative, lower is better
+        return [(chunk_id, -rank) for chunk_id, rank in rows]
+
+    def _selective_terms(self, terms: list[str]) -> list[str]:
+        """The query terms worth matching: the MAX_MATCH_TERMS rarest, without very common ones"""
+        tokens = {token for term in terms for token in FTS_TOKEN_PATTERN.findall(term)}
+        if not tokens:
+            return []
+        placeholders = ", ".join("?" * len(tokens))
+        frequency = dict(self._conn.execute(
+            f"SELECT term, doc FROM {self._vocab} WHERE term IN ({placeholders})", list(tokens)
+        ))
+        total = self._conn.execute(f"SELECT COUNT(*) FROM {self._chunks}").fetchone()[0]
+
+        # A phrase occurs in no more chunks than its rarest token
+        counts = {
+            term: min((frequency.get(token, 0) for token in FTS_TOKEN_PATTERN.findall(term)), default=0)
+            for term in terms
+        }
+        present = sorted((term for term in terms if counts[term]), key=counts.get)
+        selective = [term for term in present if counts[term] <= total * COMMON_TERM_RATIO]
+        return (selective or present)[:MAX_MATCH_TERMS]
+
+    def _delete(self, document_id: int):
+        self._conn.execute(
+            f"DELETE FROM {self._fts} WHERE rowid IN (SELECT rowid FROM {self._chunks} WHERE document_id = ?)",
+            (document_id,)
+        )
+        self._conn.execute(f"DELETE FROM {self._chunks} WHERE document_id = ?", (document_id,))
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(vector_store: VectorStore) -> LexicalIndex:
+    """Get the lexical index of a chunk store"""
+    with _indexes_lock:
+        index = _indexes.get(vector_store.name)
+        if index is None:
+            index = LexicalIndex(settings.lexical_index_path, vector_store.name)
+            _indexes[vector_store.name] = index
+        return index
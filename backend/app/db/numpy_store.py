@@ -0,0 +1,529 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+from app.db.vector_backend import SearchHit, VectorStore, normalize
+
+QUANTIZATION_MODES = ("none", "int8")
+# int8 search re-scores this many candidates per requested hit with the float vectors
+RESCORE_FACTOR = 4
+MIN_RESCORE = 40
+# Rows of int8 codes widened to float32 at a time while scoring
+SCORE_BLOCK_ROWS = 8192
+
+NUMERIC_OPERATORS = {
+    "$gt": np.greater,
+    "$gte": np.greater_equal,
+    "$lt": np.less,
+    "$lte": np.less_equal
+}
+
+
+class _Column:
+    """One metadata field across all rows: float64 for numbers (and bools), object otherwise"""
+
+    __slots__ = ("values", "present")
+
+    def __init__(self, capacity: int, numeric: bool):
+        self.values = np.full(capacity, np.nan) if numeric else np.full(capacity, None, dtype=object)
+        self.present = np.zeros(capacity, dtype=bool)
+
+    @property
+    def numeric(self) -> bool:
+        return self.values.dtype != object
+
+    def set(self, row: int, value):
+        if self.numeric and not _is_number(value):
+            self.values = self.values.astype(object)
+            self.values[~self.present] = None
+        self.values[row] = float(value) if self.numeric else value
+        self.present[row] = True
+
+    def clear(self, row: int):
+        self.values[row] = np.nan if self.numeric else None
+        self.present[row] = False
+
+    def grow(self, capacity: int):
+        extra = capacity - len(self.values)
+        filler = np.full(extra, np.nan) if self.numeric else np.full(extra, None, dtype=object)
+        self.values = np.concatenate([self.values, filler])
+        self.present = np.concatenate([self.present, np.zeros(extra, dtype=bool)])
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, bool))
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store with exact search
+
+    Embeddings are unit-normalized rows of a memory-mapped float32 matrix
+    that doubles in size as it fills; search is an exact top-k over one
+    matrix-vector product. Metadata fields are kept as column arrays, so
+    where filters are evaluated vectorized before scoring. Chunk text and
+    the original metadata are stored in SQLite and read only for the hits.
+
+    With quantization="int8" each vector also gets an int8 copy scaled by
+    its largest component. Search scans those codes (a quarter of the
+    bytes) and re-scores the best RESCORE_FACTOR * top_k candidates with
+    the float vectors, so only those rows of the float file are read.
+    The mode is stored with the collection: quantization=None keeps it
+    ("none" for a new collection), a mode converts the collection to it.
+
+    The data is owned by one process: use it with a single API worker.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        embedding_function,
+        quantization: str | None = None,
+        initial_capacity: int = 1024
+    ):
+        if quantization is not None and quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {QUANTIZATION_MODES}")
+        self.name = name
+        self.embedding_function = embedding_function
+        self.quantization = quantization
+        self.directory = Path(directory) / name
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / "vectors.f32"
+        self._codes_path = self.directory / "vectors.i8"
+        self._scales_path = self.directory / "scales.f32"
+        self._initial_capacity = max(1, initial_capacity)
+        self._lock = threading.RLock()
+
+        self._conn = sqlite3.connect(str(self.directory / "chunks.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS chunks (
+                id TEXT PRIMARY KEY,
+                row INTEGER NOT NULL UNIQUE,
+                document TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS store_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self.dim = None
+        self._vectors = None
+        self._codes = None
+        self._scales = None
+        self._capacity = 0
+        self._size = 0  # Rows ever handed out are all below this
+        self._ids = np.full(0, None, dtype=object)
+        self._alive = np.zeros(0, dtype=bool)
+        self._columns = {}
+        self._row_of = {}
+        self._free = []
+        self._load()
+
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None):
+        """Embed and store chunks; an existing id is replaced"""
+        if not ids:
+            return
+        if embeddings is None:
+            vectors = self.embed(documents)
+        else:
+            vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+
+        with self._lock:
+            if self._vectors is None:
+                self._open_vectors(vectors.shape[1], self._initial_capacity)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the store's {self.dim}")
+
+            replaced = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+            rows = self._allocate(len(ids))
+            try:
+                self._vectors[rows] = vectors
+                if self._codes is not None:
+                    self._codes[rows], self._scales[rows] = _quantize(vectors)
+                # Vectors reach the file before the index points at them
+                self._flush()
+                self._conn.execute(
+                    f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(ids))})", ids
+                )
+                self._conn.executemany(
+                    "INSERT INTO chunks (id, row, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (chunk_id, int(row), document, json.dumps(metadata or {}))
+                        for chunk_id, row, document, metadata in zip(ids, rows, documents, metadatas)
+                    ]
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                self._free.extend(rows)
+                raise
+
+            self._release(replaced)
+            for chunk_id, row, metadata in zip(ids, rows, metadatas):
+                self._set_row(row, chunk_id, metadata or {})
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+        query_embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        if query_embedding is None:
+            query_vector = self.embed([query])[0]
+        else:
+            query_vector = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+
+        with self._lock:
+            if self._vectors is None or top_k <= 0:
+                return []
+            size = self._size
+            mask = self._rows_matching(where)
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            ids = self._ids
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return []
+        # Selective filter: only score the rows that pass it
+        gather = len(candidates) * 4 < size
+
+        if codes is None:
+            scores = vectors[candidates] @ query_vector if gather else (vectors[:size] @ query_vector)[candidates]
+        else:
+            if gather:
+                scores = _score_codes(codes[candidates], scales[candidates], query_vector)
+            else:
+                scores = _score_codes(codes[:size], scales[:size], query_vector)[candidates]
+            shortlist = _top(scores, max(top_k * RESCORE_FACTOR, MIN_RESCORE))
+            candidates = np.sort(candidates[shortlist])
+            scores = vectors[candidates] @ query_vector
+
+        best = _top(scores, top_k)
+        rows = candidates[best]
+
+        chunk_ids = [ids[row] for row in rows]
+        stored = self._fetch(chunk_ids)
+        hits = []
+        for chunk_id, row, score in zip(chunk_ids, rows, scores[best]):
+            if chunk_id not in stored:
+                continue  # Deleted meanwhile
+            document, metadata = stored[chunk_id]
+            hits.append(SearchHit(
+                id=chunk_id,
+                document=document,
+                metadata=metadata,
+                score=float(score),
+                embedding=np.array(vectors[row]) if include_embeddings else None
+            ))
+        return hits
+
+    def delete(self, ids: list[str] | None = None, where: dict | None = None):
+        with self._lock:
+            size = self._size
+            mask = self._rows_matching(where)
+            if ids is not None:
+                wanted = np.zeros(size, dtype=bool)
+                wanted[[self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]] = True
+                mask &= wanted
+            rows = np.flatnonzero(mask).tolist()
+            if not rows:
+                return
+
+            self._conn.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+            self._conn.commit()
+            self._release(rows)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._row_of)
+
+    def update_metadata(self, where: dict, values: dict):
+        with self._lock:
+            rows = np.flatnonzero(self._rows_matching(where)).tolist()
+            if not rows:
+                return
+            updates = []
+            for row in rows:
+                (metadata,) = self._conn.execute("SELECT metadata FROM chunks WHERE row = ?", (row,)).fetchone()
+                updates.append((json.dumps({**json.loads(metadata), **values}), row))
+            self._conn.executemany("UPDATE chunks SET metadata = ? WHERE row = ?", updates)
+            self._conn.commit()
+            for row in rows:
+                self._set_row(row, self._ids[row], values)
+
+    def ids(self, where: dict | None = None) -> list[str]:
+        with self._lock:
+            return [self._ids[row] for row in np.flatnonzero(self._rows_matching(where))]
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_embeddings: bool = False
+    ) -> list[SearchHit]:
+        with self._lock:
+            mask = self._rows_matching(where)
+            if ids is not None:
+                wanted = np.zeros(len(mask), dtype=bool)
+                wanted[[self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]] = True
+                mask &= wanted
+            rows = np.flatnonzero(mask)
+            chunk_ids = [self._ids[row] for row in rows]
+            vectors = np.array(self._vectors[rows]) if include_embeddings and len(rows) else None
+        stored = self._fetch(chunk_ids)
+        return [
+            SearchHit(
+                id=chunk_id,
+                document=stored[chunk_id][0],
+                metadata=stored[chunk_id][1],
+                score=0.0,
+                embedding=vectors[i] if vectors is not None else None
+            )
+            for i, chunk_id in enumerate(chunk_ids) if chunk_id in stored
+        ]
+
+    def get_embeddings(self, where: dict) -> np.ndarray:
+        with self._lock:
+            if self._vectors is None:
+                return np.zeros((0, 0), dtype=np.float32)
+            return np.array(self._vectors[np.flatnonzero(self._rows_matching(where))])
+
+    def open_sibling(self, name: str, quantization: str | None = None) -> "NumpyVectorStore":
+        """Open another collection in this directory, keeping its own quantization unless one is given"""
+        return NumpyVectorStore(str(self.directory.parent), name, self.embedding_function, quantization=quantization)
+
+    def stats(self) -> dict:
+        """Chunk count and the bytes a search scans vs the float vectors kept on disk"""
+        with self._lock:
+            dim = self.dim or 0
+            return {
+                "chunks": len(self._row_of),
+                "dim": dim,
+                "quantization": self.quantization,
+                "scan_bytes": self._size * (dim + 4 if self._codes is not None else dim * 4),
+                "vector_file_bytes": self._capacity * dim * 4
+            }
+
+    def _rows_matching(self, where: dict | None) -> np.ndarray:
+        mask = self._alive[:self._size].copy()
+        if where:
+            mask &= self._match(where, self._size)
+        return mask
+
+    def _fetch(self, chunk_ids: list[str]) -> dict[str, tuple[str, dict]]:
+        if not chunk_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, document, metadata FROM chunks WHERE id IN ({','.join('?' * len(chunk_ids))})",
+                chunk_ids
+            ).fetchall()
+        return {chunk_id: (document, json.loads(metadata)) for chunk_id, document, metadata in rows}
+
+    def _match(self, where: dict, size: int) -> np.ndarray:
+        mask = np.ones(size, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._match(clause, size)
+            elif key == "$or":
+                any_match = np.zeros(size, dtype=bool)
+                for clause in condition:
+                    any_match |= self._match(clause, size)
+                mask &= any_match
+            else:
+                mask &= self._match_field(key, condition, size)
+        return mask
+
+    def _match_field(self, key: str, condition, size: int) -> np.ndarray:
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        column = self._columns.get(key)
+        if column is None:
+            return np.zeros(size, dtype=bool)
+
+        values = column.values[:size]
+        present = column.present[:size]
+        mask = present.copy()
+        for operator, value in condition.items():
+            if operator == "$eq":
+                mask &= self._equals(column, values, value)
+            elif operator == "$ne":
+                mask &= ~self._equals(column, values, value)
+            elif operator == "$in":
+                mask &= self._equals_any(column, values, value)
+            elif operator == "$nin":
+                mask &= ~self._equals_any(column, values, value)
+            elif operator in NUMERIC_OPERATORS:
+                if not column.numeric or not _is_number(value):
+                    raise ValueError(f"{operator} is only supported on numeric fields ({key})")
+                with np.errstate(invalid="ignore"):
+                    mask &= NUMERIC_OPERATORS[operator](values, float(value))
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+        return mask
+
+    @staticmethod
+    def _equals(column: _Column, values: np.ndarray, value) -> np.ndarray:
+        if column.numeric:
+            if not _is_number(value):
+                return np.zeros(len(values), dtype=bool)
+            return values == float(value)
+        return np.asarray(values == value, dtype=bool)
+
+    def _equals_any(self, column: _Column, values: np.ndarray, options) -> np.ndarray:
+        mask = np.zeros(len(values), dtype=bool)
+        for option in options:
+            mask |= self._equals(column, values, option)
+        return mask
+
+    def _set_row(self, row: int, chunk_id: str, metadata: dict):
+        self._ids[row] = chunk_id
+        self._alive[row] = True
+        self._row_of[chunk_id] = row
+        for key, value in metadata.items():
+            column = self._columns.get(key)
+            if column is None:
+                column = self._columns[key] = _Column(self._capacity, numeric=_is_number(value))
+            column.set(row, value)
+
+    def _release(self, rows: list[int]):
+        for row in rows:
+            chunk_id = self._ids[row]
+            if chunk_id is not None and self._row_of.get(chunk_id) == row:
+                del self._row_of[chunk_id]
+            self._ids[row] = None
+            self._alive[row] = False
+            for column in self._columns.values():
+                column.clear(row)
+            self._free.append(row)
+
+    def _allocate(self, count: int) -> np.ndarray:
+        rows = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        fresh = count - len(rows)
+        if fresh:
+            if self._size + fresh > self._capacity:
+                self._grow(max(self._size + fresh, self._capacity * 2))
+            rows.extend(range(self._size, self._size + fresh))
+            self._size += fresh
+        return np.asarray(rows, dtype=np.int64)
+
+    def _grow(self, capacity: int):
+        self._flush()
+        self._vectors = self._codes = self._scales = None
+        for path, row_bytes in self._files():
+            with open(path, "r+b") as f:
+                f.truncate(capacity * row_bytes)
+        self._map(capacity)
+        for column in self._columns.values():
+            column.grow(capacity)
+        self._ids = np.concatenate([self._ids, np.full(capacity - len(self._ids), None, dtype=object)])
+        self._alive = np.concatenate([self._alive, np.zeros(capacity - len(self._alive), dtype=bool)])
+
+    def _files(self) -> list[tuple[Path, int]]:
+        """(path, bytes per row) of every memory-mapped file"""
+        files = [(self._vectors_path, self.dim * 4)]
+        if self.quantization == "int8":
+            files += [(self._codes_path, self.dim), (self._scales_path, 4)]
+        return files
+
+    def _map(self, capacity: int):
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+        if self.quantization == "int8":
+            self._codes = np.memmap(self._codes_path, dtype=np.int8, mode="r+", shape=(capacity, self.dim))
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r+", shape=(capacity,))
+        self._capacity = capacity
+
+    def _flush(self):
+        for array in (self._vectors, self._codes, self._scales):
+            if array is not None:
+                array.flush()
+
+    def _open_vectors(self, dim: int, capacity: int):
+        """Create the vector files for the first add()"""
+        self.dim = dim
+        for path, row_bytes in self._files():
+            with open(path, "wb") as f:
+                f.truncate(capacity * row_bytes)
+        self._map(capacity)
+        self._ids = np.full(capacity, None, dtype=object)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO store_meta (name, value) VALUES (?, ?)",
+            [("dim", str(dim)), ("quantization", self.quantization)]
+        )
+        self._conn.commit()
+
+    def _load(self):
+        meta = dict(self._conn.execute("SELECT name, value FROM store_meta"))
+        if self.quantization is None:
+            self.quantization = meta.get("quantization", "none")
+        if "dim" not in meta or not self._vectors_path.exists():
+            return
+
+        self.dim = int(meta["dim"])
+        capacity = self._vectors_path.stat().st_size // (self.dim * 4)
+        # The float vectors are always kept, so the codes can be (re)built from them
+        rebuild = self.quantization == "int8" and (
+            meta.get("quantization") != "int8"
+            or not self._codes_path.exists()
+            or self._codes_path.stat().st_size != capacity * self.dim
+        )
+        for path, row_bytes in self._files()[1:]:
+            with open(path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        if self.quantization == "none":
+            self._codes_path.unlink(missing_ok=True)
+            self._scales_path.unlink(missing_ok=True)
+        self._map(capacity)
+        self._ids = np.full(capacity, None, dtype=object)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+        for chunk_id, chunk_row, metadata in self._conn.execute("SELECT id, row, metadata FROM chunks"):
+            if chunk_row < capacity:
+                self._set_row(chunk_row, chunk_id, json.loads(metadata))
+                self._size = max(self._size, chunk_row + 1)
+        self._free = [row for row in range(self._size - 1, -1, -1) if not self._alive[row]]
+
+        if rebuild:
+            for start in range(0, self._size, SCORE_BLOCK_ROWS):
+                end = min(start + SCORE_BLOCK_ROWS, self._size)
+                self._codes[start:end], self._scales[start:end] = _quantize(np.asarray(self._vectors[start:end]))
+            self._flush()
+            print(f"✓ Quantized {self._size} vectors of {self.name} to int8")
+        if meta.get("quantization", "none") != self.quantization:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO store_meta (name, value) VALUES ('quantization', ?)", (self.quantization,)
+            )
+            self._conn.commit()
+
+
+def _top(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indexes of the k highest scores, best first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+def _quantize(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 codes and the scale that maps them back"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _score_codes(codes: np.ndarray, scales: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+    """Approximate dot products of int8 codes with a float query, a block of rows at a time"""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), SCORE_BLOCK_ROWS):
+        end = start + SCORE_BLOCK_ROWS
+        scores[start:end] = codes[start:end].astype(np.float32) @ query_vector
+    return scores * scales
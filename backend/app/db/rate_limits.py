@@ -0,0 +1,114 @@
+import time
+from sqlalchemy import case, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from app.db.sql_models import RateLimitBucket
+from app.db.sql_session import engine
+
+# Wait before retrying a take that found a bucket row missing
+RECHECK_SECONDS = 0.05
+
+
+class SharedBuckets:
+    """
+    LLM rate-limit token buckets kept in the database, shared by every API worker
+
+    buckets maps a name to a TokenBucket that supplies the capacity and
+    refill rate and mirrors the shared level. A row holds each bucket's
+    level and the wall-clock time of its last refill. take() refills and
+    draws down all buckets with conditional UPDATEs in one transaction,
+    so workers drawing at the same time can't overdraw them.
+    """
+
+    def __init__(self, buckets: dict):
+        self.buckets = buckets
+        self._ready = False
+
+    def take(self, amounts: dict[str, float], reserve: float) -> float:
+        """
+        Draw amounts from the buckets, leaving reserve of each capacity untouched
+
+        Returns:
+            0.0 once taken, else seconds until the buckets could allow it
+        """
+        now = time.time()
+        self._ensure_rows(now)
+        with engine.connect() as conn:
+            transaction = conn.begin()
+            for name, amount in amounts.items():
+                bucket = self.buckets[name]
+                floor = reserve * bucket.capacity
+                level = self._refilled(bucket, now)
+                taken = conn.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.name == name, level >= min(amount, bucket.capacity - floor) + floor)
+                    .values(
+                        level=level - min(amount, bucket.capacity),
+                        updated_at=case((RateLimitBucket.updated_at < now, now), else_=RateLimitBucket.updated_at)
+                    )
+                ).rowcount
+                if not taken:
+                    transaction.rollback()
+                    break
+            else:
+                transaction.commit()
+                return 0.0
+
+            if self._sync(conn, now) != set(self.buckets):
+                # Rows removed since they were created (e.g. tables reset): create them again
+                self._ready = False
+                return RECHECK_SECONDS
+        return max(
+            self.buckets[name].wait_time(amount, reserve * self.buckets[name].capacity)
+            for name, amount in amounts.items()
+        )
+
+    def give_back(self, name: str, amount: float):
+        """Return (or, when negative, further draw) amount to a bucket, e.g. to correct an estimate"""
+        bucket = self.buckets[name]
+        with engine.begin() as conn:
+            level = RateLimitBucket.level + amount
+            conn.execute(
+                update(RateLimitBucket)
+                .where(RateLimitBucket.name == name)
+                .values(level=case((level > bucket.capacity, bucket.capacity), else_=level))
+            )
+
+    def sync(self):
+        """Refresh the buckets' levels from the database"""
+        with engine.connect() as conn:
+            self._sync(conn, time.time())
+
+    def _sync(self, conn, now: float) -> set[str]:
+        """Copy the stored levels, refilled up to now, into the buckets; returns the names found"""
+        found = set()
+        for name, level, updated_at in conn.execute(
+            select(RateLimitBucket.name, RateLimitBucket.level, RateLimitBucket.updated_at)
+        ):
+            bucket = self.buckets.get(name)
+            if bucket is not None:
+                bucket.level = min(bucket.capacity, level + max(0.0, now - updated_at) * bucket.rate)
+                bucket.updated = time.monotonic()
+                found.add(name)
+        return found
+
+    @staticmethod
+    def _refilled(bucket, now: float):
+        """SQL expression of a bucket row's level refilled up to now"""
+        elapsed = case((RateLimitBucket.updated_at < now, now - RateLimitBucket.updated_at), else_=0.0)
+        level = RateLimitBucket.level + elapsed * bucket.rate
+        return case((level > bucket.capacity, bucket.capacity), else_=level)
+
+    def _ensure_rows(self, now: float):
+        if self._ready:
+            return
+        with engine.connect() as conn:
+            existing = set(conn.execute(select(RateLimitBucket.name)).scalars())
+        for name, bucket in self.buckets.items():
+            if name in existing:
+                continue
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(RateLimitBucket).values(name=name, level=bucket.capacity, updated_at=now))
+            except IntegrityError:
+                pass  # Another worker created it first
+        self._ready = True
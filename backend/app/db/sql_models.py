@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Float, ForeignKey, JSON
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
@@ -53,3 +53,51 @@ class DocTopicMap(Base):
     
     doc_id = Column(Integer, ForeignKey("documents.id"), primary_key=True)
     topic_id = Column(Integer, ForeignKey("topics.id"), primary_key=True)
+
+
+class IngestionManifest(Base):
+    __tablename__ = "ingestion_manifest"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    path = Column(Text, nullable=False, unique=True)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(Float, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "llm_rate_buckets"
+    
+    name = Column(Text, primary_key=True)  # "requests" or "tokens"
+    level = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix seconds of the last refill
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String(36), primary_key=True)
+    kind = Column(Text, nullable=False)  # e.g. "upload", "folder"
+    status = Column(Text, nullable=False, default="queued", index=True)  # queued, running, cancelling, completed, failed, cancelled
+    payload = Column(JSON, default=dict)
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    progress = Column(Float, nullable=False, default=0.0)  # 0.0 - 1.0
+    stage = Column(Text, nullable=True)  # Human readable current step
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    available_at = Column(DateTime, server_default=func.now())  # Not picked up before this (retry back-off)
+    created_at = Column(DateTime, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    owner_id = Column(Text, nullable=True)  # Job queue (process) running it
+    heartbeat_at = Column(DateTime, nullable=True)  # Last sign of life from the owner while running
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    
+    id = Column(Integer, primary_key=True)  # Single row
+    version = Column(BigInteger, nullable=False, default=0)  # Bumped whenever searchable content changes
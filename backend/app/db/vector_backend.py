@@ -0,0 +1,210 @@
+from abc import ABC, abstractmethod
+import numpy as np
+
+
+class SearchHit:
+    """
+    One search result
+
+    score is the cosine similarity to the query (higher is closer), or the
+    retriever's own score outside plain vector search; embedding is only
+    filled in when requested.
+    """
+
+    __slots__ = ("id", "document", "metadata", "score", "embedding")
+
+    def __init__(self, id: str, document: str, metadata: dict, score: float, embedding=None):
+        self.id = id
+        self.document = document
+        self.metadata = metadata
+        self.score = score
+        self.embedding = embedding
+
+    def __repr__(self) -> str:
+        return f"SearchHit(id={self.id!r}, score={self.score:.4f})"
+
+
+class VectorStore(ABC):
+    """
+    What the services need from a chunk store
+
+    Documents are embedded by the store's embedding function on add() and
+    search() unless embeddings are passed in. where filters use Chroma's
+    syntax: {"field": value},
+    {"field": {"$eq" | "$ne" | "$gt" | "$gte" | "$lt" | "$lte" | "$in" | "$nin": value}},
+    {"$and": [...]} and {"$or": [...]}.
+    """
+
+    name: str
+    # Most chunks a single add() may carry
+    max_batch_size: int | None = None
+
+    @abstractmethod
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None):
+        """Store chunks; an existing id is replaced"""
+
+    @abstractmethod
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+        query_embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        """Return up to top_k chunks closest to the query (or query_embedding), best first"""
+
+    @abstractmethod
+    def delete(self, ids: list[str] | None = None, where: dict | None = None):
+        """Remove chunks by id and/or where filter"""
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of stored chunks"""
+
+    @abstractmethod
+    def update_metadata(self, where: dict, values: dict):
+        """Set metadata fields on every chunk matching where, keeping their other fields"""
+
+    @abstractmethod
+    def ids(self, where: dict | None = None) -> list[str]:
+        """Ids of the chunks matching where, or of every chunk"""
+
+    @abstractmethod
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_embeddings: bool = False
+    ) -> list[SearchHit]:
+        """Stored chunks by id and/or where filter (score 0), in no particular order"""
+
+    @abstractmethod
+    def get_embeddings(self, where: dict) -> np.ndarray:
+        """Stored embeddings of the chunks matching where, one row each"""
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Unit-normalized embeddings of texts, as this store computes them"""
+        return normalize(np.asarray(self.embedding_function(texts), dtype=np.float32))
+
+    @abstractmethod
+    def open_sibling(self, name: str) -> "VectorStore":
+        """Open another store with the same backend, location and embedding function"""
+
+
+class ChromaVectorStore(VectorStore):
+    """VectorStore over a ChromaDB collection"""
+
+    def __init__(self, collection, embedding_function):
+        self.collection = collection
+        self.embedding_function = embedding_function
+        self.name = collection.name
+        self.max_batch_size = getattr(getattr(collection, "_client", None), "max_batch_size", None)
+
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict], embeddings=None):
+        if embeddings is not None:
+            embeddings = [list(map(float, vector)) for vector in embeddings]
+        self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas, embeddings=embeddings)
+
+    def search(
+        self,
+        query: str,
+        top_k: int,
+        where: dict | None = None,
+        include_embeddings: bool = False,
+        query_embedding: np.ndarray | None = None
+    ) -> list[SearchHit]:
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        if query_embedding is None:
+            query_embedding = self.embed([query])[0]
+        results = self.collection.query(
+            query_embeddings=[list(map(float, query_embedding))],
+            n_results=top_k,
+            where=where or None,
+            include=include
+        )
+        if not results["ids"] or not results["ids"][0]:
+            return []
+
+        embeddings = results["embeddings"][0] if include_embeddings else None
+        return [
+            SearchHit(
+                id=chunk_id,
+                document=document,
+                metadata=metadata,
+                # Collections use squared L2 distance; for unit vectors that is 2 - 2 * cosine
+                score=1.0 - distance / 2.0,
+                embedding=np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None else None
+            )
+            for i, (chunk_id, document, metadata, distance) in enumerate(zip(
+                results["ids"][0],
+                results["documents"][0],
+                results["metadatas"][0],
+                results["distances"][0]
+            ))
+        ]
+
+    def delete(self, ids: list[str] | None = None, where: dict | None = None):
+        self.collection.delete(ids=ids, where=where)
+
+    def count(self) -> int:
+        return self.collection.count()
+
+    def update_metadata(self, where: dict, values: dict):
+        ids = self.ids(where)
+        batch_size = self.max_batch_size or max(1, len(ids))
+        # Collection updates merge the given fields into the stored metadata
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            self.collection.update(ids=batch, metadatas=[values] * len(batch))
+
+    def ids(self, where: dict | None = None) -> list[str]:
+        return self.collection.get(where=where or None, include=[])["ids"]
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include_embeddings: bool = False
+    ) -> list[SearchHit]:
+        if ids is not None and not ids:
+            return []
+        include = ["documents", "metadatas"]
+        if include_embeddings:
+            include.append("embeddings")
+        results = self.collection.get(ids=ids, where=where or None, include=include)
+        embeddings = results["embeddings"] if include_embeddings else None
+        return [
+            SearchHit(
+                id=chunk_id,
+                document=document,
+                metadata=metadata,
+                score=0.0,
+                embedding=np.asarray(embeddings[i], dtype=np.float32) if embeddings is not None else None
+            )
+            for i, (chunk_id, document, metadata) in enumerate(zip(
+                results["ids"],
+                results["documents"],
+                results["metadatas"]
+            ))
+        ]
+
+    def get_embeddings(self, where: dict) -> np.ndarray:
+        embeddings = self.collection.get(where=where, include=["embeddings"])["embeddings"]
+        return np.asarray(embeddings or [], dtype=np.float32)
+
+    def open_sibling(self, name: str) -> "ChromaVectorStore":
+        collection = self.collection._client.get_or_create_collection(
+            name=name,
+            embedding_function=self.embedding_function
+        )
+        return ChromaVectorStore(collection, self.embedding_function)
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length (zero rows are left as they are)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
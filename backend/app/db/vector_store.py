@@ -1,23 +1,129 @@
-import chromadb
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
 from app.config import get_settings
+from app.db.vector_backend import ChromaVectorStore, VectorStore
+from app.utils.embedding_service import get_embedding_function
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, the Chroma server is then never auto-started
+    fcntl = None
 
 settings = get_settings()
 
-# Initialize ChromaDB persistent client
-chroma_client = chromadb.PersistentClient(
-    path=settings.chroma_persist_dir
-)
+_client = None
+_client_lock = threading.Lock()
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_chroma_client():
+    """
+    Get the process-wide ChromaDB client, created on first use
+
+    In "embedded" mode the data is opened in this process, which is only
+    safe with a single API worker. In "server" mode every worker talks to
+    one Chroma server, started on chroma_persist_dir if none is running
+    and chroma_server_autostart is set.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import chromadb
+
+                if settings.chroma_mode == "server":
+                    if settings.chroma_server_autostart and not ensure_chroma_server():
+                        raise RuntimeError(
+                            f"Chroma server at {settings.chroma_server_host}:{settings.chroma_server_port} did not start"
+                        )
+                    _client = chromadb.HttpClient(
+                        host=settings.chroma_server_host,
+                        port=str(settings.chroma_server_port)
+                    )
+                else:
+                    _client = chromadb.PersistentClient(path=settings.chroma_persist_dir)
+    return _client
+
+
+def chroma_server_alive() -> bool:
+    url = f"http://{settings.chroma_server_host}:{settings.chroma_server_port}/api/v1/heartbeat"
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+
+def ensure_chroma_server(wait_seconds: float = 60.0) -> bool:
+    """
+    Start a local Chroma server on chroma_persist_dir unless one is answering
+
+    Workers starting together serialize on a lock file, so only the first
+    one launches the server and the others find it running.
+
+    Returns:
+        Whether the server answers its heartbeat
+    """
+    if chroma_server_alive():
+        return True
+
+    lock_path = f"{settings.chroma_persist_dir.rstrip('/')}.server.lock"
+    with open(lock_path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if chroma_server_alive():
+            return True
+
+        subprocess.Popen(
+            [
+                sys.executable, "-c", "from chromadb.cli.cli import app; app()",
+                "run",
+                "--path", settings.chroma_persist_dir,
+                "--host", settings.chroma_server_host,
+                "--port", str(settings.chroma_server_port)
+            ],
+            stdout=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        print(f"✓ Started Chroma server on {settings.chroma_server_host}:{settings.chroma_server_port}")
+
+        deadline = time.monotonic() + wait_seconds
+        while time.monotonic() < deadline:
+            if chroma_server_alive():
+                return True
+            time.sleep(0.2)
+    return False
 
 
 def get_or_create_collection():
     """Get or create the pm_chunks collection"""
-    collection = chroma_client.get_or_create_collection(
+    collection = get_chroma_client().get_or_create_collection(
         name=settings.collection_name,
-        metadata={"description": "PersonalMind document chunks"}
+        metadata={"description": "PersonalMind document chunks"},
+        embedding_function=get_embedding_function()
     )
     return collection
 
 
-def get_vector_store():
-    """Dependency for getting vector store collection"""
-    return get_or_create_collection()
+def get_vector_store() -> VectorStore:
+    """Dependency for getting the chunk store of the configured backend"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.vector_backend == "numpy":
+                    from app.db.numpy_store import NumpyVectorStore
+
+                    _store = NumpyVectorStore(
+                        settings.numpy_store_dir,
+                        settings.collection_name,
+                        get_embedding_function(),
+                        quantization=settings.numpy_store_quantization or None
+                    )
+                else:
+                    _store = ChromaVectorStore(get_or_create_collection(), get_embedding_function())
+    return _store
@@ -0,0 +1,232 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+class _Ticket:
+    """Completion of one add() call, which may span several flushes"""
+
+    def __init__(self, count: int):
+        self.count = count
+        self.remaining = count
+        self.future = Future()
+
+
+class VectorWriteBuffer:
+    """
+    Batches chunk writes to a vector store across documents
+
+    Chunks added by any caller are written together once batch_size are
+    pending, or after flush_interval seconds otherwise, so many small
+    documents share one embedding batch and large ones are split. Every
+    write is capped at the store's max_batch_size. add() returns a Future
+    that resolves once all of its chunks are written.
+
+    Producers wrap their adds in producer(); when the last active producer
+    finishes, pending chunks are written right away instead of waiting for
+    the interval, so a lone upload is not delayed.
+    """
+
+    def __init__(self, vector_store, batch_size: int, flush_interval: float):
+        self.vector_store = vector_store
+        self.batch_size = max(1, min(batch_size, vector_store.max_batch_size or batch_size))
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = []  # (id, document, metadata, ticket)
+        self._oldest = None
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._producers = 0
+        self._stats = {
+            "flushes": 0,
+            "chunks": 0,
+            "failed_chunks": 0,
+            "seconds": 0.0,
+            "last_flush": None
+        }
+
+    def add(self, ids: list[str], documents: list[str], metadatas: list[dict]) -> Future:
+        """
+        Queue chunks for writing
+
+        Returns:
+            Future resolved with the number of chunks written, or with the
+            write error
+        """
+        ticket = _Ticket(len(ids))
+        if not ids:
+            ticket.future.set_result(0)
+            return ticket.future
+
+        with self._lock:
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending.extend(
+                (chunk_id, document, metadata, ticket)
+                for chunk_id, document, metadata in zip(ids, documents, metadatas)
+            )
+            full = len(self._pending) >= self.batch_size
+
+        if full:
+            self.flush(full_batches_only=True)
+        self._ensure_flusher()
+        return ticket.future
+
+    @contextmanager
+    def producer(self):
+        """Mark a caller as adding chunks; flushes once no producer is left"""
+        with self._lock:
+            self._producers += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._producers -= 1
+                idle = self._producers == 0
+            if idle:
+                self.flush()
+
+    def flush(self, full_batches_only: bool = False):
+        """Write pending chunks now, in batches of at most batch_size"""
+        with self._write_lock:
+            while True:
+                with self._lock:
+                    if not self._pending or (full_batches_only and len(self._pending) < self.batch_size):
+                        return
+                    batch = self._pending[:self.batch_size]
+                    self._pending = self._pending[self.batch_size:]
+                    self._oldest = time.monotonic() if self._pending else None
+                self._write(batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["producers"] = self._producers
+        stats["batch_size"] = self.batch_size
+        stats["chunks_per_second"] = round(stats["chunks"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+        return stats
+
+    def _write(self, batch: list):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.vector_store.add(
+                ids=[chunk_id for chunk_id, _, _, _ in batch],
+                documents=[document for _, document, _, _ in batch],
+                metadatas=[metadata for _, _, metadata, _ in batch]
+            )
+        except Exception as e:
+            error = e
+            print(f"✗ Chunk batch write failed: {e}")
+        elapsed = time.perf_counter() - start
+
+        if error is not None:
+            groups = {}
+            for record in batch:
+                groups.setdefault(id(record[3]), []).append(record)
+            if len(groups) > 1:
+                # Retry each add() call on its own so one bad document doesn't fail the others
+                for group in groups.values():
+                    self._write(group)
+                return
+
+        with self._lock:
+            if error is None:
+                self._stats["flushes"] += 1
+                self._stats["chunks"] += len(batch)
+                self._stats["seconds"] += elapsed
+                self._stats["last_flush"] = {
+                    "chunks": len(batch),
+                    "seconds": round(elapsed, 3),
+                    "chunks_per_second": round(len(batch) / elapsed, 1) if elapsed else None
+                }
+            else:
+                self._stats["failed_chunks"] += len(batch)
+        if error is None:
+            logger.debug(f"Wrote {len(batch)} chunks in {elapsed * 1000:.0f} ms ({len(batch) / max(elapsed, 1e-9):.0f} chunks/s)")
+
+        # A failed chunk fails its whole add() call; later successes don't undo that
+        for _, _, _, ticket in batch:
+            if ticket.future.done():
+                continue
+            if error is not None:
+                ticket.future.set_exception(error)
+                continue
+            ticket.remaining -= 1
+            if ticket.remaining == 0:
+                ticket.future.set_result(ticket.count)
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="vector-writer", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _flush_loop(self):
+        """Flush chunks that have waited flush_interval; exit once idle"""
+        while True:
+            with self._lock:
+                oldest = self._oldest
+            if oldest is None:
+                self._wakeup.wait(timeout=self.flush_interval * 10)
+                self._wakeup.clear()
+                with self._lock:
+                    if self._oldest is None:
+                        self._thread = None
+                        return
+                continue
+
+            wait = oldest + self.flush_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            self.flush()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_vector_writer(vector_store) -> VectorWriteBuffer:
+    """Get the shared write buffer of a vector store"""
+    key = vector_store.name
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is not None and writer.vector_store is not vector_store:
+            # The store was reopened: finish writing to the old handle first
+            writer.flush()
+            writer = None
+        if writer is None:
+            writer = VectorWriteBuffer(
+                vector_store,
+                batch_size=settings.ingest_embed_batch_size,
+                flush_interval=settings.ingest_embed_flush_seconds
+            )
+            _writers[key] = writer
+        return writer
+
+
+def flush_vector_writers():
+    """Write everything still buffered (e.g. before shutdown)"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    for writer in writers:
+        writer.flush()
+
+
+def get_vector_writer_stats() -> dict:
+    """Write statistics of every vector store's buffer"""
+    with _writers_lock:
+        writers = list(_writers.values())
+    return {writer.vector_store.name: writer.stats() for writer in writers}
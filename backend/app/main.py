@@ -1,20 +1,31 @@
 from fastapi import FastAPI, UploadFile, File, Form, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.db.sql_session import init_db, get_db
-from app.db.vector_store import get_or_create_collection, get_vector_store
-from app.schemas.document import DocumentUploadResponse
+from app.db.sql_session import init_db, get_db, SessionLocal
+from app.db.vector_store import get_vector_store
+from app.schemas.job import JobResponse
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.schemas.task import TaskResponse, TaskUpdate
-from app.services.document_service import process_document
+from app.services.job_queue import job_queue, get_job, list_jobs, FINISHED_STATUSES
+from app.services.ingestion_jobs import register_ingestion_jobs, enqueue_folder_ingestion
 from app.services.chat_service import process_chat
 from app.services.task_service import get_all_tasks, update_task_status
-from app.services.bulk_ingestion import ingest_folder, scan_folder_preview
+from app.services.bulk_ingestion import scan_folder_preview
+from app.services.document_service import index_missing_documents
 from app.services.s3_service import s3_service
 from app.utils.scheduler import start_scheduler
+from app.utils.leader import LeaderElection
+from app.utils.parser_sandbox import get_parser_sandbox, shutdown_parser_sandbox
+from app.db.vector_writer import flush_vector_writers, get_vector_writer_stats
+from app.utils.embedding_service import get_embedding_stats, close_embedding_function
 from app.db.sql_models import Document, Topic
+from app.config import get_settings
 import os
+import asyncio
 import shutil
+import threading
 import tempfile
 from pathlib import Path
 from datetime import datetime
@@ -40,6 +51,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+settings = get_settings()
+
 UPLOAD_DIR = Path("./uploads")
 UPLOAD_DIR.mkdir(exist_ok=True)
 
@@ -47,17 +60,42 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 scheduler = None
 
 
+def become_leader():
+    """Duties of the one elected worker process"""
+    global scheduler
+    # Start task reminder scheduler
+    scheduler = start_scheduler()
+    # Documents ingested before the document and lexical indexes existed need entries
+    threading.Thread(target=backfill_document_index, name="document-index-backfill", daemon=True).start()
+
+
+def backfill_document_index():
+    db = SessionLocal()
+    try:
+        indexed = index_missing_documents(db, get_vector_store())
+        if indexed:
+            print(f"✓ Indexed {indexed} documents for two-stage and lexical search")
+    except Exception as e:
+        print(f"✗ Document index backfill failed: {e}")
+    finally:
+        db.close()
+
+
+leader = LeaderElection(settings.leader_lock_path, on_elected=become_leader)
+
+
 @app.on_event("startup")
 def startup_event():
     """Initialize databases and scheduler on startup"""
-    global scheduler
-    
     # Initialize SQL database
     init_db()
-    # Initialize ChromaDB collection
-    get_or_create_collection()
-    # Start task reminder scheduler
-    scheduler = start_scheduler()
+    # Initialize the vector store
+    get_vector_store()
+    # With several workers, only the elected one runs the scheduler
+    leader.start()
+    # Start background ingestion workers
+    register_ingestion_jobs(job_queue)
+    job_queue.start()
     
     print("✓ Databases initialized")
 
@@ -69,6 +107,11 @@ def shutdown_event():
     if scheduler:
         scheduler.shutdown()
         print("✓ Scheduler stopped")
+    leader.stop()
+    job_queue.stop()
+    flush_vector_writers()
+    close_embedding_function()
+    shutdown_parser_sandbox()
 
 
 @app.get("/health")
@@ -87,24 +130,20 @@ def root():
     }
 
 
-@app.post("/upload_doc", response_model=DocumentUploadResponse)
-async def upload_document(
+@app.post("/upload_doc", response_model=JobResponse, status_code=202)
+def upload_document(
     file: UploadFile = File(...),
-    title: str = Form(None),
-    db: Session = Depends(get_db),
-    vector_store = Depends(get_vector_store)
+    title: str = Form(None)
 ):
     """
-    Upload and process a document
+    Upload a document for background processing
     
     - Uploads file to S3 (or local storage as fallback)
-    - Extracts text from PDF or text files
-    - Classifies into PARA category
-    - Extracts top 3 topics
-    - Chunks and embeds into ChromaDB
-    - Saves metadata to SQL
+    - Enqueues an ingestion job and returns immediately with 202
     
-    Returns document ID, title, PARA type, and topics
+    The job extracts text, classifies PARA, extracts topics and tasks, and
+    chunks and embeds the document. Poll GET /jobs/{job_id} for progress;
+    the finished job's result holds doc_id, title, para_type and topics.
     """
     # Determine file type
     file_extension = file.filename.split(".")[-1].lower()
@@ -152,17 +191,15 @@ async def upload_document(
             temp_file_path = None  # Don't delete since we moved it
             print(f"File saved locally: {file_path}")
         
-        # Process document (the process_document function will handle both S3 and local paths)
-        result = process_document(
-            db=db,
-            vector_store=vector_store,
-            file_path=file_path,
-            title=title,
-            doc_type=file_extension,
-            s3_key=s3_key  # Pass S3 key for future reference
-        )
+        # Hand processing to the job queue (works with both S3 and local paths)
+        job_id = job_queue.enqueue("upload", {
+            "file_path": file_path,
+            "title": title,
+            "doc_type": file_extension,
+            "s3_key": s3_key
+        })
         
-        return DocumentUploadResponse(**result)
+        return get_job(job_id)
     
     except Exception as e:
         # Clean up on error
@@ -174,7 +211,7 @@ async def upload_document(
         elif file_path and file_path.startswith(str(UPLOAD_DIR)) and os.path.exists(file_path):
             os.remove(file_path)
         
-        raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
     
     finally:
         # Clean up temp file if it still exists
@@ -182,8 +219,88 @@ async def upload_document(
             os.remove(temp_file_path)
 
 
+@app.get("/jobs", response_model=list[JobResponse])
+def get_jobs(limit: int = 50, kind: str = None):
+    """
+    List recent background jobs
+    
+    Newest first, optionally filtered by kind
+    """
+    return list_jobs(limit=limit, kind=kind)
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job_status(job_id: str):
+    """
+    Get a background job's status and progress
+    
+    Status is one of queued, running, cancelling, completed, failed or cancelled
+    """
+    job = get_job(job_id)
+    
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, interval: float = 1.0):
+    """
+    Stream a job's progress as Server-Sent Events
+    
+    Sends a "progress" event whenever the job changes and a final "done"
+    event once it has completed, failed or been cancelled
+    """
+    if not await run_in_threadpool(get_job, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        last = None
+        while True:
+            job = await run_in_threadpool(get_job, job_id)
+            if job is None:
+                return
+            
+            data = JobResponse.model_validate(job).model_dump_json()
+            finished = job.status in FINISHED_STATUSES
+            if data != last:
+                last = data
+                yield f"event: {'done' if finished else 'progress'}\ndata: {data}\n\n"
+            elif not finished:
+                # Keep proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+            
+            if finished:
+                return
+            await asyncio.sleep(max(interval, 0.2))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+def cancel_job(job_id: str):
+    """
+    Cancel a queued or running job
+    
+    Running jobs finish the work already in flight and then stop;
+    files ingested so far are kept
+    """
+    if not get_job(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job has already finished")
+    
+    return get_job(job_id)
+
+
 @app.post("/ask", response_model=ChatResponse)
-async def ask_question(
+def ask_question(
     request: ChatRequest,
     vector_store = Depends(get_vector_store)
 ):
@@ -192,10 +309,16 @@ async def ask_question(
     
     - Routes intent (search vs general)
     - For search: retrieves relevant chunks and generates answer
+    - Optional filters (PARA types, creation date range, document or topic IDs) limit the search
+    - retrieval_mode picks vector, lexical (BM25) or hybrid retrieval
+    - Repeated questions are answered from the answer cache until documents change
     - Returns answer with source document IDs
+    
+    A plain def, so the blocking LLM call (which may wait on the rate-limit
+    scheduler) runs in the threadpool instead of stalling the event loop.
     """
     try:
-        result = process_chat(request.question, vector_store)
+        result = process_chat(request.question, vector_store, request.filters, request.retrieval_mode)
         return ChatResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
@@ -297,22 +420,23 @@ async def get_dashboard_stats(db: Session = Depends(get_db)):
     }
 
 
-@app.post("/ingest/folder")
-async def ingest_knowledge_folder(
-    folder_path: str = Form(None),
-    db: Session = Depends(get_db),
-    vector_store = Depends(get_vector_store)
-):
+@app.post("/ingest/folder", response_model=JobResponse, status_code=202)
+def ingest_knowledge_folder(folder_path: str = Form(None)):
     """
-    Ingest all documents from a local folder
+    Ingest all documents from a local folder in the background
     
-    Processes PDF, TXT, MD, DOC, DOCX files recursively
+    Processes PDF, TXT, MD, DOC, DOCX files recursively. Returns the
+    ingestion job; follow it with GET /jobs/{job_id}/events and stop it
+    with POST /jobs/{job_id}/cancel. Progress is checkpointed per file,
+    so a job interrupted by a restart resumes where it stopped. If the
+    folder is already being ingested, the running job is returned.
     """
     try:
-        results = ingest_folder(db, vector_store, folder_path)
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        job_id = enqueue_folder_ingestion(job_queue, folder_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return get_job(job_id)
 
 
 @app.get("/ingest/preview")
@@ -329,8 +453,25 @@ async def preview_folder_ingestion(folder_path: str = None):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/ingest/stats")
+def get_ingestion_stats():
+    """
+    Ingestion statistics
+    
+    Returns parser sandbox counters, per collection the vector write
+    buffer's flush count and embedding throughput (overall and last flush),
+    the embedding cache's hit rate and the embedding service's batching
+    counters (null when disabled)
+    """
+    return {
+        "parser": get_parser_sandbox().stats(),
+        "vector_writes": get_vector_writer_stats(),
+        **get_embedding_stats()
+    }
+
+
 @app.get("/insights")
-async def get_insights(db: Session = Depends(get_db)):
+def get_insights(db: Session = Depends(get_db)):
     """
     Get AI-generated insights based on user activity
     
@@ -342,3 +483,26 @@ async def get_insights(db: Session = Depends(get_db)):
         return insights
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating insights: {str(e)}")
+
+
+@app.get("/llm/stats")
+def get_llm_stats():
+    """
+    LLM client statistics
+    
+    Returns per-prompt call timing, LLM and answer cache hit rates, how often intent routing
+    needed the LLM, and rate-limit scheduler state
+    """
+    from app.agents.intent_classifier import get_intent_stats
+    from app.utils.answer_cache import get_answer_cache
+    from app.utils.llm_client import get_call_stats
+    from app.utils.llm_cache import get_llm_cache
+    from app.utils.llm_scheduler import get_scheduler
+    
+    return {
+        "calls": get_call_stats(),
+        "cache": get_llm_cache().stats() if settings.llm_cache_enabled else None,
+        "answer_cache": get_answer_cache().stats() if settings.answer_cache_enabled else None,
+        "intent_classifier": get_intent_stats(),
+        "scheduler": get_scheduler().stats()
+    }
@@ -1,10 +1,28 @@
 from pydantic import BaseModel
+from datetime import datetime
+from typing import Literal
+
+
+class ChatFilters(BaseModel):
+    """Restrict the search to matching documents; unset fields don't filter"""
+    para_types: list[str] | None = None  # Projects, Areas, Resources, Archives
+    created_after: datetime | None = None
+    created_before: datetime | None = None
+    document_ids: list[int] | None = None
+    topic_ids: list[int] | None = None  # Documents linked to any of these topics
 
 
 class ChatRequest(BaseModel):
     question: str
+    filters: ChatFilters | None = None
+    retrieval_mode: Literal["vector", "lexical", "hybrid"] | None = None  # Defaults to RETRIEVAL_MODE
 
 
 class ChatResponse(BaseModel):
     answer: str
+    intent: str | None = None  # SEARCH or GENERAL
     sources: list[int] = []  # Document IDs
+    context_tokens: int | None = None  # Estimated prompt tokens of retrieved context (searches only)
+    context_tokens_saved: int | None = None  # Versus pasting every retrieved chunk as-is
+    timings: dict[str, float] | None = None  # Milliseconds per stage (cache, embed, retrieve, mmr, pack, generate)
+    cached: bool = False  # Answered from the answer cache
@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+
+class JobResponse(BaseModel):
+    id: str
+    kind: str
+    status: str
+    progress: float
+    stage: str | None
+    result: dict | None
+    error: str | None
+    attempts: int
+    max_attempts: int
+    created_at: datetime | None
+    started_at: datetime | None
+    finished_at: datetime | None
+    
+    class Config:
+        from_attributes = True
@@ -1,20 +1,54 @@
 import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from sqlalchemy.orm import Session
-from app.services.document_service import process_document
+from app.db.sql_models import Document
+from app.services.document_service import (
+    enrich_document, save_document, build_chunk_records, delete_document, index_document, read_head_pages
+)
+from app.services.ingestion_manifest import ManifestIndex
+from app.utils.parser_sandbox import get_parser_sandbox
+from app.db.vector_writer import get_vector_writer
 from app.config import get_settings
 
 settings = get_settings()
 
+SUPPORTED_EXTENSIONS = ['.pdf', '.txt', '.md', '.doc', '.docx']
 
-def ingest_folder(db: Session, vector_store, folder_path: str = None) -> dict:
+
+def ingest_folder(
+    db: Session,
+    vector_store,
+    folder_path: str = None,
+    on_progress=None,
+    should_cancel=None
+) -> dict:
     """
     Ingest all documents from a folder
     
+    Files flow through a staged pipeline: parsing runs in the parser sandbox,
+    LLM enrichment in a bounded thread pool, SQL writes in the calling
+    thread, and embedding through the shared vector write buffer,
+    which batches chunks across documents.
+    
+    An ingestion manifest (path, size, mtime, sha256) decides what needs
+    work: files with an unchanged stat are skipped without being read,
+    modified files are re-processed and replace their old document, and
+    moved files are re-pointed without re-embedding.
+    
+    The manifest is committed after every stored file, so an interrupted
+    run picks up where it stopped when started again.
+    
     Args:
         db: Database session
-        vector_store: ChromaDB collection
+        vector_store: VectorStore
         folder_path: Path to folder (uses config if not provided)
+        on_progress: Optional callable(stage, results) called as files finish
+        should_cancel: Optional callable returning True to stop early. Files
+            already in flight are finished and recorded; results["cancelled"]
+            is set.
     
     Returns:
         Dictionary with ingestion statistics
@@ -26,59 +60,217 @@ def ingest_folder(db: Session, vector_store, folder_path: str = None) -> dict:
         raise ValueError(f"Invalid folder path: {folder_path}")
     
     folder = Path(folder_path)
-    supported_extensions = ['.pdf', '.txt', '.md', '.doc', '.docx']
     
     results = {
         "total_files": 0,
         "processed": 0,
         "failed": 0,
         "skipped": 0,
+        "renamed": 0,
+        "updated": 0,
+        "to_process": 0,
+        "cancelled": False,
         "errors": []
     }
     
+    def report(stage: str):
+        if on_progress:
+            on_progress(stage, results)
+    
+    manifest = ManifestIndex(db)
+    fingerprints = {}
+    
     # Walk through folder and subfolders
+    for file_path in iter_supported_files(folder):
+        results["total_files"] += 1
+        
+        if results["total_files"] % 100 == 0:
+            if should_cancel and should_cancel():
+                results["cancelled"] = True
+                break
+            report("scanning")
+        
+        try:
+            action, fingerprint = manifest.check(file_path)
+        except OSError as e:
+            results["failed"] += 1
+            results["errors"].append({"file": str(file_path), "error": str(e)})
+            continue
+        
+        if action == "unchanged":
+            results["skipped"] += 1
+        elif action == "renamed":
+            results["renamed"] += 1
+        else:
+            fingerprints[file_path] = fingerprint
+    
+    manifest.commit()
+    results["to_process"] = len(fingerprints)
+    report("processing")
+    
+    def on_stored(file_path: Path, doc_id: int):
+        # Replace the previous version of a changed file
+        previous_doc_id = manifest.previous_document_id(file_path)
+        if previous_doc_id is not None and previous_doc_id != doc_id:
+            delete_document(db, vector_store, previous_doc_id)
+            results["updated"] += 1
+        manifest.record(file_path, fingerprints[file_path], doc_id)
+        manifest.commit()
+    
+    if fingerprints and not results["cancelled"]:
+        _run_pipeline(
+            db, vector_store, list(fingerprints), results, on_stored,
+            on_file_done=lambda: report("processing"),
+            should_cancel=should_cancel
+        )
+    
+    return results
+
+
+def iter_supported_files(folder: Path):
+    """Yield every supported document below folder"""
     for file_path in folder.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            results["total_files"] += 1
+        if file_path.is_file() and file_path.suffix.lower() in SUPPORTED_EXTENSIONS:
+            yield file_path
+
+
+def get_doc_type(file_path: Path) -> str:
+    """Determine document type from file extension"""
+    doc_type = file_path.suffix.lstrip('.').lower()
+    if doc_type in ['doc', 'docx']:
+        doc_type = 'docx'
+    return doc_type
+
+
+def _run_pipeline(
+    db: Session,
+    vector_store,
+    files: list[Path],
+    results: dict,
+    on_stored=None,
+    on_file_done=None,
+    should_cancel=None
+):
+    """
+    Parse, enrich and store files with a bounded number in flight
+    
+    on_stored(file_path, doc_id) is called once a document's SQL rows and
+    chunks have both been written, on_file_done() after every file that
+    was stored or failed. Once should_cancel() returns True no new files
+    are started; those in flight are still finished.
+    """
+    parse_pool = get_parser_sandbox()
+    llm_workers = max(1, settings.ingest_llm_workers)
+    max_in_flight = (parse_pool.workers + llm_workers) * 2
+    
+    done = queue.Queue()
+    written = queue.Queue()
+    writer = get_vector_writer(vector_store)
+    pending_writes = 0
+    
+    def record_failure(file_path: Path, error):
+        results["failed"] += 1
+        results["errors"].append({
+            "file": str(file_path),
+            "error": str(error)
+        })
+        print(f"✗ Failed: {file_path.name} - {str(error)}")
+        if on_file_done:
+            on_file_done()
+    
+    def record_written(block: bool = False):
+        # SQL work stays on this thread; the writer only reports back
+        nonlocal pending_writes
+        while pending_writes:
+            try:
+                file_path, doc_id, error = written.get(block=block)
+            except queue.Empty:
+                return
+            pending_writes -= 1
+            if error is None:
+                index_document(vector_store, db.query(Document).filter(Document.id == doc_id).first())
+                if on_stored:
+                    on_stored(file_path, doc_id)
+                results["processed"] += 1
+                print(f"✓ Processed: {file_path.name}")
+                if on_file_done:
+                    on_file_done()
+            else:
+                # Drop the SQL rows so the file is retried on the next run
+                delete_document(db, vector_store, doc_id)
+                record_failure(file_path, f"Failed to write chunks to vector store: {error}")
+    
+    def on_written(file_path: Path, doc_id: int, future):
+        written.put((file_path, doc_id, future.exception()))
+    
+    with ThreadPoolExecutor(max_workers=llm_workers) as llm_pool, writer.producer():
+        
+        def enrich(file_path: Path, pages: list, head_text: str):
+            try:
+                enrichment = enrich_document(head_text, file_path.stem)
+                done.put((file_path, pages, enrichment, None))
+            except Exception as e:
+                done.put((file_path, None, None, e))
+        
+        def on_parsed(file_path: Path, future):
+            try:
+                pages = future.result()
+                _, head_text = read_head_pages(pages)
+                if not head_text:
+                    raise ValueError("No text extracted from document")
+                llm_pool.submit(enrich, file_path, pages, head_text)
+            except Exception as e:
+                done.put((file_path, None, None, e))
+        
+        remaining = iter(files)
+        in_flight = 0
+        
+        while True:
+            # Keep the parse and enrichment stages fed without loading every file at once
+            if should_cancel and not results["cancelled"] and should_cancel():
+                results["cancelled"] = True
+            
+            while in_flight < max_in_flight and not results["cancelled"]:
+                file_path = next(remaining, None)
+                if file_path is None:
+                    break
+                # Files that time out or hit a limit fail with a ParseError; only their worker is replaced
+                future = parse_pool.submit(str(file_path), get_doc_type(file_path))
+                future.add_done_callback(partial(on_parsed, file_path))
+                in_flight += 1
+            
+            if in_flight == 0:
+                break
+            
+            file_path, pages, enrichment, error = done.get()
+            in_flight -= 1
+            record_written()
+            
+            if error is not None:
+                record_failure(file_path, error)
+                continue
             
             try:
-                # Check if already processed
-                from app.db.sql_models import Document
-                existing = db.query(Document).filter(
-                    Document.path == str(file_path)
-                ).first()
-                
-                if existing:
-                    results["skipped"] += 1
-                    continue
-                
-                # Determine document type
-                doc_type = file_path.suffix.lstrip('.').lower()
-                if doc_type in ['doc', 'docx']:
-                    doc_type = 'docx'
-                
-                # Process document
-                title = file_path.stem
-                process_document(
+                doc = save_document(
                     db=db,
-                    vector_store=vector_store,
                     file_path=str(file_path),
-                    title=title,
-                    doc_type=doc_type
+                    title=file_path.stem,
+                    doc_type=get_doc_type(file_path),
+                    storage_type="local",
+                    enrichment=enrichment
                 )
-                
-                results["processed"] += 1
-                print(f"✓ Processed: {file_path.name}")
-                
             except Exception as e:
-                results["failed"] += 1
-                results["errors"].append({
-                    "file": str(file_path),
-                    "error": str(e)
-                })
-                print(f"✗ Failed: {file_path.name} - {str(e)}")
+                db.rollback()
+                record_failure(file_path, e)
+                continue
+            
+            # Chunks are batched with other documents by the shared write buffer
+            write = writer.add(*build_chunk_records(doc, pages))
+            pending_writes += 1
+            write.add_done_callback(partial(on_written, file_path, doc.id))
     
-    return results
+    # Leaving producer() wrote whatever was still buffered
+    record_written(block=True)
 
 
 def scan_folder_preview(folder_path: str = None) -> dict:
@@ -98,16 +290,14 @@ def scan_folder_preview(folder_path: str = None) -> dict:
         raise ValueError(f"Invalid folder path: {folder_path}")
     
     folder = Path(folder_path)
-    supported_extensions = ['.pdf', '.txt', '.md', '.doc', '.docx']
     
     files_by_type = {}
     total = 0
     
-    for file_path in folder.rglob('*'):
-        if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-            ext = file_path.suffix.lower()
-            files_by_type[ext] = files_by_type.get(ext, 0) + 1
-            total += 1
+    for file_path in iter_supported_files(folder):
+        ext = file_path.suffix.lower()
+        files_by_type[ext] = files_by_type.get(ext, 0) + 1
+        total += 1
     
     return {
         "total_files": total,
@@ -1,25 +1,97 @@
+import json
+import time
 from app.agents.router import route_intent
-from app.agents.search_agent import search_documents
-from groq import Groq
+from app.agents.search_agent import search_documents, RAG_ERROR_ANSWER
 from app.config import get_settings
+from app.db.data_version import get_data_version
+from app.utils.answer_cache import get_answer_cache, question_key
+from app.utils.llm_client import chat_completion
+from app.utils.llm_scheduler import INTERACTIVE
 
 settings = get_settings()
 
+GENERAL_ERROR_ANSWER = "I'm here to help! However, I encountered an error. Please try again."
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
+
+def process_chat(question: str, vector_store, filters=None, retrieval_mode: str | None = None) -> dict:
+    """
+    Process user question through router and appropriate agent
+    
+    A question with filters is scoped to documents, so it skips routing
+    and always searches. With the answer cache enabled, a question close
+    enough to an earlier one, with the same numbers, names and dates and
+    asked with the same filters and retrieval mode, gets that search
+    answer back, as long as the knowledge base hasn't changed since.
+    General conversation is never cached.
+    """
+    filters = active_filters(filters)
+    if not settings.answer_cache_enabled:
+        return answer_question(question, vector_store, filters, retrieval_mode)
+    
+    start = time.perf_counter()
+    question_embedding = vector_store.embed([question])[0]
+    embedded = time.perf_counter()
+    scope = answer_scope(question, filters, retrieval_mode)
+    data_version = get_data_version()
+    cache = get_answer_cache()
+    result = cache.get(question_embedding, scope, data_version)
+    timings = {
+        "embed_ms": round((embedded - start) * 1000, 2),
+        "cache_ms": round((time.perf_counter() - embedded) * 1000, 2)
+    }
+    if result is not None:
+        result["cached"] = True
+        result["timings"] = timings
+        return result
+    
+    result = answer_question(question, vector_store, filters, retrieval_mode, question_embedding)
+    if result["intent"] == "SEARCH" and result["answer"] != RAG_ERROR_ANSWER:
+        cache.set(question_embedding, scope, data_version, result)
+    result["timings"] = {**timings, **(result.get("timings") or {})}
+    return result
 
 
-def process_chat(question: str, vector_store) -> dict:
-    """Process user question through router and appropriate agent"""
-    intent = route_intent(question)
+def answer_question(
+    question: str,
+    vector_store,
+    filters=None,
+    retrieval_mode: str | None = None,
+    question_embedding=None
+) -> dict:
+    """Route the question and answer it from the documents or as general conversation, reporting the intent"""
+    if filters is None and settings.intent_classifier_enabled and question_embedding is None:
+        question_embedding = vector_store.embed([question])[0]
+    intent = "SEARCH" if filters is not None else route_intent(question, vector_store, question_embedding)
     
     if intent == "SEARCH":
-        return search_documents(vector_store, question)
+        result = search_documents(
+            vector_store,
+            question,
+            filters=filters,
+            retrieval_mode=retrieval_mode,
+            query_embedding=question_embedding
+        )
     else:
         answer = generate_general_response(question)
-        return {"answer": answer, "sources": []}
+        result = {"answer": answer, "sources": []}
+    result["intent"] = intent
+    return result
+
+
+def active_filters(filters):
+    """filters, or None when no field is set (an empty ChatFilters() filters nothing)"""
+    if filters is None or not any(filters.model_dump().values()):
+        return None
+    return filters
+
+
+def answer_scope(question: str, filters, retrieval_mode: str | None) -> str:
+    """What an answer depends on besides the question's embedding, as a cache scope"""
+    return json.dumps({
+        "key": question_key(question),
+        "filters": filters.model_dump(mode="json") if filters is not None else None,
+        "retrieval_mode": retrieval_mode or settings.retrieval_mode
+    }, sort_keys=True)
 
 
 def generate_general_response(question: str) -> str:
@@ -31,15 +103,14 @@ def generate_general_response(question: str) -> str:
     """
     
     try:
-        client = get_groq_client()
-        completion = client.chat.completions.create(
+        return chat_completion(
+            "general_response:v1",
+            priority=INTERACTIVE,
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=300
         )
-        
-        return completion.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error generating response: {e}")
-        return "I'm here to help! However, I encountered an error. Please try again."
+        return GENERAL_ERROR_ANSWER
@@ -1,15 +1,32 @@
 from sqlalchemy.orm import Session
-from app.db.sql_models import Document, Topic, DocTopicMap
-from app.utils.parser import parse_document, chunk_text
-from app.utils.groq_client import extract_topics, classify_para
-from app.services.task_service import create_tasks_from_document
+from app.db.sql_models import Document, Topic, DocTopicMap, Task
+from app.utils.parser import chunk_pages
+from app.utils.chunker import chunk_document
+from app.utils.parser_sandbox import get_parser_sandbox
+from app.utils.groq_client import extract_topics, classify_para, extract_enrichment
+from app.agents.task_agent import extract_tasks, normalize_tasks
+from app.services.task_service import save_tasks
 from app.services.s3_service import s3_service
+from app.db.vector_writer import get_vector_writer
+from app.db.document_index import get_document_index, metadata_timestamp
+from app.db.lexical_index import get_lexical_index
+from app.db.data_version import bump_data_version
+from app.utils.answer_cache import get_answer_cache
 from app.config import get_settings
+from concurrent.futures import wait
+from contextlib import contextmanager
+from itertools import chain
+import json
 import os
 import tempfile
 
 settings = get_settings()
 
+# Longest text prefix any enrichment prompt looks at
+ENRICHMENT_TEXT_CHARS = 3000
+# Parsed page text beyond this size is spooled to a temporary file instead of memory
+PAGE_SPOOL_BYTES = 8 * 1024 * 1024
+
 
 def process_document(
     db: Session,
@@ -17,7 +34,8 @@ def process_document(
     file_path: str,
     title: str,
     doc_type: str,
-    s3_key: str = None
+    s3_key: str = None,
+    on_progress=None
 ) -> dict:
     """
     Process uploaded document:
@@ -25,116 +43,401 @@ def process_document(
     2. Classify PARA
     3. Extract topics
     4. Chunk and embed
-    5. Save to SQL and ChromaDB
-    
+    5. Save to SQL and the vector store
+    6. Update the document's centroid and full-text index entries
+
+    Pages are parsed in the parser sandbox and spooled (to disk past
+    PAGE_SPOOL_BYTES), so the sandbox worker is free again before the slow
+    enrichment and writes; they are then chunked and embedded in batches,
+    so memory stays bounded for very long PDFs.
+
     Args:
         db: Database session
-        vector_store: ChromaDB collection
+        vector_store: VectorStore
         file_path: Path to file (local path or S3 key)
         title: Document title
         doc_type: Document type (pdf, txt, etc.)
         s3_key: S3 object key if file is stored in S3
-    
+        on_progress: Optional callable(progress, stage) for progress reporting
+
     Returns:
         Dictionary with doc_id, title, para_type, topics
     """
+    report = on_progress or (lambda progress, stage: None)
+
+    # 1. Extract text
+    report(0.05, "extracting text")
+    with open_document_pages(file_path, doc_type, s3_key) as (pages, storage_type):
+        head_pages, head_text = read_head_pages(pages)
+        if not head_text:
+            raise ValueError("No text extracted from document")
+
+        # 2-3. Classify PARA, extract topics and tasks
+        report(0.25, "enriching")
+        enrichment = enrich_document(head_text, title)
+
+        # 4. Create document, topics and tasks in SQL
+        report(0.6, "saving")
+        doc = save_document(
+            db=db,
+            file_path=file_path,
+            title=title,
+            doc_type=doc_type,
+            storage_type=storage_type,
+            enrichment=enrichment,
+            s3_key=s3_key
+        )
+
+        # 5. Chunk the remaining pages as they are parsed and store them in the vector store
+        #    (through the shared write buffer, batched with other documents)
+        report(0.75, "embedding")
+        writer = get_vector_writer(vector_store)
+        writes = []
+        try:
+            with writer.producer():
+                records = iter_chunk_records(doc, chain(head_pages, pages))
+                for ids, chunks, metadatas in batched_records(records, writer.batch_size):
+                    writes.append(writer.add(ids, chunks, metadatas))
+            for write in writes:
+                write.result()
+        except Exception:
+            # Don't leave a document without chunks behind (a retry would duplicate it);
+            # let queued writes land first so the delete catches them
+            wait(writes)
+            db.rollback()
+            delete_document(db, vector_store, doc.id)
+            raise
+
+    # 6. Index the document for two-stage and lexical retrieval
+    index_document(vector_store, doc)
+
+    return {
+        "doc_id": doc.id,
+        "title": doc.title,
+        "para_type": doc.para_type,
+        "topics": enrichment["topics"]
+    }
+
+
+@contextmanager
+def open_document_pages(file_path: str, doc_type: str, s3_key: str = None):
+    """
+    Parse a local file or an S3 object into a page stream
+
+    Parsing runs in the parser sandbox, so a pathological file fails with
+    a ParseError instead of tying up the caller. The whole file is parsed
+    on entry and its pages spooled, so the sandbox worker is checked back
+    in before the caller starts on them. S3 objects are downloaded to a
+    temporary file that is kept until the context exits.
+
+    Yields:
+        Tuple of (pages, storage_type) where pages yields (page_number, text)
+    """
     temp_file_path = None
-    
+
     try:
-        # 1. Get file content for text extraction
         if s3_key and s3_service.is_available():
             # Download from S3 to temporary file for processing
             file_content = s3_service.download_file(s3_key)
             if not file_content:
                 raise ValueError("Failed to download file from S3")
-            
+
             # Create temporary file
             with tempfile.NamedTemporaryFile(delete=False, suffix=f".{doc_type}") as temp_file:
                 temp_file.write(file_content)
                 temp_file_path = temp_file.name
-            
+
             # Use temp file for text extraction
-            text = parse_document(temp_file_path, doc_type)
-            storage_type = "s3"
+            source, storage_type = temp_file_path, "s3"
         else:
             # Use local file
-            text = parse_document(file_path, doc_type)
-            storage_type = "local"
-        
-        if not text:
-            raise ValueError("No text extracted from document")
-        
-        # 2. Classify PARA
-        para_type = classify_para(text, title)
-        
-        # 3. Extract topics
-        topic_names = extract_topics(text, top_n=3)
-        
-        # 4. Create document in SQL
-        doc = Document(
-            title=title,
-            type=doc_type,
-            path=file_path,
-            s3_key=s3_key,
-            storage_type=storage_type,
-            para_type=para_type,
-            tags=[]
-        )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
-        
-        # 5. Create/link topics
-        for topic_name in topic_names:
-            topic = db.query(Topic).filter(Topic.name == topic_name).first()
-            if not topic:
-                topic = Topic(name=topic_name, frequency_score=1.0)
-                db.add(topic)
-                db.commit()
-                db.refresh(topic)
-            else:
-                topic.frequency_score += 1.0
-                db.commit()
-            
-            # Link document to topic
-            doc_topic = DocTopicMap(doc_id=doc.id, topic_id=topic.id)
-            db.add(doc_topic)
-        
-        db.commit()
-        
-        # 6. Chunk text and store in ChromaDB
-        chunks = chunk_text(text, settings.chunk_size, settings.chunk_overlap)
-        
-        if chunks:
-            chunk_ids = [f"doc_{doc.id}_chunk_{i}" for i in range(len(chunks))]
-            metadatas = [
-                {
-                    "document_id": doc.id,
-                    "chunk_index": i,
-                    "title": title,
-                    "para_type": para_type,
-                    "storage_type": storage_type
-                }
-                for i in range(len(chunks))
-            ]
-            
-            vector_store.add(
-                documents=chunks,
-                ids=chunk_ids,
-                metadatas=metadatas
-            )
-        
-        # 7. Extract and create tasks
-        create_tasks_from_document(db, text, doc.id)
-        
-        return {
-            "doc_id": doc.id,
-            "title": doc.title,
-            "para_type": doc.para_type,
-            "topics": topic_names
-        }
-    
+            source, storage_type = file_path, "local"
+
+        with spooled_pages(get_parser_sandbox().iter_pages(source, doc_type)) as pages:
+            yield pages, storage_type
+
     finally:
         # Clean up temporary file
         if temp_file_path and os.path.exists(temp_file_path):
             os.remove(temp_file_path)
+
+
+@contextmanager
+def spooled_pages(pages):
+    """
+    Read a page stream to the end now and replay it from a spool
+
+    The parser sandbox keeps a worker checked out until its page stream
+    ends, so the stream is drained right away rather than held open while
+    the caller enriches and writes. Text stays in memory up to
+    PAGE_SPOOL_BYTES and goes to a temporary file beyond that.
+
+    Yields:
+        Iterator of (page_number, text)
+    """
+    with tempfile.SpooledTemporaryFile(max_size=PAGE_SPOOL_BYTES, mode="w+", encoding="utf-8") as spool:
+        try:
+            for page_number, text in pages:
+                spool.write(json.dumps([page_number, text]) + "\n")
+        finally:
+            pages.close()
+        spool.seek(0)
+        yield (tuple(json.loads(line)) for line in spool)
+
+
+def read_head_pages(pages, min_chars: int = ENRICHMENT_TEXT_CHARS) -> tuple[list, str]:
+    """
+    Read pages until there is enough text for enrichment
+
+    Returns:
+        Tuple of (pages read, their stripped text). If the document ends
+        first, the text is the whole document.
+    """
+    head_pages = []
+    head_text = ""
+    for page_number, text in pages:
+        head_pages.append((page_number, text))
+        head_text += f"{text}\n"
+        if len(head_text.strip()) > min_chars:
+            break
+    return head_pages, head_text.strip()
+
+
+def enrich_document(text: str, title: str) -> dict:
+    """
+    Run LLM enrichment for a document
+
+    In "combined" mode a single structured call returns every field, and only
+    fields that fail validation are re-requested with the single-purpose
+    prompts. "separate" mode always uses the three single-purpose prompts.
+    Does not touch the database, so it is safe to call from worker threads.
+
+    Returns:
+        Dictionary with para_type, topics and tasks (tasks have no document_id yet)
+    """
+    if settings.llm_enrichment_mode == "combined":
+        enrichment = extract_enrichment(text, title, top_n=3)
+    else:
+        enrichment = {"para_type": None, "topics": None, "tasks": None}
+
+    return {
+        "para_type": enrichment["para_type"] or classify_para(text, title),
+        "topics": enrichment["topics"] or extract_topics(text, top_n=3),
+        "tasks": (
+            normalize_tasks(enrichment["tasks"], None)
+            if enrichment["tasks"] is not None
+            else extract_tasks(text, None)
+        )
+    }
+
+
+def save_document(
+    db: Session,
+    file_path: str,
+    title: str,
+    doc_type: str,
+    storage_type: str,
+    enrichment: dict,
+    s3_key: str = None
+) -> Document:
+    """Create the document row, link its topics and save its tasks"""
+    doc = Document(
+        title=title,
+        type=doc_type,
+        path=file_path,
+        s3_key=s3_key,
+        storage_type=storage_type,
+        para_type=enrichment["para_type"],
+        tags=[]
+    )
+    db.add(doc)
+    db.commit()
+    db.refresh(doc)
+
+    for topic_name in enrichment["topics"]:
+        topic = db.query(Topic).filter(Topic.name == topic_name).first()
+        if not topic:
+            topic = Topic(name=topic_name, frequency_score=1.0)
+            db.add(topic)
+            db.commit()
+            db.refresh(topic)
+        else:
+            topic.frequency_score += 1.0
+            db.commit()
+
+        # Link document to topic
+        doc_topic = DocTopicMap(doc_id=doc.id, topic_id=topic.id)
+        db.add(doc_topic)
+
+    db.commit()
+
+    save_tasks(db, enrichment["tasks"], doc.id)
+
+    return doc
+
+
+def iter_chunk_records(doc: Document, pages):
+    """
+    Chunk a stream of (page_number, text) pages into vector store records
+
+    Uses fixed-size chunks unless chunk_strategy is "structured".
+    Structured chunks also record their character offsets in the document
+    text and the heading they fall under.
+
+    Yields:
+        Tuples of (id, chunk, metadata)
+    """
+    shared = document_metadata(doc)
+    for i, (chunk, extra) in enumerate(_chunk_pages(pages)):
+        yield f"doc_{doc.id}_chunk_{i}", chunk, {
+            **shared,
+            "chunk_index": i,
+            **extra
+        }
+
+
+def document_metadata(doc: Document) -> dict:
+    """
+    Document-level metadata stored on each chunk, so searches can filter without SQL
+
+    created_at is in Unix seconds. Topics are not stored here: topic
+    filters are resolved to document ids through doc_topic_map.
+    """
+    return {
+        "document_id": doc.id,
+        "title": doc.title,
+        "para_type": doc.para_type,
+        "storage_type": doc.storage_type,
+        "created_at": metadata_timestamp(doc.created_at)
+    }
+
+
+def _chunk_pages(pages):
+    """Yield (chunk_text, extra_metadata) with the configured chunking strategy"""
+    if settings.chunk_strategy == "fixed":
+        for chunk, page_number in chunk_pages(pages, settings.chunk_size, settings.chunk_overlap):
+            yield chunk, {"page": page_number}
+        return
+
+    for chunk in chunk_document(pages, settings.chunk_max_tokens, settings.chunk_overlap_tokens):
+        yield chunk.text, {
+            "page": chunk.page,
+            "start_char": chunk.start,
+            "end_char": chunk.end,
+            "section": chunk.section or ""
+        }
+
+
+def build_chunk_records(doc: Document, pages) -> tuple[list[str], list[str], list[dict]]:
+    """
+    Chunk document pages into vector store records
+
+    Returns:
+        Tuple of (ids, chunks, metadatas)
+    """
+    ids, chunks, metadatas = [], [], []
+    for chunk_id, chunk, metadata in iter_chunk_records(doc, pages):
+        ids.append(chunk_id)
+        chunks.append(chunk)
+        metadatas.append(metadata)
+    return ids, chunks, metadatas
+
+
+def batched_records(records, batch_size: int):
+    """Group (id, chunk, metadata) records into (ids, chunks, metadatas) batches"""
+    batch_size = max(1, batch_size)
+    ids, chunks, metadatas = [], [], []
+    for chunk_id, chunk, metadata in records:
+        ids.append(chunk_id)
+        chunks.append(chunk)
+        metadatas.append(metadata)
+        if len(ids) >= batch_size:
+            yield ids, chunks, metadatas
+            ids, chunks, metadatas = [], [], []
+    if ids:
+        yield ids, chunks, metadatas
+
+
+def index_document(vector_store, doc: Document):
+    """
+    Update a stored document's centroid and full-text index entries
+
+    Failures are only reported: the chunks are stored and missing
+    entries are filled in by the next backfill at startup.
+    """
+    try:
+        get_document_index(vector_store).update(doc.id, document_metadata(doc))
+    except Exception as e:
+        print(f"✗ Document index update failed for document {doc.id}: {e}")
+    try:
+        index_document_text(vector_store, doc.id)
+    except Exception as e:
+        print(f"✗ Lexical index update failed for document {doc.id}: {e}")
+    content_changed([doc.id])
+
+
+def content_changed(document_ids: list[int]):
+    """
+    Expire cached answers after documents were added, replaced or deleted
+
+    Moves the shared data version on, which every worker's answer cache
+    checks, and drops this worker's entries citing the documents.
+    """
+    try:
+        bump_data_version()
+    except Exception as e:
+        print(f"✗ Data version update failed: {e}")
+    get_answer_cache().invalidate_documents(document_ids)
+
+
+def index_document_text(vector_store, document_id: int):
+    """(Re)build a document's lexical index entries from its stored chunks"""
+    chunks = vector_store.get(where={"document_id": document_id})
+    get_lexical_index(vector_store).index_document(document_id, [(hit.id, hit.document) for hit in chunks])
+
+
+def index_missing_documents(db: Session, vector_store) -> int:
+    """
+    Re-index documents the document or lexical index has no current entry for
+
+    Covers documents ingested before an index existed or before their
+    chunks carried the current document-level metadata, which is then
+    rewritten from SQL.
+
+    Returns:
+        Number of documents indexed
+    """
+    index = get_document_index(vector_store)
+    indexed = index.indexed_documents()
+    indexed_text = get_lexical_index(vector_store).indexed_documents()
+    missing = 0
+    for (doc_id,) in db.query(Document.id).all():
+        if doc_id not in indexed:
+            doc = db.query(Document).filter(Document.id == doc_id).first()
+            index.refresh(doc.id, document_metadata(doc))
+        if doc_id not in indexed_text:
+            index_document_text(vector_store, doc_id)
+        missing += doc_id not in indexed or doc_id not in indexed_text
+    if missing:
+        content_changed([])
+    return missing
+
+
+def delete_document(db: Session, vector_store, document_id: int):
+    """Remove a document with its chunks, centroid, tasks and topic links"""
+    doc = db.query(Document).filter(Document.id == document_id).first()
+    if not doc:
+        return
+
+    vector_store.delete(where={"document_id": document_id})
+    get_document_index(vector_store).delete(document_id)
+    get_lexical_index(vector_store).delete_document(document_id)
+
+    for topic in doc.topics:
+        topic.frequency_score = max(0.0, (topic.frequency_score or 0.0) - 1.0)
+    doc.topics.clear()
+
+    db.query(Task).filter(Task.document_id == document_id).delete()
+    db.delete(doc)
+    db.commit()
+    content_changed([document_id])
@@ -0,0 +1,144 @@
+import os
+import time
+from app.db.sql_models import Job
+from app.db.sql_session import SessionLocal
+from app.db.vector_store import get_vector_store
+from app.services.bulk_ingestion import ingest_folder
+from app.services.document_service import process_document
+from app.services.job_queue import JobContext, JobQueue, JobCancelled
+from app.services.s3_service import s3_service
+from app.config import get_settings
+
+settings = get_settings()
+
+# Minimum seconds between progress writes / cancellation checks of a folder job
+FOLDER_REPORT_INTERVAL = 1.0
+
+
+def run_upload_job(job: JobContext) -> dict:
+    """Process an uploaded file that has already been stored locally or in S3"""
+    payload = job.payload
+    db = SessionLocal()
+    try:
+        return process_document(
+            db=db,
+            vector_store=get_vector_store(),
+            file_path=payload["file_path"],
+            title=payload["title"],
+            doc_type=payload["doc_type"],
+            s3_key=payload.get("s3_key"),
+            on_progress=job.report
+        )
+    finally:
+        db.close()
+
+
+def cleanup_failed_upload(payload: dict):
+    """Remove the stored file once an upload job has given up"""
+    s3_key = payload.get("s3_key")
+    if s3_key and s3_service.is_available():
+        s3_service.delete_file(s3_key)
+    elif payload.get("file_path") and os.path.exists(payload["file_path"]):
+        os.remove(payload["file_path"])
+
+
+def run_folder_job(job: JobContext) -> dict:
+    """
+    Ingest a folder, reporting files done, throughput, ETA and failures
+    
+    The manifest checkpoints every stored file, so a retried or recovered
+    job skips the files finished by earlier attempts.
+    """
+    start = time.monotonic()
+    last = {"report": 0.0, "check": 0.0, "cancelled": False}
+    
+    def on_progress(stage: str, results: dict):
+        now = time.monotonic()
+        if now - last["report"] < FOLDER_REPORT_INTERVAL:
+            return
+        last["report"] = now
+        job.report(*folder_progress(stage, results, now - start))
+    
+    def should_cancel() -> bool:
+        now = time.monotonic()
+        if not last["cancelled"] and now - last["check"] >= FOLDER_REPORT_INTERVAL:
+            last["check"] = now
+            last["cancelled"] = job.cancelled()
+        return last["cancelled"]
+    
+    db = SessionLocal()
+    try:
+        results = ingest_folder(
+            db,
+            get_vector_store(),
+            job.payload.get("folder_path"),
+            on_progress=on_progress,
+            should_cancel=should_cancel
+        )
+    finally:
+        db.close()
+    
+    elapsed = time.monotonic() - start
+    _, _, summary = folder_progress("done", results, elapsed)
+    summary["errors"] = results["errors"]
+    summary["elapsed_seconds"] = round(elapsed, 1)
+    if results["cancelled"]:
+        raise JobCancelled(summary)
+    return summary
+
+
+def folder_progress(stage: str, results: dict, elapsed: float) -> tuple[float, str, dict]:
+    """Turn ingestion counters into (progress, stage, detail) for JobContext.report"""
+    done = results["processed"] + results["failed"]
+    total = results["to_process"]
+    rate = done / elapsed if elapsed > 0 else 0.0
+    eta = (total - done) / rate if rate > 0 and total else None
+    
+    detail = {
+        **results,
+        "files_done": done,
+        "files_per_second": round(rate, 2),
+        "eta_seconds": round(eta, 1) if eta is not None else None,
+        "errors": results["errors"][-20:]
+    }
+    
+    if stage == "scanning":
+        return 0.0, f"scanning ({results['total_files']} files found)", detail
+    progress = done / total if total else 1.0
+    return progress, f"processing {done}/{total} files", detail
+
+
+def enqueue_folder_ingestion(queue: JobQueue, folder_path: str | None) -> str:
+    """
+    Start ingesting a folder, or return the job already ingesting it
+    
+    Two jobs working on the same folder would race on the same manifest
+    entries, so an active job for the folder is reused.
+    
+    Raises:
+        ValueError: If the folder does not exist
+    """
+    folder_path = folder_path or settings.knowledge_base_folder
+    if not folder_path or not os.path.isdir(folder_path):
+        raise ValueError(f"Invalid folder path: {folder_path}")
+    
+    db = SessionLocal()
+    try:
+        active = db.query(Job).filter(
+            Job.kind == "folder",
+            Job.status.in_(("queued", "running"))
+        ).order_by(Job.created_at).all()
+    finally:
+        db.close()
+    
+    for job in active:
+        if (job.payload or {}).get("folder_path") == folder_path:
+            return job.id
+    
+    return queue.enqueue("folder", {"folder_path": folder_path})
+
+
+def register_ingestion_jobs(queue: JobQueue):
+    """Register the ingestion job handlers on a queue"""
+    queue.register("upload", run_upload_job, on_failed=cleanup_failed_upload)
+    queue.register("folder", run_folder_job)
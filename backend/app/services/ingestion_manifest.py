@@ -0,0 +1,123 @@
+import hashlib
+from pathlib import Path
+from sqlalchemy.orm import Session
+from app.db.sql_models import Document, IngestionManifest
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: Path) -> str:
+    """Compute the sha256 of a file without loading it all into memory"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ManifestIndex:
+    """
+    In-memory view of the ingestion manifest for one ingestion run
+    
+    Loads every entry with a single query so that deciding whether a file
+    needs work costs a stat() call, plus a content hash only when the stat
+    has changed.
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+        self.by_path = {entry.path: entry for entry in db.query(IngestionManifest).all()}
+        self.by_hash = {}
+        for entry in self.by_path.values():
+            self.by_hash.setdefault(entry.sha256, []).append(entry)
+        # Documents ingested before the manifest existed
+        self.document_paths = {
+            path: doc_id for doc_id, path in db.query(Document.id, Document.path).all()
+        }
+    
+    def check(self, file_path: Path) -> tuple[str, dict | None]:
+        """
+        Decide what to do with a file
+        
+        Returns:
+            Tuple of (action, fingerprint). Action is one of "unchanged",
+            "renamed", "new" or "changed"; fingerprint holds size, mtime and
+            sha256 for files that still need processing.
+        """
+        path = str(file_path)
+        stat = file_path.stat()
+        entry = self.by_path.get(path)
+        
+        if entry and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+            return "unchanged", None
+        
+        sha256 = hash_file(file_path)
+        
+        if entry and entry.sha256 == sha256:
+            # Touched but not modified
+            entry.size = stat.st_size
+            entry.mtime = stat.st_mtime
+            return "unchanged", None
+        
+        if entry is None:
+            moved = self._find_moved(sha256)
+            if moved:
+                self._move(moved, path, stat.st_size, stat.st_mtime)
+                return "renamed", None
+            
+            legacy_doc_id = self.document_paths.get(path)
+            if legacy_doc_id is not None:
+                self.record(file_path, {
+                    "size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256
+                }, legacy_doc_id)
+                return "unchanged", None
+        
+        fingerprint = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        return ("changed" if entry else "new"), fingerprint
+    
+    def previous_document_id(self, file_path: Path) -> int | None:
+        """Document currently recorded for a path, if any"""
+        entry = self.by_path.get(str(file_path))
+        return entry.document_id if entry else None
+    
+    def record(self, file_path: Path, fingerprint: dict, document_id: int):
+        """Create or update the manifest entry for a processed file"""
+        path = str(file_path)
+        entry = self.by_path.get(path)
+        
+        if entry is None:
+            entry = IngestionManifest(path=path, **fingerprint, document_id=document_id)
+            self.db.add(entry)
+            self.by_path[path] = entry
+        else:
+            same_hash = self.by_hash.get(entry.sha256, [])
+            if entry in same_hash:
+                same_hash.remove(entry)
+            entry.size = fingerprint["size"]
+            entry.mtime = fingerprint["mtime"]
+            entry.sha256 = fingerprint["sha256"]
+            entry.document_id = document_id
+        
+        self.by_hash.setdefault(entry.sha256, []).append(entry)
+    
+    def commit(self):
+        self.db.commit()
+    
+    def _find_moved(self, sha256: str) -> IngestionManifest | None:
+        for entry in self.by_hash.get(sha256, []):
+            if not Path(entry.path).exists():
+                return entry
+        return None
+    
+    def _move(self, entry: IngestionManifest, new_path: str, size: int, mtime: float):
+        del self.by_path[entry.path]
+        
+        if entry.document_id is not None:
+            doc = self.db.query(Document).filter(Document.id == entry.document_id).first()
+            if doc:
+                doc.path = new_path
+        
+        entry.path = new_path
+        entry.size = size
+        entry.mtime = mtime
+        self.by_path[new_path] = entry
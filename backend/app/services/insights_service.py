@@ -1,17 +1,12 @@
 from sqlalchemy.orm import Session
 from app.db.sql_models import Document, Task, Topic
 from datetime import datetime, timedelta
-from groq import Groq
 from app.config import get_settings
+from app.utils.llm_client import chat_completion
 
 settings = get_settings()
 
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
-
-
 def generate_insights(db: Session) -> list[dict]:
     """
     Generate AI-powered insights based on user's documents, tasks, and activity
@@ -88,8 +83,6 @@ def generate_insights(db: Session) -> list[dict]:
 def generate_weekly_reflection(recent_docs, top_topics, completed_tasks) -> str:
     """Generate weekly reflection using AI"""
     try:
-        client = get_groq_client()
-        
         topics_str = ", ".join([t.name for t in top_topics[:3]])
         docs_count = len(recent_docs)
         
@@ -105,14 +98,13 @@ Write 2-3 sentences that:
 
 Keep it personal, positive, and actionable."""
         
-        response = client.chat.completions.create(
+        return chat_completion(
+            "weekly_reflection:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=150
         )
-        
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error generating reflection: {e}")
         return f"This week you've been productive with {docs_count} new documents focusing on {topics_str}. Keep up the great work!"
@@ -121,8 +113,6 @@ Keep it personal, positive, and actionable."""
 def generate_suggestion(db: Session, top_topics, pending_tasks) -> str:
     """Generate actionable suggestion"""
     try:
-        client = get_groq_client()
-        
         topics_str = ", ".join([t.name for t in top_topics[:3]])
         
         prompt = f"""Generate a brief, actionable suggestion for a user based on their knowledge base:
@@ -133,14 +123,13 @@ Write 1-2 sentences suggesting a practical action they could take to apply their
 
 Keep it specific and actionable."""
         
-        response = client.chat.completions.create(
+        return chat_completion(
+            "suggestion:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=100
         )
-        
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error generating suggestion: {e}")
         return f"Consider organizing your {pending_tasks} pending tasks by priority to stay focused on what matters most."
@@ -152,8 +141,6 @@ def detect_learning_pattern(db: Session, top_topics) -> str:
         return None
     
     try:
-        client = get_groq_client()
-        
         topics_str = ", ".join([t.name for t in top_topics[:3]])
         
         prompt = f"""Based on a user's focus on these topics: {topics_str}
@@ -162,14 +149,13 @@ Generate a brief insight about their learning pattern or suggest how these topic
 
 Write 1-2 sentences that help them see the bigger picture or optimize their learning approach."""
         
-        response = client.chat.completions.create(
+        return chat_completion(
+            "learning_pattern:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=100
         )
-        
-        return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"Error detecting pattern: {e}")
         return f"Your focus on {topics_str} shows a clear learning direction. Consider how these topics interconnect."
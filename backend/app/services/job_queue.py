@@ -0,0 +1,345 @@
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from app.config import get_settings
+from app.db.sql_models import Job
+from app.db.sql_session import SessionLocal
+
+settings = get_settings()
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    """Raised by a handler that stopped because its job was cancelled"""
+
+
+class JobContext:
+    """What a job handler sees of its job"""
+
+    def __init__(self, job_id: str, payload: dict, attempt: int, max_attempts: int):
+        self.job_id = job_id
+        self.payload = payload
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+
+    @property
+    def is_last_attempt(self) -> bool:
+        return self.attempt >= self.max_attempts
+
+    def report(self, progress: float, stage: str = None, detail: dict = None):
+        """
+        Persist progress (0.0 - 1.0) and the current stage
+        
+        detail, when given, is stored as the job's partial result so that
+        pollers can see counters while the job is still running.
+        """
+        values = {"progress": max(0.0, min(1.0, progress)), "stage": stage, "heartbeat_at": datetime.utcnow()}
+        if detail is not None:
+            values["result"] = detail
+        
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == self.job_id).update(values)
+            db.commit()
+        finally:
+            db.close()
+    
+    def cancelled(self) -> bool:
+        """Whether cancellation has been requested for this job"""
+        db = SessionLocal()
+        try:
+            status = db.query(Job.status).filter(Job.id == self.job_id).scalar()
+            return status == "cancelling"
+        finally:
+            db.close()
+
+
+class JobQueue:
+    """
+    Database-backed job queue with in-process worker threads
+
+    Jobs are rows in the jobs table, so they survive restarts and can be
+    claimed safely by several workers: a worker only owns a job once its
+    queued -> running UPDATE succeeds. Failed jobs are retried with a
+    growing delay until max_attempts is reached, unless the exception is
+    marked retryable = False.
+
+    Each queue has an owner id, stored on the jobs it claims, and a
+    heartbeat thread that refreshes their heartbeat_at. The same thread
+    requeues jobs whose heartbeat has expired, whichever process left them.
+    """
+
+    def __init__(self):
+        self.owner_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._handlers = {}
+        self._threads = []
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def register(self, kind: str, handler, on_failed=None):
+        """
+        Register a handler for a job kind
+
+        Args:
+            kind: Job kind
+            handler: Callable(JobContext) -> dict result
+            on_failed: Optional callable(payload) run once the job has finally failed
+        """
+        self._handlers[kind] = (handler, on_failed)
+
+    def enqueue(self, kind: str, payload: dict, max_attempts: int = None) -> str:
+        """Add a job and return its id"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind: {kind}")
+
+        now = datetime.utcnow()
+        job = Job(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status="queued",
+            payload=payload,
+            progress=0.0,
+            stage="queued",
+            attempts=0,
+            max_attempts=max_attempts or settings.job_max_attempts,
+            available_at=now,
+            created_at=now
+        )
+        db = SessionLocal()
+        try:
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        finally:
+            db.close()
+
+        self._wakeup.set()
+        return job_id
+
+    def start(self, workers: int = None):
+        """
+        Start worker threads and the heartbeat thread, first recovering interrupted jobs
+        
+        Safe with several API worker processes: only jobs whose owner has
+        stopped sending heartbeats are recovered.
+        """
+        if self._threads:
+            return
+
+        self.recover()
+        self._stop.clear()
+        for i in range(max(1, workers or settings.job_workers)):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        print(f"✓ Job queue started with {len(self._threads) - 1} workers")
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a job
+        
+        Queued jobs are cancelled right away. Running jobs are marked
+        cancelling and stop at the handler's next JobContext.cancelled()
+        check.
+        
+        Returns:
+            False if the job does not exist or has already finished
+        """
+        db = SessionLocal()
+        try:
+            cancelled = db.query(Job).filter(Job.id == job_id, Job.status == "queued").update({
+                "status": "cancelled",
+                "stage": "cancelled",
+                "finished_at": datetime.utcnow()
+            }, synchronize_session=False)
+            cancelling = db.query(Job).filter(Job.id == job_id, Job.status == "running").update({
+                "status": "cancelling",
+                "stage": "cancelling"
+            }, synchronize_session=False)
+            db.commit()
+            return bool(cancelled or cancelling)
+        finally:
+            db.close()
+    
+    def recover(self) -> int:
+        """
+        Requeue jobs left running by a process that stopped
+        
+        A job is abandoned once its heartbeat is older than
+        job_heartbeat_timeout_seconds. Jobs being cancelled are marked
+        cancelled.
+        
+        Returns:
+            Number of jobs requeued
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.job_heartbeat_timeout_seconds)
+        db = SessionLocal()
+        try:
+            expired = db.query(Job).filter(Job.heartbeat_at < cutoff)
+            expired.filter(Job.status == "cancelling").update({
+                "status": "cancelled",
+                "stage": "cancelled",
+                "owner_id": None,
+                "finished_at": now
+            }, synchronize_session=False)
+            count = expired.filter(Job.status == "running").update({
+                "status": "queued",
+                "stage": "requeued after its worker stopped",
+                "owner_id": None,
+                "available_at": now
+            }, synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(settings.job_heartbeat_seconds):
+            try:
+                self._beat()
+                recovered = self.recover()
+                if recovered:
+                    print(f"✓ Requeued {recovered} jobs of a stopped worker")
+                    self._wakeup.set()
+            except Exception as e:
+                print(f"✗ Job heartbeat error: {e}")
+
+    def _beat(self):
+        """Mark the jobs this queue is running as alive"""
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(
+                Job.owner_id == self.owner_id,
+                Job.status.in_(("running", "cancelling"))
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                job = self._claim_next()
+            except Exception as e:
+                print(f"✗ Job queue error: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(timeout=settings.job_poll_interval_seconds)
+                self._wakeup.clear()
+                continue
+
+            self._run(*job)
+
+    def _claim_next(self):
+        db = SessionLocal()
+        try:
+            candidates = db.query(Job.id).filter(
+                Job.status == "queued",
+                Job.available_at <= datetime.utcnow()
+            ).order_by(Job.created_at).limit(5).all()
+
+            for (job_id,) in candidates:
+                claimed = db.query(Job).filter(
+                    Job.id == job_id,
+                    Job.status == "queued"
+                ).update({
+                    "status": "running",
+                    "stage": "starting",
+                    "attempts": Job.attempts + 1,
+                    "owner_id": self.owner_id,
+                    "started_at": datetime.utcnow(),
+                    "heartbeat_at": datetime.utcnow()
+                }, synchronize_session=False)
+                db.commit()
+
+                if claimed:
+                    job = db.query(Job).filter(Job.id == job_id).first()
+                    return job.id, job.kind, dict(job.payload or {}), job.attempts, job.max_attempts
+            return None
+        finally:
+            db.close()
+
+    def _run(self, job_id: str, kind: str, payload: dict, attempt: int, max_attempts: int):
+        handler, on_failed = self._handlers.get(kind, (None, None))
+        context = JobContext(job_id, payload, attempt, max_attempts)
+
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind: {kind}")
+            result = handler(context)
+            self._finish(job_id, status="completed", result=result, progress=1.0, stage="done")
+        except JobCancelled as e:
+            fields = {"result": e.args[0]} if e.args else {}
+            self._finish(job_id, status="cancelled", stage="cancelled", **fields)
+        except Exception as e:
+            traceback.print_exc()
+            if context.cancelled():
+                self._finish(job_id, status="cancelled", error=str(e), stage="cancelled")
+            elif attempt < max_attempts and getattr(e, "retryable", True):
+                delay = settings.job_retry_delay_seconds * attempt
+                self._finish(
+                    job_id,
+                    status="queued",
+                    error=str(e),
+                    stage=f"retrying in {delay:.0f}s",
+                    available_at=datetime.utcnow() + timedelta(seconds=delay)
+                )
+            else:
+                self._finish(job_id, status="failed", error=str(e), stage="failed")
+                if on_failed:
+                    try:
+                        on_failed(payload)
+                    except Exception as cleanup_error:
+                        print(f"✗ Job cleanup failed: {cleanup_error}")
+
+    def _finish(self, job_id: str, status: str, **fields):
+        db = SessionLocal()
+        try:
+            values = {"status": status, **fields}
+            if status in FINISHED_STATUSES:
+                values["finished_at"] = datetime.utcnow()
+            else:
+                values["owner_id"] = None
+            # A job recovered from this queue (heartbeats missed) now belongs to someone else
+            db.query(Job).filter(Job.id == job_id, Job.owner_id == self.owner_id).update(values)
+            db.commit()
+        finally:
+            db.close()
+
+
+def get_job(job_id: str) -> Job | None:
+    db = SessionLocal()
+    try:
+        return db.query(Job).filter(Job.id == job_id).first()
+    finally:
+        db.close()
+
+
+def list_jobs(limit: int = 50, kind: str = None) -> list[Job]:
+    db = SessionLocal()
+    try:
+        query = db.query(Job)
+        if kind:
+            query = query.filter(Job.kind == kind)
+        return query.order_by(Job.created_at.desc()).limit(limit).all()
+    finally:
+        db.close()
+
+
+job_queue = JobQueue()
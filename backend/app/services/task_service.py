@@ -8,10 +8,16 @@ def create_tasks_from_document(db: Session, text: str, document_id: int) -> list
     Extract and create tasks from document text
     """
     tasks_data = extract_tasks(text, document_id)
-    
+    return save_tasks(db, tasks_data, document_id)
+
+
+def save_tasks(db: Session, tasks_data: list[dict], document_id: int) -> list[Task]:
+    """
+    Save already-extracted tasks for a document
+    """
     tasks = []
     for task_data in tasks_data:
-        task = Task(**task_data)
+        task = Task(**{**task_data, "document_id": document_id})
         db.add(task)
         tasks.append(task)
     
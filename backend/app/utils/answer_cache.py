@@ -0,0 +1,208 @@
+import copy
+import re
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from app.config import get_settings
+from app.db.vector_backend import normalize
+
+settings = get_settings()
+
+# Rough per-entry bookkeeping on top of the vector and the answer text
+ENTRY_OVERHEAD_BYTES = 512
+
+KEY_TOKEN_RE = re.compile(r"[\w-]+")
+# Words that change what a question asks while barely moving its embedding
+KEY_WORDS = {
+    "today", "tonight", "tomorrow", "yesterday", "this", "next", "last", "previous", "past", "upcoming",
+    "before", "after", "since", "until", "ago", "day", "week", "weekend", "month", "year",
+    "monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday",
+    "not", "no", "never", "without", "except"
+}
+
+
+def question_key(question: str) -> str:
+    """
+    The words two questions must share exactly to share an answer
+
+    Questions differing in one number, code, name or relative date
+    ("this week" / "next week", "CS-101" / "CS-102") can embed closer than
+    any similarity threshold, so these words are compared as text on top
+    of it: anything containing a digit, capitalized words inside a
+    sentence, relative-date words and negations.
+    """
+    terms = set()
+    previous_end = 0
+    for match in KEY_TOKEN_RE.finditer(question):
+        word = match.group()
+        gap = question[previous_end:match.start()].strip()
+        sentence_start = previous_end == 0 or gap[-1:] in (".", "!", "?", ":")
+        previous_end = match.end()
+        if (
+            any(char.isdigit() for char in word)
+            or word.lower() in KEY_WORDS
+            or (word[0].isupper() and not sentence_start and word != "I")
+        ):
+            terms.add(word.lower())
+    return " ".join(sorted(terms))
+
+
+class _Entry:
+    __slots__ = ("slot", "scope", "result", "sources", "data_version", "created_at", "size")
+
+    def __init__(self, slot: int, scope: str, result: dict, data_version: int, size: int):
+        self.slot = slot
+        self.scope = scope
+        self.result = result
+        self.sources = set(result.get("sources") or [])
+        self.data_version = data_version
+        self.created_at = time.monotonic()
+        self.size = size
+
+
+class AnswerCache:
+    """
+    In-memory cache of /ask answers, matched on question similarity
+
+    A question reuses an earlier answer when their embeddings are at
+    least threshold cosine-similar and they were asked with the same
+    scope (filters, retrieval mode and question_key). Entries expire after ttl_seconds,
+    when the knowledge base's data version moves on, or when a document
+    they cite is re-indexed or deleted; past max_bytes the least recently
+    used are evicted. Question vectors sit in one matrix, so a lookup is
+    a single matrix-vector product.
+    """
+
+    def __init__(self, threshold: float, ttl_seconds: float, max_bytes: int):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # slot -> _Entry, least recently used first
+        self._bytes = 0
+        self._vectors = None
+        self._scopes = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._free = []
+
+    def get(self, question_embedding: np.ndarray, scope: str, data_version: int) -> dict | None:
+        """
+        The cached result for the most similar earlier question, if close enough and still valid
+
+        Returns:
+            A copy of the cached result, or None
+        """
+        query = normalize(np.asarray(question_embedding, dtype=np.float32).reshape(1, -1))[0]
+        scope_hash = hash(scope)
+        with self._lock:
+            while True:
+                entry = self._best_match(query, scope_hash, scope)
+                if entry is None:
+                    self.misses += 1
+                    return None
+                if entry.data_version == data_version and time.monotonic() - entry.created_at <= self.ttl_seconds:
+                    break
+                self._remove(entry)
+
+            self.hits += 1
+            self._entries.move_to_end(entry.slot)
+            return copy.deepcopy(entry.result)
+
+    def set(self, question_embedding: np.ndarray, scope: str, data_version: int, result: dict):
+        vector = normalize(np.asarray(question_embedding, dtype=np.float32).reshape(1, -1))[0]
+        size = vector.nbytes + len(str(result).encode("utf-8")) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            slot = self._allocate(len(vector))
+            self._vectors[slot] = vector
+            self._scopes[slot] = hash(scope)
+            self._live[slot] = True
+            self._entries[slot] = _Entry(slot, scope, copy.deepcopy(result), data_version, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries.values())))
+
+    def invalidate_documents(self, document_ids) -> int:
+        """Drop every entry citing one of these documents"""
+        document_ids = set(document_ids)
+        with self._lock:
+            stale = [entry for entry in self._entries.values() if entry.sources & document_ids]
+            for entry in stale:
+                self._remove(entry)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._remove(entry)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = len(self._entries), self._bytes
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def _best_match(self, query: np.ndarray, scope_hash: int, scope: str) -> _Entry | None:
+        if not self._entries or self._vectors.shape[1] != len(query):
+            return None
+        similarity = self._vectors @ query
+        similarity[~(self._live & (self._scopes == scope_hash))] = -np.inf
+        slot = int(np.argmax(similarity))
+        if similarity[slot] < self.threshold:
+            return None
+        entry = self._entries[slot]
+        # Guard against hash collisions between scopes
+        return entry if entry.scope == scope else None
+
+    def _allocate(self, dim: int) -> int:
+        if self._vectors is None or self._vectors.shape[1] != dim:
+            # First entry, or the embedding model changed: start over
+            for entry in list(self._entries.values()):
+                self._remove(entry)
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+            self._scopes = np.zeros(0, dtype=np.int64)
+            self._live = np.zeros(0, dtype=bool)
+            self._free = []
+        if not self._free:
+            old = len(self._vectors)
+            capacity = max(64, old * 2)
+            self._vectors = np.vstack([self._vectors, np.zeros((capacity - old, dim), dtype=np.float32)])
+            self._scopes = np.concatenate([self._scopes, np.zeros(capacity - old, dtype=np.int64)])
+            self._live = np.concatenate([self._live, np.zeros(capacity - old, dtype=bool)])
+            self._free = list(range(capacity - 1, old - 1, -1))
+        return self._free.pop()
+
+    def _remove(self, entry: _Entry):
+        del self._entries[entry.slot]
+        self._live[entry.slot] = False
+        self._free.append(entry.slot)
+        self._bytes -= entry.size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get the process-wide answer cache"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache(
+                    settings.answer_cache_threshold,
+                    settings.answer_cache_ttl_seconds,
+                    int(settings.answer_cache_max_mb * 1024 * 1024)
+                )
+    return _cache
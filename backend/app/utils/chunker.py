@@ -0,0 +1,338 @@
+import re
+from bisect import bisect_right
+from typing import Iterable, Iterator
+
+# Same rough ratio the LLM scheduler uses to estimate prompt tokens
+CHARS_PER_TOKEN = 4
+
+PARAGRAPH_BREAK_RE = re.compile(r"\n[ \t]*\n\s*")
+SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?])([\"')\]]*)\s+")
+MARKDOWN_HEADING_RE = re.compile(r"[ ]{0,3}#{1,6}[ \t]+(.+?)[ \t#]*$")
+SENTENCE_END_CHARS = ".!?:;,\"')]"
+
+# A standalone line up to this long without closing punctuation is a heading if body text follows it
+MAX_PLAIN_HEADING_CHARS = 80
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of a piece of text"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+class Chunk:
+    """
+    A chunk of a document
+
+    start and end are character offsets into the document text as the
+    pages join up ("".join(page_text + "\n" for each page)), so a chunk can
+    be located in, or expanded from, the source without storing copies.
+    """
+
+    __slots__ = ("text", "start", "end", "page", "section")
+
+    def __init__(self, text: str, start: int, end: int, page: int, section: str | None):
+        self.text = text
+        self.start = start
+        self.end = end
+        self.page = page
+        self.section = section
+
+    def __repr__(self) -> str:
+        return f"Chunk(start={self.start}, end={self.end}, page={self.page}, section={self.section!r})"
+
+
+class _ChunkPacker:
+    """
+    Packs sentence spans into chunks of at most max_chars
+
+    Works on offsets only; text is sliced once per emitted chunk.
+    """
+
+    def __init__(self, text_at, page_at, max_chars: int, overlap_chars: int):
+        self.text_at = text_at
+        self.page_at = page_at
+        self.max_chars = max(1, max_chars)
+        self.overlap_chars = max(0, overlap_chars)
+        # Prefer paragraph boundaries once a chunk is at least half full
+        self.min_chars = self.max_chars // 2
+
+        self.start = None
+        self.end = None
+        self.fresh = False  # Holds text that has not been emitted yet
+        self.last_sentence_start = None
+        self.section = None
+        self.chunk_section = None
+        self.pending = []  # (start, end, title, explicit) of headings no body text followed yet
+        self.ready = []
+
+    def add_heading(self, start: int, end: int, title: str, explicit: bool = True):
+        """
+        Hold a heading until it is known whether body text follows
+
+        Followed by body text, a heading opens a new chunk and labels the
+        chunks after it; headings in a row open that chunk together. A
+        plain title line (explicit=False) followed by another heading was
+        just a short line, e.g. a list item, and is packed as text. A
+        heading longer than max_chars is packed as text too, split between
+        words like any over-long sentence.
+        """
+        if self.pending and not self.pending[-1][3]:
+            plain_start, plain_end, _, _ = self.pending.pop()
+            self._open_pending()
+            self._add_text(plain_start, plain_end)
+        if end - start > self.max_chars:
+            self._add_text(start, end)
+            return
+        if self.pending and end - self.pending[0][0] > self.max_chars:
+            self._pending_as_text()
+        self.pending.append((start, end, title, explicit))
+
+    def start_paragraph(self, length: int):
+        self._open_pending()
+        if self.start is not None and self._length_with(length) > self.max_chars \
+                and self.end - self.start >= self.min_chars:
+            self.flush()
+
+    def add_sentence(self, start: int, end: int):
+        self._open_pending()
+        if end - start > self.max_chars:
+            for piece_start, piece_end in self._split_words(start, end):
+                if self.start is not None and piece_end - self.start > self.max_chars:
+                    self.flush()
+                self._extend(piece_start, piece_end)
+            self.last_sentence_start = None
+            return
+
+        if self.start is not None and end - self.start > self.max_chars:
+            self.flush(overlap=True)
+            if self.start is not None and end - self.start > self.max_chars:
+                # The carried-over sentence leaves no room, drop the overlap
+                self.start = None
+        self._extend(start, end)
+        self.last_sentence_start = start
+
+    def flush(self, overlap: bool = False):
+        if self.start is None:
+            return
+        if self.fresh:
+            self.ready.append(Chunk(
+                self.text_at(self.start, self.end),
+                self.start,
+                self.end,
+                self.page_at(self.start),
+                self.chunk_section
+            ))
+
+        carry = self.last_sentence_start
+        if overlap and carry is not None and carry > self.start and self.end - carry <= self.overlap_chars:
+            # Repeat the last sentence at the start of the next chunk
+            self.start = carry
+            self.fresh = False
+        else:
+            self.start = None
+            self.fresh = False
+        self.last_sentence_start = None
+
+    def finish(self):
+        """Flush the last chunk, with any trailing headings packed as text"""
+        self._pending_as_text()
+        self.flush()
+
+    def take(self) -> list[Chunk]:
+        ready, self.ready = self.ready, []
+        return ready
+
+    def held_from(self) -> int | None:
+        """Smallest document offset the packer may still read, if any"""
+        offsets = [self.pending[0][0]] if self.pending else []
+        if self.start is not None:
+            offsets.append(self.start)
+        return min(offsets) if offsets else None
+
+    def _open_pending(self):
+        """Body text follows the pending headings: start a chunk with them"""
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        self.flush()
+        self.section = pending[-1][2]
+        self._extend(pending[0][0], pending[-1][1])
+        self.last_sentence_start = None
+
+    def _pending_as_text(self):
+        """Pack the pending headings into the current chunk as plain lines"""
+        pending, self.pending = self.pending, []
+        for start, end, _, _ in pending:
+            self._add_text(start, end)
+
+    def _add_text(self, start: int, end: int):
+        self.start_paragraph(end - start)
+        self.add_sentence(start, end)
+
+    def _length_with(self, length: int) -> int:
+        return self.end - self.start + length
+
+    def _extend(self, start: int, end: int):
+        if self.start is None:
+            self.start = start
+            self.chunk_section = self.section
+        self.end = end
+        self.fresh = True
+
+    def _split_words(self, start: int, end: int):
+        """Cut an over-long sentence at whitespace into pieces of at most max_chars"""
+        text = self.text_at(start, end)
+        offset = 0
+        while offset < len(text):
+            cut = min(offset + self.max_chars, len(text))
+            if cut < len(text):
+                space = text.rfind(" ", offset + 1, cut + 1)
+                if space > offset:
+                    cut = space
+            piece_end = cut
+            while piece_end > offset and text[piece_end - 1].isspace():
+                piece_end -= 1
+            if piece_end > offset:
+                yield start + offset, start + piece_end
+            offset = cut
+            while offset < len(text) and text[offset].isspace():
+                offset += 1
+
+
+def chunk_document(
+    pages: Iterable[tuple[int, str]],
+    max_tokens: int = 200,
+    overlap_tokens: int = 32
+) -> Iterator[Chunk]:
+    """
+    Split a stream of pages into structure-aware chunks
+
+    Chunks end on sentence boundaries and prefer paragraph boundaries; a
+    Markdown heading (or a short standalone title line) followed by body
+    text starts a new chunk and becomes the section of the chunks that
+    follow it. Short lines with no body text in between, like list items,
+    are packed together as text.
+    Sentences longer than the budget are split between words. When a
+    chunk is cut mid-paragraph, its last sentence is repeated at the start
+    of the next chunk if it fits in overlap_tokens.
+
+    Pages are consumed lazily and only unchunked text is kept, so memory
+    does not grow with the document.
+
+    Args:
+        pages: Iterable of (page_number, page_text)
+        max_tokens: Token budget per chunk (estimated at ~4 characters per token)
+        overlap_tokens: Largest sentence carried over between chunks
+
+    Yields:
+        Chunk objects in document order
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    # Segment at least this much at a time even without a paragraph break
+    max_pending = max_chars * 8
+
+    buffer = ""
+    base = 0  # Document offset of buffer[0]
+    segmented = 0  # Document offset up to which text has been segmented
+    page_offsets = []
+    page_numbers = []
+
+    def text_at(start: int, end: int) -> str:
+        return buffer[start - base:end - base]
+
+    def page_at(offset: int) -> int:
+        return page_numbers[max(0, bisect_right(page_offsets, offset) - 1)]
+
+    packer = _ChunkPacker(text_at, page_at, max_chars, overlap_tokens * CHARS_PER_TOKEN)
+
+    for page_number, page_text in pages:
+        page_offsets.append(base + len(buffer))
+        page_numbers.append(page_number)
+        buffer += f"{page_text}\n"
+
+        cut = None
+        for match in PARAGRAPH_BREAK_RE.finditer(buffer, segmented - base):
+            cut = match.end()
+        if cut is None and len(buffer) - (segmented - base) > max_pending:
+            cut = buffer.rfind("\n", segmented - base) + 1 or len(buffer)
+
+        if cut is not None and base + cut > segmented:
+            _segment(buffer, base, segmented - base, cut, packer)
+            segmented = base + cut
+            yield from packer.take()
+
+            # Keep only text the current chunk, pending headings or later segmentation still need
+            held = packer.held_from()
+            keep_from = segmented if held is None else min(held, segmented)
+            buffer = buffer[keep_from - base:]
+            base = keep_from
+
+    _segment(buffer, base, segmented - base, len(buffer), packer)
+    packer.finish()
+    yield from packer.take()
+
+
+def chunk_structured_text(text: str, max_tokens: int = 200, overlap_tokens: int = 32) -> list[Chunk]:
+    """Structure-aware chunking of a single text"""
+    return list(chunk_document([(1, text)], max_tokens, overlap_tokens))
+
+
+def _segment(buffer: str, base: int, lo: int, hi: int, packer: _ChunkPacker):
+    """Feed the paragraphs, headings and sentences of buffer[lo:hi] to the packer"""
+    paragraph_start = lo
+    for match in PARAGRAPH_BREAK_RE.finditer(buffer, lo, hi):
+        _segment_paragraph(buffer, base, paragraph_start, match.start(), packer)
+        paragraph_start = match.end()
+    _segment_paragraph(buffer, base, paragraph_start, hi, packer)
+
+
+def _segment_paragraph(buffer: str, base: int, start: int, end: int, packer: _ChunkPacker):
+    start, end = _strip_span(buffer, start, end)
+    if start >= end:
+        return
+
+    # Standalone short line without closing punctuation, e.g. a PDF section title
+    if "\n" not in buffer[start:end] and end - start <= MAX_PLAIN_HEADING_CHARS \
+            and buffer[end - 1] not in SENTENCE_END_CHARS:
+        markdown = MARKDOWN_HEADING_RE.match(buffer, start, end)
+        title = markdown.group(1) if markdown else buffer[start:end]
+        packer.add_heading(base + start, base + end, title, explicit=markdown is not None)
+        return
+
+    block_start = start
+    line_start = start
+    while line_start < end:
+        line_end = buffer.find("\n", line_start, end)
+        if line_end == -1:
+            line_end = end
+        if buffer[line_start:line_start + 4].lstrip(" ").startswith("#"):
+            heading = MARKDOWN_HEADING_RE.match(buffer, line_start, line_end)
+            if heading:
+                _segment_block(buffer, base, block_start, line_start, packer)
+                packer.add_heading(base + line_start, base + line_end, heading.group(1))
+                block_start = line_end + 1
+        line_start = line_end + 1
+    _segment_block(buffer, base, block_start, end, packer)
+
+
+def _segment_block(buffer: str, base: int, start: int, end: int, packer: _ChunkPacker):
+    """Split a run of non-heading lines into sentences"""
+    start, end = _strip_span(buffer, start, end)
+    if start >= end:
+        return
+
+    packer.start_paragraph(end - start)
+    sentence_start = start
+    for match in SENTENCE_BREAK_RE.finditer(buffer, start, end):
+        packer.add_sentence(base + sentence_start, base + match.end(1))
+        sentence_start = match.end()
+    if sentence_start < end:
+        packer.add_sentence(base + sentence_start, base + end)
+
+
+def _strip_span(buffer: str, start: int, end: int) -> tuple[int, int]:
+    while start < end and buffer[start].isspace():
+        start += 1
+    while end > start and buffer[end - 1].isspace():
+        end -= 1
+    return start, end
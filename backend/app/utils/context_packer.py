@@ -0,0 +1,184 @@
+import re
+from app.utils.chunker import CHARS_PER_TOKEN, estimate_tokens
+
+# A chunk sharing this much of its word shingles with a better-ranked one is dropped
+NEAR_DUPLICATE_RATIO = 0.9
+SHINGLE_WORDS = 3
+# Shortest text overlap trimmed between neighbouring chunks without offsets
+MIN_OVERLAP_CHARS = 8
+MAX_OVERLAP_CHARS = 2000
+
+WORD_RE = re.compile(r"\w+")
+
+
+class PackedContext:
+    """
+    Retrieved chunks assembled into a prompt context
+
+    tokens is the estimated size of text; tokens_saved is how much smaller
+    it is than pasting every retrieved chunk as-is. document_ids are the
+    documents that made it into the context, best first.
+    """
+
+    __slots__ = ("text", "document_ids", "tokens", "tokens_saved", "merged", "duplicates", "dropped")
+
+    def __init__(self, text: str, document_ids: list, tokens: int, tokens_saved: int,
+                 merged: int, duplicates: int, dropped: int):
+        self.text = text
+        self.document_ids = document_ids
+        self.tokens = tokens
+        self.tokens_saved = tokens_saved
+        self.merged = merged
+        self.duplicates = duplicates
+        self.dropped = dropped
+
+    def __repr__(self) -> str:
+        return f"PackedContext(tokens={self.tokens}, tokens_saved={self.tokens_saved})"
+
+
+class _Span:
+    """Consecutive chunks of one document, merged into one passage"""
+
+    __slots__ = ("document_id", "first_index", "last_index", "start", "end", "text", "rank")
+
+    def __init__(self, hit, rank: int):
+        metadata = hit.metadata
+        self.document_id = metadata.get("document_id")
+        self.first_index = self.last_index = metadata.get("chunk_index")
+        self.start = metadata.get("start_char")
+        self.end = metadata.get("end_char")
+        self.text = hit.document
+        self.rank = rank
+
+    def follows(self, other: "_Span") -> bool:
+        """Whether this span starts right where other ends"""
+        if self.document_id != other.document_id or self.first_index is None or other.last_index is None:
+            return False
+        return self.first_index == other.last_index + 1
+
+    def absorb(self, other: "_Span"):
+        """Append the span that follows this one, without their shared overlap"""
+        if self.end is not None and other.start is not None:
+            if other.start < self.end:
+                self.text += other.text[self.end - other.start:]
+            else:
+                self.text += "\n" + other.text
+        else:
+            overlap = _text_overlap(self.text, other.text)
+            self.text += other.text[overlap:] if overlap else "\n" + other.text
+        self.last_index = other.last_index
+        self.end = other.end
+        self.rank = min(self.rank, other.rank)
+
+
+def naive_context(hits: list) -> str:
+    """Every chunk pasted as-is, as the context used to be built"""
+    return "\n\n".join(f"[Chunk {i + 1}]: {hit.document}" for i, hit in enumerate(hits))
+
+
+def pack_context(hits: list, token_budget: int) -> PackedContext:
+    """
+    Assemble retrieved chunks into a context of at most token_budget tokens
+
+    Near-duplicate chunks are dropped in favour of the better-ranked copy,
+    consecutive chunks of a document are merged into one passage without
+    their repeated overlap (using the chunks' character offsets, or the
+    text itself for fixed-size chunks), and passages are added best first
+    while they fit. The best passage is cut to the budget rather than left
+    out, so the context is never empty when anything was retrieved.
+
+    Args:
+        hits: SearchHit list, best first
+        token_budget: Largest estimated context size in tokens
+
+    Returns:
+        PackedContext
+    """
+    kept, shingles, duplicates = [], [], 0
+    for hit in hits:
+        words = _shingles(hit.document)
+        if any(_is_near_duplicate(words, other) for other in shingles):
+            duplicates += 1
+            continue
+        kept.append(hit)
+        shingles.append(words)
+
+    spans = _merge_spans([_Span(hit, rank) for rank, hit in enumerate(kept)])
+    merged = len(kept) - len(spans)
+
+    passages, used, dropped = [], 0, 0
+    for span in sorted(spans, key=lambda span: span.rank):
+        # Header and separator of the passage
+        overhead = estimate_tokens(f"[Chunk {len(passages) + 1}]: \n\n")
+        tokens = estimate_tokens(span.text) + overhead
+        if used + tokens <= token_budget:
+            passages.append(span)
+            used += tokens
+        elif not passages and token_budget > overhead:
+            span.text = _truncate(span.text, (token_budget - overhead) * CHARS_PER_TOKEN)
+            passages.append(span)
+            used += estimate_tokens(span.text) + overhead
+        else:
+            dropped += 1
+
+    text = "\n\n".join(f"[Chunk {i + 1}]: {span.text}" for i, span in enumerate(passages))
+    document_ids = []
+    for span in passages:
+        if span.document_id not in document_ids:
+            document_ids.append(span.document_id)
+
+    tokens = estimate_tokens(text)
+    return PackedContext(
+        text=text,
+        document_ids=document_ids,
+        tokens=tokens,
+        tokens_saved=max(0, estimate_tokens(naive_context(hits)) - tokens),
+        merged=merged,
+        duplicates=duplicates,
+        dropped=dropped
+    )
+
+
+def _merge_spans(spans: list[_Span]) -> list[_Span]:
+    """Merge spans of consecutive chunks of the same document, keeping the best rank"""
+    ordered = sorted(
+        spans,
+        key=lambda span: (str(span.document_id), span.first_index is None, span.first_index or 0)
+    )
+    merged = []
+    for span in ordered:
+        if merged and span.follows(merged[-1]):
+            merged[-1].absorb(span)
+        else:
+            merged.append(span)
+    return merged
+
+
+def _shingles(text: str) -> set:
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _is_near_duplicate(shingles: set, other: set) -> bool:
+    """Whether most of a chunk's shingles already appear in a kept chunk"""
+    if not shingles:
+        return not other
+    return len(shingles & other) >= NEAR_DUPLICATE_RATIO * len(shingles)
+
+
+def _text_overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that starts right"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars, at a word boundary when there is one"""
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars + 1)
+    return text[:cut if cut > 0 else max_chars].rstrip()
@@ -0,0 +1,312 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from app.config import get_settings
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, the cache is then only safe for a single worker
+    fcntl = None
+
+settings = get_settings()
+
+WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace, so layout-only differences share a vector"""
+    return WHITESPACE_RE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def get_model_id(embedding_function) -> str:
+    """Identify the model behind an embedding function"""
+    return getattr(embedding_function, "MODEL_NAME", None) or type(embedding_function).__name__
+
+
+class EmbeddingCache:
+    """
+    Disk-backed cache of chunk embeddings
+
+    Vectors live in a memory-mapped float32 file with one row per slot;
+    a SQLite index maps the hash of (model id, normalized text) to its slot
+    and last use. The index is mirrored in memory as an LRU list, and once
+    all max_entries slots are taken the least recently used one is reused.
+
+    Several processes (e.g. uvicorn workers) can share a cache directory:
+    every lookup and write holds an exclusive lock on index.lock, and a
+    generation token in the index tells a process to reload its in-memory
+    index after another one allocated or evicted slots.
+    """
+
+    def __init__(self, directory: str, model_id: str, max_entries: int):
+        self.model_id = model_id
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        safe_model = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_id)
+        self.directory = Path(directory) / safe_model
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._vectors_path = self.directory / "vectors.f32"
+        self._lock_file = open(self.directory / "index.lock", "a")
+
+        self._conn = sqlite3.connect(str(self.directory / "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embedding_cache (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embedding_cache_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        self.dim = None
+        self._vectors = None
+        self._lru = OrderedDict()  # key -> slot, least recently used first
+        self._free = []
+        self._generation = None
+        with self._locked():
+            self._load()
+            self._generation = self._stored_generation()
+
+    @staticmethod
+    def make_key(model_id: str, normalized_text: str) -> str:
+        return hashlib.sha256(f"{model_id}\x00{normalized_text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        """Look up vectors; returns the keys that were found"""
+        found = {}
+        with self._locked():
+            self._sync()
+            slots = []
+            for key in keys:
+                slot = self._lru.get(key)
+                if slot is not None:
+                    self._lru.move_to_end(key)
+                    slots.append((key, slot))
+            if slots:
+                # Fancy indexing copies, so a later eviction can't change the result
+                rows = self._vectors[[slot for _, slot in slots]]
+                found = {key: row for (key, _), row in zip(slots, rows)}
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: dict[str, np.ndarray]):
+        if not items:
+            return
+        with self._locked():
+            self._sync()
+            if self._vectors is None:
+                self._open_vectors(len(next(iter(items.values()))))
+
+            rows = {}
+            for key, vector in items.items():
+                if len(vector) != self.dim:
+                    continue
+                slot = self._lru.get(key)
+                if slot is None:
+                    if not self._free:
+                        # A batch larger than the cache may evict its own earlier entries
+                        rows.pop(next(iter(self._lru)), None)
+                    slot = self._allocate()
+                self._lru[key] = slot
+                self._lru.move_to_end(key)
+                self._vectors[slot] = vector
+                rows[key] = slot
+
+            # Vectors reach the file before the index points at them
+            self._vectors.flush()
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, now) for key, slot in rows.items()]
+            )
+            self._new_generation()
+            self._conn.commit()
+
+    def clear(self):
+        with self._locked():
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._new_generation()
+            self._conn.commit()
+            self._lru.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._lru)
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_id,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "dim": self.dim,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    @contextmanager
+    def _locked(self):
+        """Hold the cache against other threads and, through index.lock, other processes"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _stored_generation(self) -> str | None:
+        row = self._conn.execute(
+            "SELECT value FROM embedding_cache_meta WHERE name = 'generation'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _new_generation(self):
+        """Mark the slot index changed, so other processes reload it (commit follows)"""
+        self._generation = uuid.uuid4().hex
+        self._conn.execute(
+            "INSERT OR REPLACE INTO embedding_cache_meta (name, value) VALUES ('generation', ?)",
+            (self._generation,)
+        )
+
+    def _sync(self):
+        """Reload the index if another process changed it since this one last did"""
+        generation = self._stored_generation()
+        if generation != self._generation:
+            self._load()
+            self._generation = generation
+
+    def _load(self):
+        self._lru.clear()
+        row = self._conn.execute(
+            "SELECT value FROM embedding_cache_meta WHERE name = 'dim'"
+        ).fetchone()
+        if row is None or not self._vectors_path.exists():
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._conn.commit()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            return
+
+        self._open_vectors(int(row[0]))
+        used = set()
+        stale = []
+        for key, slot in self._conn.execute(
+            "SELECT key, slot FROM embedding_cache ORDER BY last_used ASC"
+        ):
+            if slot in used:
+                stale.append((key,))
+                continue
+            self._lru[key] = slot
+            used.add(slot)
+        if stale:
+            self._conn.executemany("DELETE FROM embedding_cache WHERE key = ?", stale)
+            self._conn.commit()
+        self._free = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def _open_vectors(self, dim: int):
+        shape = (self.max_entries, dim)
+        size = self.max_entries * dim * 4
+        if self._vectors_path.exists() and self._vectors_path.stat().st_size == size:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=shape)
+        else:
+            # New model dimension or capacity: start over (the file is sparse until written)
+            self._conn.execute("DELETE FROM embedding_cache")
+            self._lru.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="w+", shape=shape)
+            self._new_generation()
+        self.dim = dim
+        self._conn.execute(
+            "INSERT OR REPLACE INTO embedding_cache_meta (name, value) VALUES ('dim', ?)", (str(dim),)
+        )
+        self._conn.commit()
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        key, slot = self._lru.popitem(last=False)
+        self._conn.execute("DELETE FROM embedding_cache WHERE key = ?", (key,))
+        self.evictions += 1
+        return slot
+
+
+class CachedEmbeddingFunction:
+    """
+    Chroma embedding function that serves repeated chunks from an EmbeddingCache
+
+    Texts are normalized before hashing and before embedding, so a cached
+    vector is exactly what the model would return for the text. Duplicates
+    within one call are embedded once.
+    """
+
+    def __init__(self, embedding_function, cache: EmbeddingCache):
+        self.embedding_function = embedding_function
+        self.cache = cache
+        self.embed_seconds = 0.0
+        self.embedded = 0
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        texts = [normalize_text(text) for text in input]
+        keys = [EmbeddingCache.make_key(self.cache.model_id, text) for text in texts]
+        vectors = self.cache.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        if missing:
+            start = time.perf_counter()
+            computed = self.embedding_function(list(missing.values()))
+            self.embed_seconds += time.perf_counter() - start
+            self.embedded += len(missing)
+
+            computed = dict(zip(missing, np.asarray(computed, dtype=np.float32)))
+            self.cache.put_many(computed)
+            vectors.update(computed)
+
+        return [vectors[key].tolist() for key in keys]
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        per_text = self.embed_seconds / self.embedded if self.embedded else 0.0
+        stats["embed_seconds"] = round(self.embed_seconds, 3)
+        stats["estimated_seconds_saved"] = round(per_text * self.cache.hits, 3)
+        return stats
+
+
+def get_cached_embedding_function(embedding_function) -> CachedEmbeddingFunction:
+    """Wrap an embedding function with a disk cache for its model"""
+    return CachedEmbeddingFunction(
+        embedding_function,
+        EmbeddingCache(
+            settings.embedding_cache_dir,
+            get_model_id(embedding_function),
+            settings.embedding_cache_max_entries
+        )
+    )
@@ -0,0 +1,465 @@
+"""
+Local embedding service shared by all API worker processes
+
+The service loads the embedding model once and serves requests over a
+Unix socket, coalescing concurrent requests into micro-batches. API
+workers use EmbeddingServiceClient as the collection's embedding
+function. Run it standalone with:
+
+    python -m app.utils.embedding_service
+"""
+import argparse
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from pathlib import Path
+import numpy as np
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+from app.config import get_settings
+from app.utils.embedding_cache import CachedEmbeddingFunction, get_cached_embedding_function
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, the service is then never auto-started
+    fcntl = None
+
+settings = get_settings()
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+
+class EmbeddingServiceError(Exception):
+    """The embedding service could not be reached or failed a request"""
+
+
+class _OrtWithSessionOptions:
+    """onnxruntime module proxy that creates every InferenceSession with the given options"""
+
+    def __init__(self, ort, options):
+        self._ort = ort
+        self._options = options
+
+    def __getattr__(self, name):
+        return getattr(self._ort, name)
+
+    def InferenceSession(self, *args, **kwargs):
+        kwargs.setdefault("sess_options", self._options)
+        return self._ort.InferenceSession(*args, **kwargs)
+
+
+class LocalEmbeddingFunction(ONNXMiniLM_L6_V2):
+    """Chroma's default ONNX model with a configurable number of inference threads"""
+
+    def __init__(self, threads: int = 0):
+        super().__init__()
+        if threads > 0:
+            options = self.ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            self.ort = _OrtWithSessionOptions(self.ort, options)
+
+
+def load_embedding_model():
+    """The embedding function used in-process, behind the cache when enabled"""
+    model = LocalEmbeddingFunction(settings.embedding_threads)
+    if settings.embedding_cache_enabled:
+        return get_cached_embedding_function(model)
+    return model
+
+
+class EmbeddingService:
+    """
+    Embedding server for local clients
+
+    Each client connection is served by its own thread, which queues its
+    request and waits for the result. A single batching thread takes
+    everything queued (waiting up to max_wait_ms for more while below
+    max_batch texts) and runs the model once per micro-batch, so requests
+    that arrive while the model is busy are embedded together.
+    """
+
+    def __init__(self, embedding_function, address: str, max_batch: int, max_wait_ms: float, idle_seconds: float = 0):
+        self.embedding_function = embedding_function
+        self.address = address
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.idle_seconds = idle_seconds
+
+        self._requests = queue.Queue()
+        self._listener = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._connections = 0
+        self._idle_since = time.monotonic()
+        self._stats = {
+            "requests": 0,
+            "texts": 0,
+            "batches": 0,
+            "model_seconds": 0.0,
+            "max_queue_ms": 0.0,
+            "errors": 0
+        }
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self._listener = Listener(self.address, family="AF_UNIX")
+        # Only this user may connect; requests are pickled
+        os.chmod(self.address, 0o600)
+
+        threading.Thread(target=self._batch_loop, name="embedding-batcher", daemon=True).start()
+        if self.idle_seconds > 0:
+            threading.Thread(target=self._idle_loop, name="embedding-idle", daemon=True).start()
+
+        print(f"✓ Embedding service listening on {self.address}")
+        try:
+            while not self._stopped.is_set():
+                try:
+                    conn = self._listener.accept()
+                except OSError:
+                    if self._stopped.is_set():
+                        break
+                    raise
+                if self._stopped.is_set():
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+        finally:
+            self.close()
+
+    def close(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self._requests.put(None)
+        if self._listener is not None:
+            # Closing the listener does not wake a blocked accept() on every platform
+            _poke(self.address)
+            self._listener.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["connections"] = self._connections
+        stats["queued"] = self._requests.qsize()
+        stats["avg_batch_texts"] = round(stats["texts"] / stats["batches"], 1) if stats["batches"] else 0.0
+        stats["model_seconds"] = round(stats["model_seconds"], 3)
+        stats["max_queue_ms"] = round(stats["max_queue_ms"], 2)
+        stats["max_batch"] = self.max_batch
+        if isinstance(self.embedding_function, CachedEmbeddingFunction):
+            stats["cache"] = self.embedding_function.stats()
+        return stats
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Queue texts for the next micro-batch and wait for their vectors"""
+        future = Future()
+        self._requests.put((texts, future, time.monotonic()))
+        return future.result()
+
+    def _serve_connection(self, conn):
+        with self._lock:
+            self._connections += 1
+        try:
+            while True:
+                try:
+                    kind, payload = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if kind == "embed":
+                        reply = ("ok", self.embed(payload))
+                    elif kind == "stats":
+                        reply = ("ok", self.stats())
+                    else:
+                        reply = ("error", f"Unknown request: {kind}")
+                except Exception as e:
+                    reply = ("error", f"{type(e).__name__}: {e}")
+                conn.send(reply)
+        finally:
+            conn.close()
+            with self._lock:
+                self._connections -= 1
+                self._idle_since = time.monotonic()
+
+    def _batch_loop(self):
+        while True:
+            first = self._requests.get()
+            if first is None:
+                return
+            batch = [first]
+            count = len(first[0])
+
+            deadline = time.monotonic() + self.max_wait
+            while count < self.max_batch:
+                try:
+                    item = self._requests.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._requests.put(None)
+                    break
+                batch.append(item)
+                count += len(item[0])
+
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: list):
+        texts = [text for item_texts, _, _ in batch for text in item_texts]
+        start = time.monotonic()
+        try:
+            vectors = np.asarray(self.embedding_function(texts) if texts else [], dtype=np.float32)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        elapsed = time.monotonic() - start
+
+        with self._lock:
+            self._stats["requests"] += len(batch)
+            self._stats["texts"] += len(texts)
+            self._stats["batches"] += 1
+            self._stats["model_seconds"] += elapsed
+            self._stats["max_queue_ms"] = max(
+                self._stats["max_queue_ms"],
+                max((start - queued_at) * 1000 for _, _, queued_at in batch)
+            )
+
+        offset = 0
+        for item_texts, future, _ in batch:
+            future.set_result(vectors[offset:offset + len(item_texts)])
+            offset += len(item_texts)
+
+    def _idle_loop(self):
+        """Exit once no client has been connected for idle_seconds"""
+        while not self._stopped.wait(timeout=min(self.idle_seconds, 10.0)):
+            with self._lock:
+                idle = self._connections == 0 and time.monotonic() - self._idle_since >= self.idle_seconds
+            if idle:
+                print("✓ Embedding service idle, shutting down")
+                self.close()
+                return
+
+
+def _poke(address: str):
+    try:
+        Client(address, family="AF_UNIX").close()
+    except OSError:
+        pass
+
+
+class EmbeddingServiceClient:
+    """
+    Chroma embedding function that embeds through the embedding service
+
+    Keeps a small pool of connections so concurrent callers in one
+    process do not wait on each other; the service batches their requests
+    together. A broken connection is retried once on a fresh one, starting
+    the service again when auto_start is set.
+    """
+
+    def __init__(self, address: str, timeout: float, auto_start: bool):
+        self.address = address
+        self.timeout = timeout
+        self.auto_start = auto_start
+        self._pool = []
+        self._lock = threading.Lock()
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        return self._request("embed", list(input)).tolist()
+
+    def stats(self) -> dict:
+        return self._request("stats", None)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
+
+    def _request(self, kind: str, payload):
+        for attempt in range(2):
+            try:
+                conn = self._checkout(fresh=attempt > 0)
+            except OSError as e:
+                if attempt == 0:
+                    continue
+                raise EmbeddingServiceError(f"Embedding service is not running at {self.address}: {e}")
+            try:
+                conn.send((kind, payload))
+                if not conn.poll(self.timeout):
+                    conn.close()
+                    raise EmbeddingServiceError(f"Embedding service did not answer within {self.timeout:g}s")
+                status, result = conn.recv()
+            except (EOFError, OSError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise EmbeddingServiceError(f"Embedding service connection failed: {e}")
+
+            self._checkin(conn)
+            if status != "ok":
+                raise EmbeddingServiceError(result)
+            return result
+
+    def _checkout(self, fresh: bool):
+        with self._lock:
+            if self._pool and not fresh:
+                return self._pool.pop()
+        if fresh and self.auto_start:
+            ensure_embedding_service(self.address)
+        return Client(self.address, family="AF_UNIX")
+
+    def _checkin(self, conn):
+        with self._lock:
+            self._pool.append(conn)
+
+
+def service_supported() -> bool:
+    return hasattr(socket, "AF_UNIX") and fcntl is not None
+
+
+def _can_connect(address: str) -> bool:
+    try:
+        Client(address, family="AF_UNIX").close()
+        return True
+    except OSError:
+        return False
+
+
+def _lock_path(address: str) -> str:
+    return f"{address}.lock"
+
+
+def ensure_embedding_service(address: str, wait_seconds: float = 30.0) -> bool:
+    """
+    Make sure an embedding service is listening, starting one if needed
+
+    The running service holds an exclusive lock next to its socket, so
+    when several API workers start at once only one of them launches it.
+
+    Returns:
+        Whether the service accepts connections
+    """
+    deadline = time.monotonic() + wait_seconds
+    started = False
+    while True:
+        if _can_connect(address):
+            return True
+        # The lock is also held by a service that is still starting or shutting down
+        if not started and _lock_is_free(address):
+            env = dict(os.environ)
+            env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+            subprocess.Popen(
+                [sys.executable, "-m", "app.utils.embedding_service", "--idle-exit"],
+                cwd=os.getcwd(),
+                env=env,
+                start_new_session=True
+            )
+            started = True
+            print("✓ Started embedding service")
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.1)
+
+
+def _lock_is_free(address: str) -> bool:
+    with open(_lock_path(address), "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
+
+
+_embedding_function = None
+_embedding_function_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """
+    Get the process-wide embedding function for the chunk collection
+
+    Uses the embedding service unless embedding_service_mode is "off" (or
+    Unix sockets are unavailable); falls back to loading the model
+    in-process if an auto-started service does not come up.
+    """
+    global _embedding_function
+    if _embedding_function is None:
+        with _embedding_function_lock:
+            if _embedding_function is None:
+                _embedding_function = _create_embedding_function()
+    return _embedding_function
+
+
+def _create_embedding_function():
+    mode = settings.embedding_service_mode
+    address = settings.embedding_service_socket
+    if mode == "off" or not service_supported():
+        return load_embedding_model()
+
+    auto_start = mode == "auto"
+    if auto_start and not ensure_embedding_service(address):
+        print("✗ Embedding service did not start, embedding in-process")
+        return load_embedding_model()
+    return EmbeddingServiceClient(address, settings.embedding_service_timeout_seconds, auto_start)
+
+
+def get_embedding_stats() -> dict:
+    """Embedding cache and service statistics of this process' embedding function"""
+    function = _embedding_function
+    if isinstance(function, EmbeddingServiceClient):
+        try:
+            service = function.stats()
+        except EmbeddingServiceError as e:
+            service = {"error": str(e)}
+        return {"embedding_cache": service.pop("cache", None), "embedding_service": service}
+    if isinstance(function, CachedEmbeddingFunction):
+        return {"embedding_cache": function.stats(), "embedding_service": None}
+    return {"embedding_cache": None, "embedding_service": None}
+
+
+def close_embedding_function():
+    if isinstance(_embedding_function, EmbeddingServiceClient):
+        _embedding_function.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embedding service")
+    parser.add_argument("--socket", default=settings.embedding_service_socket)
+    parser.add_argument("--idle-exit", action="store_true",
+                        help="Exit after embedding_service_idle_seconds without clients")
+    args = parser.parse_args()
+
+    # Held for the service's lifetime; a second instance exits right away
+    lock_file = open(_lock_path(args.socket), "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print(f"✓ Embedding service already running on {args.socket}")
+        return
+
+    service = EmbeddingService(
+        load_embedding_model(),
+        args.socket,
+        max_batch=settings.embedding_service_max_batch,
+        max_wait_ms=settings.embedding_service_max_wait_ms,
+        idle_seconds=settings.embedding_service_idle_seconds if args.idle_exit else 0
+    )
+    try:
+        # Closing the listener removes the socket file
+        service.serve_forever()
+    except KeyboardInterrupt:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
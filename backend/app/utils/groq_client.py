@@ -1,12 +1,10 @@
-from groq import Groq
 from app.config import get_settings
+from app.utils.llm_client import chat_completion
 import json
 
 settings = get_settings()
 
-def get_groq_client():
-    """Get Groq client with lazy initialization"""
-    return Groq(api_key=settings.groq_api_key)
+PARA_CATEGORIES = ["Projects", "Areas", "Resources", "Archives"]
 
 
 def extract_topics(text: str, top_n: int = 3) -> list[str]:
@@ -29,15 +27,13 @@ Example output: ["Machine Learning", "Data Science", "Python"]
 """
     
     try:
-        client = get_groq_client()
-        response = client.chat.completions.create(
+        result = chat_completion(
+            "extract_topics:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.3,
             max_tokens=100
         )
-        
-        result = response.choices[0].message.content.strip()
         topics = json.loads(result)
         return topics[:top_n]
     except Exception as e:
@@ -74,19 +70,16 @@ Text: {text[:1500]}
 Return ONLY the category name (Projects, Areas, Resources, or Archives), nothing else."""
     
     try:
-        client = get_groq_client()
-        response = client.chat.completions.create(
+        result = chat_completion(
+            "classify_para:v1",
             model="llama-3.1-8b-instant",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
             max_tokens=20
         )
         
-        result = response.choices[0].message.content.strip()
-        
         # Validate result
-        valid_categories = ["Projects", "Areas", "Resources", "Archives"]
-        for category in valid_categories:
+        for category in PARA_CATEGORIES:
             if category.lower() in result.lower():
                 return category
         
@@ -96,6 +89,83 @@ Return ONLY the category name (Projects, Areas, Resources, or Archives), nothing
         return "Resources"
 
 
+def extract_enrichment(text: str, title: str, top_n: int = 3) -> dict:
+    """
+    Classify PARA, extract topics and extract tasks in one structured call
+    
+    Each field is validated on its own; a field that is missing or malformed
+    is returned as None so the caller can fall back to the single-purpose
+    function for just that field.
+    
+    Args:
+        text: Document text
+        title: Document title
+        top_n: Number of topics to extract
+    
+    Returns:
+        Dictionary with para_type, topics and tasks (raw task objects)
+    """
+    prompt = f"""Analyze this document and return a JSON object with exactly these keys:
+- "para_type": ONE of "Projects", "Areas", "Resources", "Archives"
+  - Projects: Active assignments, personal projects, things with deadlines
+  - Areas: Ongoing responsibilities (academics, career, health, finance)
+  - Resources: Learning materials, references, guides, documentation
+  - Archives: Completed or old documents
+- "topics": array of the top {top_n} main topics or themes
+- "tasks": array of tasks, action items, TODOs and assignments, each
+  {{"title": "...", "due_date_text": "..." or null}}. Use [] if there are none.
+
+Title: {title}
+Text: {text[:3000]}
+
+Example output:
+{{"para_type": "Projects", "topics": ["Machine Learning", "Python"], "tasks": [{{"title": "Complete assignment", "due_date_text": "December 10"}}]}}
+
+Return ONLY the JSON object, nothing else."""
+    
+    enrichment = {"para_type": None, "topics": None, "tasks": None}
+    
+    try:
+        response = chat_completion(
+            "enrichment:v1",
+            model="llama-3.1-8b-instant",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=600,
+            response_format={"type": "json_object"}
+        )
+        
+        result = json.loads(response)
+    except Exception as e:
+        print(f"Error extracting enrichment: {e}")
+        return enrichment
+    
+    if not isinstance(result, dict):
+        return enrichment
+    
+    para_type = result.get("para_type")
+    if isinstance(para_type, str):
+        for category in PARA_CATEGORIES:
+            if para_type.strip().lower() == category.lower():
+                enrichment["para_type"] = category
+    
+    topics = result.get("topics")
+    if isinstance(topics, list):
+        topics = [t.strip() for t in topics if isinstance(t, str) and t.strip()]
+        if topics:
+            enrichment["topics"] = topics[:top_n]
+    
+    tasks = result.get("tasks")
+    if isinstance(tasks, list) and all(
+        isinstance(t, dict) and isinstance(t.get("title"), str)
+        and (t.get("due_date_text") is None or isinstance(t.get("due_date_text"), str))
+        for t in tasks
+    ):
+        enrichment["tasks"] = tasks
+    
+    return enrichment
+
+
 def extract_tasks_stub(text: str) -> list[str]:
     """
     Stub for task extraction - will be fully implemented later
@@ -0,0 +1,72 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows, every process is then its own leader
+    fcntl = None
+
+
+class LeaderElection:
+    """
+    Elects one leader among the API worker processes with a file lock
+
+    The leader holds an exclusive lock on lock_path for as long as it
+    runs; the kernel releases it when the process exits, however it
+    exits. The other processes retry every retry_seconds and one of them
+    takes over once the leader is gone. on_elected runs in the process
+    that wins, once.
+    """
+
+    def __init__(self, lock_path: str, on_elected, retry_seconds: float = 5.0):
+        self.lock_path = lock_path
+        self.on_elected = on_elected
+        self.retry_seconds = retry_seconds
+        self.is_leader = False
+        self._file = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Try to become leader now, and keep trying in the background if another process is"""
+        if self._try_acquire():
+            return
+        self._thread = threading.Thread(target=self._retry_loop, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop campaigning and give up leadership"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        if self._file is not None:
+            self._file.close()  # Releases the lock
+            self._file = None
+        self.is_leader = False
+
+    def _retry_loop(self):
+        while not self._stop.wait(timeout=self.retry_seconds):
+            if self._try_acquire():
+                return
+
+    def _try_acquire(self) -> bool:
+        if fcntl is not None:
+            lock_file = open(self.lock_path, "a+")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+            lock_file.seek(0)
+            lock_file.truncate()
+            lock_file.write(f"{os.getpid()}\n")
+            lock_file.flush()
+            self._file = lock_file
+
+        self.is_leader = True
+        print(f"✓ Process {os.getpid()} elected leader")
+        try:
+            self.on_elected()
+        except Exception as e:
+            print(f"✗ Leader startup failed: {e}")
+        return True
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+import httpx
+from groq import Groq, RateLimitError
+from app.config import get_settings
+from app.utils.llm_cache import get_llm_cache
+from app.utils.llm_scheduler import (
+    BACKGROUND, get_scheduler, estimate_tokens, parse_reset
+)
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+_client = None
+_client_lock = threading.Lock()
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.llm_max_connections,
+        max_keepalive_connections=settings.llm_max_connections
+    )
+
+
+def get_client() -> Groq:
+    """Get the process-wide Groq client (pooled, keep-alive connections)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Groq(
+                    api_key=settings.groq_api_key,
+                    base_url=settings.groq_base_url or None,
+                    timeout=settings.llm_timeout_seconds,
+                    max_retries=0,
+                    http_client=httpx.Client(
+                        limits=_http_limits(),
+                        timeout=settings.llm_timeout_seconds
+                    )
+                )
+    return _client
+
+
+def _is_cacheable(params: dict) -> bool:
+    return (
+        settings.llm_cache_enabled
+        and params.get("temperature", 1.0) <= settings.llm_cache_max_temperature
+    )
+
+
+def _record_call(prompt_version: str, elapsed: float, cached: bool = False, failed: bool = False):
+    with _stats_lock:
+        stats = _stats.setdefault(prompt_version, {
+            "calls": 0,
+            "cache_hits": 0,
+            "errors": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0
+        })
+        if cached:
+            stats["cache_hits"] += 1
+            return
+        stats["calls"] += 1
+        stats["errors"] += int(failed)
+        stats["total_seconds"] += elapsed
+        stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+    logger.debug(f"LLM call {prompt_version} took {elapsed * 1000:.0f} ms")
+
+
+def get_call_stats() -> dict:
+    """Per-prompt call counts and latency, measured around the API call"""
+    with _stats_lock:
+        return {
+            prompt_version: {
+                **stats,
+                "avg_seconds": stats["total_seconds"] / stats["calls"] if stats["calls"] else 0.0
+            }
+            for prompt_version, stats in _stats.items()
+        }
+
+
+def _retry_delay(error: RateLimitError, attempt: int) -> float:
+    """Server-provided retry-after, else exponential back-off"""
+    headers = error.response.headers if error.response is not None else {}
+    delay = parse_reset(headers.get("retry-after")) or parse_reset(headers.get("x-ratelimit-reset-requests"))
+    return delay or min(2.0 ** attempt, 30.0)
+
+
+def _used_tokens(response) -> int | None:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None)
+
+
+def chat_completion(prompt_version: str, priority: int = BACKGROUND, **params) -> str:
+    """
+    Run a chat completion on the shared client
+
+    Deterministic calls (temperature at or below llm_cache_max_temperature)
+    are served from the LLM cache when possible. Everything else goes
+    through the LLM scheduler, which enforces the rate limits and the
+    concurrency cap and serves the interactive lane first; 429 responses
+    pause all lanes and are retried up to llm_max_retries times.
+
+    Args:
+        prompt_version: Name and version of the prompt template, e.g. "classify_para:v1".
+            Bump it whenever the template changes.
+        priority: INTERACTIVE for user-facing requests, BACKGROUND otherwise
+        **params: Arguments for chat.completions.create
+
+    Returns:
+        Stripped message content of the first choice
+    """
+    cacheable = _is_cacheable(params)
+
+    if cacheable:
+        cache = get_llm_cache()
+        key = cache.make_key(prompt_version, params)
+        cached = cache.get(key)
+        if cached is not None:
+            _record_call(prompt_version, 0.0, cached=True)
+            return cached
+
+    client = get_client()
+    scheduler = get_scheduler()
+    estimated = estimate_tokens(params)
+
+    for attempt in range(settings.llm_max_retries + 1):
+        scheduler.acquire(priority, estimated)
+        used = None
+        start = time.perf_counter()
+        try:
+            raw = client.chat.completions.with_raw_response.create(**params)
+            scheduler.observe_headers(raw.headers)
+            response = raw.parse()
+            used = _used_tokens(response)
+        except RateLimitError as e:
+            _record_call(prompt_version, time.perf_counter() - start, failed=True)
+            scheduler.backoff(priority, _retry_delay(e, attempt))
+            if attempt == settings.llm_max_retries:
+                raise
+            continue
+        except Exception:
+            _record_call(prompt_version, time.perf_counter() - start, failed=True)
+            raise
+        finally:
+            scheduler.release(estimated, used)
+
+        _record_call(prompt_version, time.perf_counter() - start)
+        break
+
+    content = response.choices[0].message.content.strip()
+
+    if cacheable:
+        cache.set(key, prompt_version, content)
+
+    return content
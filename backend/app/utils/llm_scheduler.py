@@ -0,0 +1,273 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from sqlalchemy.exc import SQLAlchemyError
+from app.config import get_settings
+from app.db.rate_limits import SharedBuckets
+
+settings = get_settings()
+
+# Priority lanes, lower value is served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, floor: float = 0.0) -> float:
+        """Seconds until amount can be taken while keeping floor in the bucket"""
+        amount = min(amount, self.capacity - floor)
+        missing = amount + floor - self.level
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+def parse_reset(value: str | None) -> float | None:
+    """Parse rate-limit reset values such as "7.66s", "2m59.56s" or "120" into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    units = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(number) * units[unit] for number, unit in parts)
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM requests
+
+    Requests wait until the requests-per-minute and tokens-per-minute
+    buckets, the concurrency limit and any 429 back-off allow them through.
+    Waiters are served strictly by lane, so an interactive request never
+    queues behind background work, and background requests may not dip into
+    the share of each bucket reserved for interactive traffic.
+
+    With shared=True the two buckets live in the database and every API
+    worker draws from them, so the limits hold for the whole deployment;
+    otherwise each process enforces them on its own. Concurrency and 429
+    back-off are always per process.
+    """
+
+    def __init__(self, rpm: int, tpm: int, max_concurrency: int, interactive_reserve: float, shared: bool = False):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max(1, max_concurrency)
+        self.interactive_reserve = min(max(interactive_reserve, 0.0), 0.9)
+        self.shared = SharedBuckets({"requests": self.requests, "tokens": self.tokens}) if shared else None
+
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._admitting = None  # Ticket drawing from the shared buckets, with the condition released
+        # Latest x-ratelimit-remaining-* values as (remaining, reset_at)
+        self._server_remaining = {}
+        self._stats = {
+            lane: {"admitted": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0, "rate_limited": 0}
+            for lane in LANE_NAMES
+        }
+
+    def acquire(self, priority: int, estimated_tokens: int) -> float:
+        """
+        Block until a request may be sent
+
+        Returns:
+            Seconds spent waiting
+        """
+        ticket = (priority, next(self._sequence))
+        start = time.monotonic()
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    wait = self._admission_wait(ticket, estimated_tokens)
+                    if wait == 0.0:
+                        break
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                self._remove_waiter(ticket)
+                self._cond.notify_all()
+                raise
+
+            # Not necessarily the head: a higher lane may have queued during a shared take
+            self._remove_waiter(ticket)
+            for kind, amount in (("requests", 1), ("tokens", estimated_tokens)):
+                if kind in self._server_remaining:
+                    remaining, reset_at = self._server_remaining[kind]
+                    self._server_remaining[kind] = (remaining - amount, reset_at)
+            self._in_flight += 1
+
+            waited = time.monotonic() - start
+            stats = self._stats[priority]
+            stats["admitted"] += 1
+            stats["wait_seconds"] += waited
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+            self._cond.notify_all()
+            return waited
+
+    def release(self, estimated_tokens: int, used_tokens: int | None = None):
+        """Finish a request, correcting the token bucket with the real usage"""
+        with self._cond:
+            self._in_flight -= 1
+            if used_tokens is not None:
+                self.tokens.level = min(
+                    self.tokens.capacity,
+                    self.tokens.level + estimated_tokens - used_tokens
+                )
+            self._cond.notify_all()
+
+        if used_tokens is not None and self.shared is not None:
+            try:
+                self.shared.give_back("tokens", estimated_tokens - used_tokens)
+            except SQLAlchemyError as e:
+                print(f"✗ Shared LLM rate limit update failed: {e}")
+
+    def observe_headers(self, headers):
+        """Record the server's x-ratelimit-remaining-* / x-ratelimit-reset-* headers"""
+        with self._cond:
+            now = time.monotonic()
+            for kind in ("requests", "tokens"):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                if remaining is None:
+                    continue
+                try:
+                    remaining = float(remaining)
+                except ValueError:
+                    continue
+                reset = parse_reset(headers.get(f"x-ratelimit-reset-{kind}")) or 60.0
+                self._server_remaining[kind] = (remaining, now + reset)
+            self._cond.notify_all()
+
+    def backoff(self, priority: int, seconds: float):
+        """Pause every lane after a 429"""
+        with self._cond:
+            self._stats[priority]["rate_limited"] += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        if self.shared is not None:
+            try:
+                self.shared.sync()
+            except SQLAlchemyError as e:
+                print(f"✗ Shared LLM rate limit read failed: {e}")
+
+        with self._cond:
+            now = time.monotonic()
+            self.requests.refill(now)
+            self.tokens.refill(now)
+            return {
+                "shared": self.shared is not None,
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "paused_seconds": max(0.0, self._paused_until - now),
+                "requests_available": round(self.requests.level, 1),
+                "tokens_available": round(self.tokens.level, 1),
+                "lanes": {LANE_NAMES[lane]: dict(stats) for lane, stats in self._stats.items()}
+            }
+
+    def _admission_wait(self, ticket: tuple, estimated_tokens: int) -> float | None:
+        """
+        0.0 to go now (the buckets are drawn down), seconds to sleep, or None to wait for a notification
+
+        Called with the condition held. The shared buckets are drawn down
+        with it released, so other threads can queue, release and read
+        stats during the database round-trip; no one else is admitted
+        meanwhile.
+        """
+        if self._admitting is not None or self._waiters[0] != ticket or self._in_flight >= self.max_concurrency:
+            return None
+
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+
+        # The server's own count wins when it has less headroom than we track
+        for kind, amount in (("requests", 1), ("tokens", estimated_tokens)):
+            if kind in self._server_remaining:
+                remaining, reset_at = self._server_remaining[kind]
+                if now >= reset_at:
+                    del self._server_remaining[kind]
+                elif remaining < amount:
+                    return reset_at - now
+
+        reserve = 0.0 if ticket[0] == INTERACTIVE else self.interactive_reserve
+        if self.shared is not None:
+            self._admitting = ticket
+            self._cond.release()
+            try:
+                return self.shared.take({"requests": 1, "tokens": estimated_tokens}, reserve)
+            except SQLAlchemyError as e:
+                print(f"✗ Shared LLM rate limit unavailable, limiting this process only: {e}")
+            finally:
+                self._cond.acquire()
+                self._admitting = None
+                self._cond.notify_all()
+            now = time.monotonic()
+
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(
+            self.requests.wait_time(1, reserve * self.requests.capacity),
+            self.tokens.wait_time(estimated_tokens, reserve * self.tokens.capacity)
+        )
+        if wait == 0.0:
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+        return wait
+
+    def _remove_waiter(self, ticket: tuple):
+        self._waiters.remove(ticket)
+        heapq.heapify(self._waiters)
+
+
+def estimate_tokens(params: dict) -> int:
+    """Rough token cost of a request: ~4 characters per prompt token plus the completion budget"""
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in params.get("messages", []))
+    return prompt_chars // 4 + params.get("max_tokens", 256)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> LLMScheduler:
+    """Get the process-wide LLM scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = LLMScheduler(
+                    rpm=settings.llm_requests_per_minute,
+                    tpm=settings.llm_tokens_per_minute,
+                    max_concurrency=settings.llm_max_concurrency,
+                    interactive_reserve=settings.llm_interactive_reserve,
+                    shared=settings.llm_shared_rate_limits
+                )
+    return _scheduler
@@ -0,0 +1,42 @@
+import numpy as np
+from app.db.vector_backend import normalize
+
+
+def mmr_select(query_embedding: np.ndarray, embeddings: np.ndarray, top_k: int, diversity: float) -> list[int]:
+    """
+    Pick a relevant but varied subset of candidates by Maximal Marginal Relevance
+
+    Each step takes the candidate maximizing
+    (1 - diversity) * sim(query, c) - diversity * max sim(c, already picked),
+    so diversity=0 is plain relevance order and higher values push away
+    from near-duplicates of what was already picked. Similarities are
+    computed once as matrix products; each step is a few vector operations.
+
+    Args:
+        query_embedding: Query vector
+        embeddings: Candidate vectors, one row each
+        top_k: Number of candidates to pick
+        diversity: Weight of redundancy against relevance, 0 to 1
+
+    Returns:
+        Row indices of the picked candidates, in pick order
+    """
+    count = min(top_k, len(embeddings))
+    if count <= 0:
+        return []
+
+    vectors = normalize(np.asarray(embeddings, dtype=np.float32))
+    query = normalize(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+    relevance = (1.0 - diversity) * (vectors @ query)
+    similarity = vectors @ vectors.T
+
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    available = np.ones(len(vectors), dtype=bool)
+    picked = []
+    for _ in range(count):
+        scores = np.where(available, relevance - diversity * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+    return picked
@@ -1,5 +1,6 @@
 import PyPDF2
 from pathlib import Path
+from typing import Iterable, Iterator
 import docx
 
 
@@ -24,14 +25,38 @@ def parse_document(file_path: str, doc_type: str) -> str:
         raise ValueError(f"Unsupported document type: {doc_type}")
 
 
-def extract_pdf_text(file_path: str) -> str:
-    """Extract text from PDF file"""
-    text = ""
+def iter_document_pages(file_path: str, doc_type: str) -> Iterator[tuple[int, str]]:
+    """
+    Parse a document lazily, one page at a time
+    
+    PDFs yield each page as it is extracted, so only one page's text is in
+    memory at a time. Text and Word files have no pages and are yielded
+    as a single page 1.
+    
+    Args:
+        file_path: Path to the document
+        doc_type: Type of document (pdf, txt, etc.)
+    
+    Yields:
+        Tuples of (page_number, page_text), page numbers starting at 1
+    """
+    if doc_type == "pdf":
+        yield from iter_pdf_pages(file_path)
+    else:
+        yield 1, parse_document(file_path, doc_type)
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[tuple[int, str]]:
+    """Yield (page_number, text) for each page of a PDF file"""
     with open(file_path, "rb") as file:
         pdf_reader = PyPDF2.PdfReader(file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-    return text.strip()
+        for page_number, page in enumerate(pdf_reader.pages, start=1):
+            yield page_number, page.extract_text() or ""
+
+
+def extract_pdf_text(file_path: str) -> str:
+    """Extract text from PDF file"""
+    return "".join(f"{text}\n" for _, text in iter_pdf_pages(file_path)).strip()
 
 
 def extract_text_file(file_path: str) -> str:
@@ -72,3 +97,81 @@ def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> list[str]
         start = end - overlap
     
     return chunks
+
+
+def chunk_pages(
+    pages: Iterable[tuple[int, str]],
+    chunk_size: int = 500,
+    overlap: int = 50
+) -> Iterator[tuple[str, int]]:
+    """
+    Split a stream of pages into overlapping chunks
+    
+    Produces the same chunks as chunk_text() on the joined, stripped page
+    text, but consumes pages lazily and keeps only the text that has not
+    been fully chunked yet, so memory does not grow with the document and
+    the first chunks are available before the last page is parsed.
+    
+    Args:
+        pages: Iterable of (page_number, page_text)
+        chunk_size: Maximum characters per chunk
+        overlap: Number of overlapping characters between chunks
+    
+    Yields:
+        Tuples of (chunk, page_number) where page_number is the page the
+        chunk starts on
+    """
+    step = max(1, chunk_size - overlap)
+    buffer = ""
+    content_end = 0  # End of the last non-whitespace text in buffer
+    page_starts = []  # (offset in buffer, page_number)
+    start = 0
+    started = False
+    emitted = False
+    
+    def page_at(offset: int) -> int:
+        page_number = page_starts[0][1]
+        for page_offset, number in page_starts:
+            if page_offset > offset:
+                break
+            page_number = number
+        return page_number
+    
+    for page_number, page_text in pages:
+        page_text = f"{page_text}\n"
+        if not started:
+            # Leading whitespace of the document is stripped
+            page_text = page_text.lstrip()
+            if not page_text:
+                continue
+            started = True
+        
+        page_starts.append((len(buffer), page_number))
+        buffer += page_text
+        if page_text.strip():
+            content_end = len(buffer) - (len(page_text) - len(page_text.rstrip()))
+        
+        # Only emit full chunks that do not end in trailing whitespace,
+        # which chunk_text() would have stripped
+        while start + chunk_size < content_end:
+            yield buffer[start:start + chunk_size], page_at(start)
+            emitted = True
+            start += step
+        
+        # Drop text no later chunk can include
+        if start > 0:
+            buffer = buffer[start:]
+            content_end -= start
+            page_starts = [(offset - start, number) for offset, number in page_starts]
+            while len(page_starts) > 1 and page_starts[1][0] <= 0:
+                page_starts.pop(0)
+            start = 0
+    
+    if not emitted and content_end <= chunk_size and page_starts:
+        # Short documents are a single chunk, as in chunk_text()
+        yield buffer[:content_end], page_starts[0][1]
+        return
+    
+    while start < content_end:
+        yield buffer[start:min(start + chunk_size, content_end)], page_at(start)
+        start += step
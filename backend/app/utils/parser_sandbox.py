@@ -0,0 +1,286 @@
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator
+from app.utils.parser import iter_document_pages
+from app.config import get_settings
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, limits are then not enforced
+    resource = None
+
+settings = get_settings()
+
+# Exit status of a worker that ran out of memory
+_EXIT_OUT_OF_MEMORY = 75
+
+
+class ParseError(Exception):
+    """A file could not be parsed; the message says why"""
+
+    # Parsing the same file again fails the same way
+    retryable = False
+
+
+def _limit_memory(memory_mb: int):
+    if resource and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _limit_cpu(cpu_seconds: int):
+    """Allow cpu_seconds more CPU time; the kernel sends SIGXCPU past it"""
+    if resource and cpu_seconds > 0:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime) + cpu_seconds
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        if hard != resource.RLIM_INFINITY and soft > hard:
+            soft = hard
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, memory_mb: int):
+    """Parser worker: receive (file_path, doc_type, cpu_seconds), send pages back"""
+    _limit_memory(memory_mb)
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+
+        file_path, doc_type, cpu_seconds = task
+        _limit_cpu(cpu_seconds)
+        try:
+            for page_number, text in iter_document_pages(file_path, doc_type):
+                conn.send(("page", page_number, text))
+            conn.send(("done",))
+        except MemoryError:
+            # Even reporting may fail at the limit; the exit status tells the parent.
+            # The heap may be fragmented or half-freed, so a fresh worker takes over.
+            os._exit(_EXIT_OUT_OF_MEMORY)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, memory_mb),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+
+class ParserSandbox:
+    """
+    Pool of parser processes with per-file limits
+
+    Each file is parsed in a worker process that runs under a CPU-time
+    limit and an address-space limit; pages are streamed back over a pipe
+    as they are extracted. A file that exceeds its wall-clock budget, its
+    CPU time or its memory fails with a ParseError naming the limit, and
+    only its own worker is replaced, so other files keep going. Workers
+    are recycled after max_tasks files to contain leaks.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float,
+        cpu_seconds: int,
+        memory_mb: int,
+        max_file_mb: int,
+        max_tasks: int
+    ):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_file_mb = max_file_mb
+        self.max_tasks = max(1, max_tasks)
+
+        methods = multiprocessing.get_all_start_methods()
+        # Never fork: the API process runs threads that may hold locks
+        self._context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._idle = queue.LifoQueue()
+        for _ in range(self.workers):
+            self._idle.put(None)  # Slot without a running worker yet
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"parsed": 0, "failed": 0, "timeouts": 0, "crashes": 0, "recycled": 0}
+
+    def iter_pages(self, file_path: str, doc_type: str) -> Iterator[tuple[int, str]]:
+        """
+        Parse a file in a worker process, yielding (page_number, text) as pages arrive
+
+        Only time spent waiting for the worker counts towards the timeout,
+        so a slow consumer does not make the file fail.
+
+        Raises:
+            ParseError: If the file is too large, times out, exceeds a limit or fails to parse
+        """
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        if self.max_file_mb > 0 and size_mb > self.max_file_mb:
+            self._count("failed")
+            raise ParseError(f"File too large ({size_mb:.0f} MB, limit is {self.max_file_mb} MB)")
+
+        worker = self._checkout()
+        finished = False
+        try:
+            worker.tasks += 1
+            worker.conn.send((file_path, doc_type, self.cpu_seconds))
+
+            waited = 0.0
+            while True:
+                start = time.monotonic()
+                ready = worker.conn.poll(max(0.0, self.timeout - waited))
+                waited += time.monotonic() - start
+
+                if not ready:
+                    self._count("timeouts")
+                    raise ParseError(f"Parsing timed out after {self.timeout:g}s")
+
+                try:
+                    message = worker.conn.recv()
+                except EOFError:
+                    raise ParseError(self._crash_reason(worker))
+
+                if message[0] == "page":
+                    yield message[1], message[2]
+                elif message[0] == "done":
+                    finished = True
+                    self._count("parsed")
+                    return
+                else:
+                    finished = True
+                    raise ParseError(message[1])
+        except ParseError:
+            self._count("failed")
+            raise
+        finally:
+            self._checkin(worker, reusable=finished)
+
+    def parse(self, file_path: str, doc_type: str) -> list[tuple[int, str]]:
+        """Parse a whole file into a list of (page_number, text)"""
+        return list(self.iter_pages(file_path, doc_type))
+
+    def submit(self, file_path: str, doc_type: str) -> Future:
+        """Parse a whole file in the background, returning a Future of its pages"""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser")
+        return self._executor.submit(self.parse, file_path, doc_type)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {"workers": self.workers, **self._stats}
+
+    def shutdown(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        stopped = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is not None:
+                worker.stop()
+            stopped.append(None)
+        # Keep the slots, workers are started again on demand
+        for slot in stopped:
+            self._idle.put(slot)
+
+    def _checkout(self) -> _Worker:
+        worker = self._idle.get()
+        if worker is not None and (worker.tasks >= self.max_tasks or not worker.process.is_alive()):
+            if worker.tasks >= self.max_tasks:
+                self._count("recycled")
+            worker.stop()
+            worker = None
+        if worker is None:
+            try:
+                worker = _Worker(self._context, self.memory_mb)
+            except Exception:
+                self._idle.put(None)
+                raise
+        return worker
+
+    def _checkin(self, worker: _Worker, reusable: bool):
+        """Return a worker's slot; workers stopped mid-file are killed"""
+        if not reusable or not worker.process.is_alive():
+            worker.kill()
+            worker = None
+        self._idle.put(worker)
+
+    def _crash_reason(self, worker: _Worker) -> str:
+        worker.process.join(timeout=5)
+        exitcode = worker.process.exitcode
+        self._count("crashes")
+        if hasattr(signal, "SIGXCPU") and exitcode == -signal.SIGXCPU:
+            return f"CPU time limit ({self.cpu_seconds}s) exceeded while parsing"
+        if exitcode == _EXIT_OUT_OF_MEMORY:
+            return f"Memory limit ({self.memory_mb} MB) exceeded while parsing"
+        if exitcode == -signal.SIGKILL:
+            return "Parser process was killed (likely out of memory)"
+        return f"Parser process crashed (exit code {exitcode})"
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+
+_sandbox = None
+_sandbox_lock = threading.Lock()
+
+
+def get_parser_sandbox() -> ParserSandbox:
+    """Get the process-wide parser sandbox"""
+    global _sandbox
+    if _sandbox is None:
+        with _sandbox_lock:
+            if _sandbox is None:
+                _sandbox = ParserSandbox(
+                    workers=settings.ingest_parse_workers or os.cpu_count() or 1,
+                    timeout=settings.parse_timeout_seconds,
+                    cpu_seconds=settings.parse_cpu_seconds,
+                    memory_mb=settings.parse_memory_mb,
+                    max_file_mb=settings.parse_max_file_mb,
+                    max_tasks=settings.parse_max_tasks_per_worker
+                )
+    return _sandbox
+
+
+def shutdown_parser_sandbox():
+    """Stop the parser workers, if any were started"""
+    if _sandbox is not None:
+        _sandbox.shutdown()
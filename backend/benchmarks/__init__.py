@@ -0,0 +1 @@
+# Offline performance benchmarks (no Groq quota or network needed)
@@ -0,0 +1,68 @@
+"""Shared helpers for benchmark scripts."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+
+
+def summarize(samples: list[float], items: int | None = None, wall_seconds: float | None = None) -> dict:
+    """
+    Summarize latency samples (seconds) as JSON-friendly milliseconds
+
+    Args:
+        samples: One latency per operation
+        items: Units of work done, for throughput (defaults to len(samples))
+        wall_seconds: Elapsed wall time, for throughput (defaults to sum(samples))
+    """
+    if not samples:
+        return {"count": 0}
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    items = len(samples) if items is None else items
+    wall_seconds = float(np.sum(samples)) if wall_seconds is None else wall_seconds
+    return {
+        "count": len(samples),
+        "throughput_per_s": round(items / wall_seconds, 3) if wall_seconds > 0 else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3)
+    }
+
+
+def timed(fn, *args, **kwargs) -> tuple[float, object]:
+    """Run fn once, returning (seconds, result)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_metadata(config: dict) -> dict:
+    """Describe the machine and code version a run was made on"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": config
+    }
+
+
+def write_results(results: dict, out: str | None):
+    """Print results as JSON and optionally write them to a file"""
+    text = json.dumps(results, indent=2, default=str)
+    if out:
+        with open(out, "w") as file:
+            file.write(text + "\n")
+    print(text)
@@ -0,0 +1,195 @@
+"""
+Synthetic corpus generator for benchmarks.
+
+Writes a reproducible mix of PDF, txt, md and docx files with headings,
+paragraphs, course codes, names and dates, so parsing, chunking, date
+extraction and retrieval all see realistic input.
+
+    python -m benchmarks.corpus ./bench_corpus --files 200
+"""
+import argparse
+import random
+from pathlib import Path
+import docx
+
+WORDS = (
+    "model data training network learning gradient loss feature vector "
+    "project deadline assignment review notes lecture chapter exam report "
+    "budget health career finance meeting research paper experiment result "
+    "analysis design system database query index cache latency throughput "
+    "python function module class test deploy server client request response"
+).split()
+
+SUBJECTS = ["Machine Learning", "Databases", "Operating Systems", "Statistics",
+            "Personal Finance", "Fitness Plan", "Career Growth", "Web Development"]
+NAMES = ["Alice Moreau", "Ravi Kumar", "Chen Wei", "Maria Lopez", "Tom Becker"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July",
+          "August", "September", "October", "November", "December"]
+
+
+def make_sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 18))]
+    roll = rng.random()
+    if roll < 0.08:
+        words.append(f"due on {rng.choice(MONTHS)} {rng.randint(1, 28)}, 2026")
+    elif roll < 0.14:
+        words.append(f"by 2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}")
+    elif roll < 0.22:
+        words.append(f"for {rng.choice(['CS', 'MA', 'EE'])}-{rng.randint(100, 499)}")
+    elif roll < 0.28:
+        words.append(f"with {rng.choice(NAMES)}")
+    return " ".join(words).capitalize() + "."
+
+
+def make_sections(rng: random.Random, size_kb: float) -> list[tuple[str, list[str]]]:
+    """Build (heading, paragraphs) sections totalling roughly size_kb"""
+    sections = []
+    total = 0
+    while total < size_kb * 1024:
+        heading = f"{rng.choice(SUBJECTS)}: {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}"
+        paragraphs = [
+            " ".join(make_sentence(rng) for _ in range(rng.randint(3, 7)))
+            for _ in range(rng.randint(2, 5))
+        ]
+        sections.append((heading, paragraphs))
+        total += len(heading) + sum(len(p) for p in paragraphs)
+    return sections
+
+
+def write_txt(path: Path, sections):
+    path.write_text(
+        "\n\n".join(f"{heading}\n\n" + "\n\n".join(paragraphs) for heading, paragraphs in sections),
+        encoding="utf-8"
+    )
+
+
+def write_md(path: Path, sections):
+    path.write_text(
+        "\n\n".join(f"## {heading}\n\n" + "\n\n".join(paragraphs) for heading, paragraphs in sections),
+        encoding="utf-8"
+    )
+
+
+def write_docx(path: Path, sections):
+    document = docx.Document()
+    for heading, paragraphs in sections:
+        document.add_heading(heading, level=2)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+    document.save(str(path))
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90) -> list[str]:
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: Path, sections, lines_per_page: int = 50):
+    """Write a minimal multi-page text PDF (Helvetica, no external dependency)"""
+    lines = []
+    for heading, paragraphs in sections:
+        lines.append(heading)
+        for paragraph in paragraphs:
+            lines.extend(_wrap(paragraph))
+            lines.append("")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages tree, filled in once page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_lines in pages:
+        stream = "BT /F1 10 Tf 50 790 Td 14 TL\n" + "".join(
+            f"({_pdf_escape(line)}) '\n" for line in page_lines
+        ) + "ET"
+        stream = stream.encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    path.write_bytes(bytes(out))
+
+
+WRITERS = {"pdf": write_pdf, "txt": write_txt, "md": write_md, "docx": write_docx}
+
+
+def generate_corpus(
+    folder: str,
+    files: int = 100,
+    size_kb: float = 8.0,
+    types: tuple = ("pdf", "txt", "md", "docx"),
+    seed: int = 42
+) -> list[Path]:
+    """
+    Generate a synthetic corpus
+
+    Args:
+        folder: Output folder (created if missing)
+        files: Number of files
+        size_kb: Approximate text size per file
+        types: File types to rotate through
+        seed: Random seed, the same seed gives the same corpus
+
+    Returns:
+        Paths of the generated files
+    """
+    rng = random.Random(seed)
+    root = Path(folder)
+    root.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for i in range(files):
+        doc_type = types[i % len(types)]
+        subfolder = root / rng.choice(["projects", "areas", "resources", "archives"])
+        subfolder.mkdir(exist_ok=True)
+        path = subfolder / f"doc_{i:05d}.{doc_type}"
+        sections = make_sections(rng, size_kb * rng.uniform(0.5, 1.5))
+        WRITERS[doc_type](path, sections)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic benchmark corpus")
+    parser.add_argument("folder")
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--size-kb", type=float, default=8.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    paths = generate_corpus(args.folder, args.files, args.size_kb, seed=args.seed)
+    print(f"Wrote {len(paths)} files to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""Offline embedding functions for benchmarks."""
+import hashlib
+import re
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+
+
+class HashingEmbeddingFunction:
+    """
+    Deterministic bag-of-words embedding (feature hashing, L2-normalised)
+
+    Needs no model download, so benchmarks run offline. Its relevance is far
+    below a real sentence-embedding model but its cost profile is stable,
+    which is what comparisons between runs need.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def __call__(self, input: list[str]) -> list[list[float]]:
+        vectors = np.zeros((len(input), self.dim), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in TOKEN_PATTERN.findall(text.lower()):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                bucket = int.from_bytes(digest[:4], "little") % self.dim
+                sign = 1.0 if digest[4] & 1 else -1.0
+                vectors[row, bucket] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (vectors / norms).tolist()
+
+
+def get_embedding_function(name: str):
+    """Pick an embedding function by name ("hash" or Chroma's "default")"""
+    if name == "hash":
+        return HashingEmbeddingFunction()
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
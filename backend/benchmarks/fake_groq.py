@@ -0,0 +1,126 @@
+"""
+Local stand-in for the Groq chat-completions API.
+
+Serves POST /openai/v1/chat/completions with canned answers chosen from the
+prompt, after a configurable latency and jitter, so ingestion and chat can be
+benchmarked without spending quota.
+
+    python -m benchmarks.fake_groq --port 8765 --latency-ms 300 --jitter-ms 100
+
+Then point the backend at it with GROQ_BASE_URL=http://127.0.0.1:8765.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENRICHMENT_ANSWER = json.dumps({
+    "para_type": "Resources",
+    "topics": ["Machine Learning", "Data Science", "Python"],
+    "tasks": [{"title": "Review lecture notes", "due_date_text": "December 10"}]
+})
+
+
+def canned_answer(prompt: str) -> str:
+    """Pick a plausible answer for one of the backend's prompt templates"""
+    if '"para_type"' in prompt:
+        return ENRICHMENT_ANSWER
+    if "Classify this document into ONE of these PARA categories" in prompt:
+        return "Resources"
+    if "extract the top" in prompt and "topics" in prompt:
+        return '["Machine Learning", "Data Science", "Python"]'
+    if "Extract all tasks" in prompt:
+        return '[{"title": "Review lecture notes", "due_date_text": "December 10"}]'
+    if "Classify this user question" in prompt:
+        return "SEARCH"
+    return "This is a canned answer from the fake Groq server."
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    requests_served = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+
+        content = canned_answer(prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        with self.lock:
+            FakeGroqHandler.requests_served += 1
+
+        payload = json.dumps({
+            "id": f"chatcmpl-fake-{FakeGroqHandler.requests_served}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }).encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.send_header("x-ratelimit-remaining-requests", "100000")
+        self.send_header("x-ratelimit-remaining-tokens", "10000000")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_groq(port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+    """
+    Start the fake server on a background thread
+
+    Returns:
+        Tuple of (server, base_url)
+    """
+    handler = type("ConfiguredFakeGroqHandler", (FakeGroqHandler,), {
+        "latency_ms": latency_ms,
+        "jitter_ms": jitter_ms
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq chat-completions server")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    args = parser.parse_args()
+
+    server, url = start_fake_groq(args.port, args.latency_ms, args.jitter_ms)
+    print(f"Fake Groq server listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
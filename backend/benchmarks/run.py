@@ -0,0 +1,1013 @@
+"""
+Offline ingestion and retrieval benchmark suite.
+
+Starts the fake Groq server, generates a synthetic corpus in a scratch
+directory, points the backend at both and times chunk_text, extract_dates,
+chunking, embedding_cache, embedding_service, parse_pdf, process_document,
+ingest_folder, search_documents, vector_backends, two_stage, hybrid,
+context_packing, mmr, answer_cache and intent.
+
+    python -m benchmarks.run --files 100 --latency-ms 200 --out bench.json
+
+Results are JSON with throughput and p50/p95/p99 latencies per benchmark,
+so runs can be compared over time.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+from benchmarks.common import summarize, timed, run_metadata, write_results
+from benchmarks.corpus import generate_corpus, make_sections, write_pdf
+from benchmarks.embeddings import get_embedding_function
+from benchmarks.fake_groq import start_fake_groq
+
+BENCHMARKS = [
+    "chunk_text", "extract_dates", "chunking", "embedding_cache", "embedding_service", "parse_pdf",
+    "process_document", "ingest_folder", "search_documents", "vector_backends",
+    "two_stage", "hybrid", "context_packing", "mmr", "answer_cache", "intent"
+]
+
+
+def configure_environment(workdir: Path, groq_url: str, llm_cache: bool):
+    """Point the backend at scratch storage and the fake server (before importing app)"""
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{workdir / 'bench.db'}",
+        "CHROMA_PERSIST_DIR": str(workdir / "chroma"),
+        "COLLECTION_NAME": "bench_chunks",
+        "GROQ_API_KEY": "fake-key",
+        "GROQ_BASE_URL": groq_url,
+        "LLM_CACHE_ENABLED": "true" if llm_cache else "false",
+        "LLM_CACHE_PATH": str(workdir / "llm_cache.db"),
+        "EMBEDDING_CACHE_DIR": str(workdir / "app_embedding_cache"),
+        "LEXICAL_INDEX_PATH": str(workdir / "lexical_index.db"),
+        "INTENT_LOG_PATH": str(workdir / "intent_log.jsonl"),
+        "LLM_REQUESTS_PER_MINUTE": "1000000",
+        "LLM_TOKENS_PER_MINUTE": "1000000000",
+    })
+
+
+def reset_stores(collection_name: str, embedding_function):
+    """Empty the SQL tables, the lexical index and recreate the chunk collection"""
+    from app.db.lexical_index import get_lexical_index
+    from app.db.sql_models import Base
+    from app.db.sql_session import engine
+    from app.db.vector_backend import ChromaVectorStore
+    from app.db.vector_store import get_chroma_client
+
+    chroma_client = get_chroma_client()
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    for name in (collection_name, f"{collection_name}_docs"):
+        try:
+            chroma_client.delete_collection(name)
+        except ValueError:
+            pass
+    vector_store = ChromaVectorStore(chroma_client.get_or_create_collection(
+        name=collection_name,
+        embedding_function=embedding_function
+    ), embedding_function)
+    get_lexical_index(vector_store).clear()
+    return vector_store
+
+
+def bench_chunk_text(texts: list[str]) -> dict:
+    from app.config import get_settings
+    from app.utils.parser import chunk_text
+
+    settings = get_settings()
+    samples = [timed(chunk_text, text, settings.chunk_size, settings.chunk_overlap)[0] for text in texts]
+    result = summarize(samples)
+    result["chars_per_s"] = round(sum(len(t) for t in texts) / sum(samples), 1)
+    return result
+
+
+def bench_extract_dates(texts: list[str]) -> dict:
+    from app.utils.date_extract import extract_dates
+
+    samples = [timed(extract_dates, text)[0] for text in texts]
+    result = summarize(samples)
+    result["chars_per_s"] = round(sum(len(t) for t in texts) / sum(samples), 1)
+    return result
+
+
+def make_sentence_queries(texts: list[str], count: int, seed: int = 11) -> list[tuple[int, str, str]]:
+    """
+    Sample sentences from the corpus and turn them into lossy queries
+
+    Returns:
+        List of (text_index, sentence, query) where query keeps ~60% of the
+        sentence's words in order
+    """
+    rng = random.Random(seed)
+    candidates = [
+        (index, " ".join(sentence.split()))
+        for index, text in enumerate(texts)
+        for sentence in re.findall(r"[A-Z][^.]{40,}\.", text)
+    ]
+    queries = []
+    for index, sentence in rng.sample(candidates, min(count, len(candidates))):
+        words = sentence.rstrip(".").split()
+        kept = [word for word in words if rng.random() < 0.6] or words[:3]
+        queries.append((index, sentence, " ".join(kept)))
+    return queries
+
+
+def bench_chunking(texts: list[str], embedding_function, queries: int, top_k: int = 5) -> dict:
+    """
+    Compare the fixed-window and structure-aware chunkers
+
+    For each strategy: chunk count, chunking and embedding time, and the
+    retrieval hit rate of sampled-sentence queries, both at document level
+    (a top-k chunk comes from the right document) and sentence level (a
+    top-k chunk contains the whole source sentence).
+    """
+    from app.config import get_settings
+    from app.utils.chunker import chunk_structured_text
+    from app.utils.parser import chunk_text
+
+    settings = get_settings()
+    strategies = {
+        "fixed": lambda text: chunk_text(text, settings.chunk_size, settings.chunk_overlap),
+        "structured": lambda text: [
+            chunk.text for chunk in
+            chunk_structured_text(text, settings.chunk_max_tokens, settings.chunk_overlap_tokens)
+        ]
+    }
+    samples = make_sentence_queries(texts, queries)
+    query_vectors = np.asarray(embedding_function([query for _, _, query in samples]), dtype=np.float32)
+
+    results = {}
+    for name, chunker in strategies.items():
+        start = time.perf_counter()
+        chunks, owners = [], []
+        for index, text in enumerate(texts):
+            for chunk in chunker(text):
+                chunks.append(chunk)
+                owners.append(index)
+        chunk_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectors = np.asarray([
+            vector
+            for i in range(0, len(chunks), 256)
+            for vector in embedding_function(chunks[i:i + 256])
+        ], dtype=np.float32)
+        embed_seconds = time.perf_counter() - start
+
+        owners = np.asarray(owners)
+        normalized = [" ".join(chunk.split()) for chunk in chunks]
+        top = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :top_k]
+        doc_hits = sentence_hits = 0
+        for (index, sentence, _), row in zip(samples, top):
+            doc_hits += int(any(owners[i] == index for i in row))
+            sentence_hits += int(any(owners[i] == index and sentence in normalized[i] for i in row))
+
+        results[name] = {
+            "chunks": len(chunks),
+            "avg_chunk_chars": round(sum(len(c) for c in chunks) / max(1, len(chunks)), 1),
+            "chunk_seconds": round(chunk_seconds, 4),
+            "embed_seconds": round(embed_seconds, 4),
+            f"doc_hit_rate@{top_k}": round(doc_hits / max(1, len(samples)), 3),
+            f"sentence_hit_rate@{top_k}": round(sentence_hits / max(1, len(samples)), 3)
+        }
+    results["queries"] = len(samples)
+    return results
+
+
+def bench_embedding_cache(texts: list[str], embedding_function, workdir: Path) -> dict:
+    """
+    Embed the corpus' chunks without a cache, then through the embedding cache twice
+
+    Each document gets the same header and licence footer, as exported
+    notes and templates do. The cold pass only saves on that boilerplate;
+    the warm pass is a re-index of unchanged documents.
+    """
+    from app.config import get_settings
+    from app.utils.chunker import chunk_structured_text
+    from app.utils.embedding_cache import CachedEmbeddingFunction, EmbeddingCache, get_model_id
+
+    settings = get_settings()
+    header = "Internal document. Prepared by the knowledge management team."
+    footer = (
+        "## Licence\n\nThis document may be shared within the organisation only. "
+        "Do not redistribute without written permission from the owner."
+    )
+    chunks = [
+        chunk.text
+        for text in texts
+        for chunk in chunk_structured_text(
+            f"{header}\n\n{text}\n\n{footer}", settings.chunk_max_tokens, settings.chunk_overlap_tokens
+        )
+    ]
+
+    def embed_all(function) -> float:
+        start = time.perf_counter()
+        for i in range(0, len(chunks), 256):
+            function(chunks[i:i + 256])
+        return time.perf_counter() - start
+
+    uncached = embed_all(embedding_function)
+    cache = EmbeddingCache(str(workdir / "embedding_cache"), get_model_id(embedding_function), len(chunks) * 2)
+    cached = CachedEmbeddingFunction(embedding_function, cache)
+    cold = embed_all(cached)
+    cold_embedded = cached.embedded
+    warm = embed_all(cached)
+
+    return {
+        "chunks": len(chunks),
+        "uncached_seconds": round(uncached, 4),
+        "cold_seconds": round(cold, 4),
+        "cold_embedded": cold_embedded,
+        "warm_seconds": round(warm, 4),
+        "warm_embedded": cached.embedded - cold_embedded,
+        "warm_speedup": round(uncached / warm, 1) if warm else None
+    }
+
+
+def serve_embeddings(embedding: str, address: str):
+    """Embedding service process for bench_embedding_service"""
+    from app.utils.embedding_service import EmbeddingService
+
+    EmbeddingService(get_embedding_function(embedding), address, max_batch=64, max_wait_ms=0).serve_forever()
+
+
+def bench_embedding_service(queries: list[str], embedding: str, workdir: Path, threads: int = 8) -> dict:
+    """
+    Embed single queries from concurrent threads, in-process vs through the embedding service
+
+    The service runs in its own process, as it does for API workers, and
+    coalesces the concurrent requests into micro-batches.
+    """
+    from app.utils.embedding_service import EmbeddingServiceClient
+
+    def run(function) -> dict:
+        samples = []
+        lock = threading.Lock()
+
+        def worker(index: int):
+            for query in queries[index::threads]:
+                elapsed, _ = timed(function, [query])
+                with lock:
+                    samples.append(elapsed)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return summarize(samples, items=len(samples), wall_seconds=time.perf_counter() - start)
+
+    results = {"threads": threads, "in_process": run(get_embedding_function(embedding))}
+
+    address = str(workdir / "embedding.sock")
+    process = multiprocessing.get_context("spawn").Process(target=serve_embeddings, args=(embedding, address))
+    process.start()
+    try:
+        deadline = time.monotonic() + 60
+        while not os.path.exists(address) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        client = EmbeddingServiceClient(address, timeout=60, auto_start=False)
+        results["service"] = run(client)
+        stats = client.stats()
+        results["service"]["batches"] = stats["batches"]
+        results["service"]["avg_batch_texts"] = stats["avg_batch_texts"]
+        client.close()
+    finally:
+        process.kill()
+        process.join()
+    return results
+
+
+def bench_parse_pdf(path: Path) -> dict:
+    """
+    Parse and chunk one large PDF, whole-text vs page-streaming
+
+    Reports wall time, time until the first chunk is available and the
+    Python heap peak (tracemalloc, measured in a separate pass) for each.
+    """
+    from app.config import get_settings
+    from app.utils.parser import chunk_text, chunk_pages, extract_pdf_text, iter_pdf_pages
+
+    settings = get_settings()
+
+    def whole_text():
+        return iter(chunk_text(extract_pdf_text(str(path)), settings.chunk_size, settings.chunk_overlap))
+
+    def streaming():
+        return (chunk for chunk, _ in chunk_pages(iter_pdf_pages(str(path)), settings.chunk_size, settings.chunk_overlap))
+
+    def run(make_chunks) -> dict:
+        start = time.perf_counter()
+        chunks = make_chunks()
+        next(chunks)
+        first_chunk = time.perf_counter() - start
+        count = 1 + sum(1 for _ in chunks)
+        total = time.perf_counter() - start
+
+        tracemalloc.start()
+        for _ in make_chunks():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "chunks": count,
+            "seconds": round(total, 3),
+            "first_chunk_ms": round(first_chunk * 1000, 3),
+            "peak_heap_mb": round(peak / 1024 / 1024, 2)
+        }
+
+    return {
+        "file_kb": round(path.stat().st_size / 1024, 1),
+        "whole_text": run(whole_text),
+        "streaming": run(streaming)
+    }
+
+
+def bench_process_document(paths: list[Path], vector_store) -> dict:
+    from app.db.sql_session import SessionLocal
+    from app.services.bulk_ingestion import get_doc_type
+    from app.services.document_service import process_document
+
+    db = SessionLocal()
+    samples, failures = [], 0
+    try:
+        for path in paths:
+            try:
+                elapsed, _ = timed(
+                    process_document,
+                    db=db,
+                    vector_store=vector_store,
+                    file_path=str(path),
+                    title=path.stem,
+                    doc_type=get_doc_type(path)
+                )
+                samples.append(elapsed)
+            except Exception:
+                failures += 1
+    finally:
+        db.close()
+    result = summarize(samples)
+    result["failures"] = failures
+    return result
+
+
+def bench_ingest_folder(folder: Path, file_count: int, repeat: int, collection_name: str, embedding_function) -> dict:
+    from app.db.sql_session import SessionLocal
+    from app.services.bulk_ingestion import ingest_folder
+
+    samples, last = [], None
+    for _ in range(repeat):
+        vector_store = reset_stores(collection_name, embedding_function)
+        db = SessionLocal()
+        try:
+            elapsed, last = timed(ingest_folder, db, vector_store, str(folder))
+            samples.append(elapsed)
+        finally:
+            db.close()
+    result = summarize(samples, items=file_count * repeat, wall_seconds=sum(samples))
+    result["files"] = file_count
+    result["processed"] = last["processed"] if last else 0
+    result["failed"] = last["failed"] if last else 0
+    return result
+
+
+def bench_answer_cache(vector_store, questions: list[str], asks: int) -> dict:
+    """
+    /ask answering without vs with the answer cache
+
+    A stream of asks draws from the questions with a skew towards a few
+    favourites, in slightly different wordings (case, punctuation,
+    "please"). Halfway through, a document change moves the data version
+    on. Reports latency and the cache hit rate.
+    """
+    from app.config import get_settings
+    from app.db.data_version import bump_data_version
+    from app.services.chat_service import process_chat
+    from app.utils.answer_cache import get_answer_cache
+
+    rng = random.Random(29)
+    weights = [1.0 / (rank + 1) for rank in range(len(questions))]
+    wordings = [
+        lambda q: q,
+        lambda q: q.lower(),
+        lambda q: q.rstrip("?"),
+        lambda q: f"Please tell me: {q}"
+    ]
+    stream = [rng.choice(wordings)(rng.choices(questions, weights)[0]) for _ in range(asks)]
+
+    settings = get_settings()
+    cache = get_answer_cache()
+    results = {"asks": len(stream), "distinct_questions": len(questions)}
+    for enabled in (False, True):
+        settings.answer_cache_enabled = enabled
+        cache.clear()
+        cache.hits = cache.misses = 0
+        latencies = []
+        for i, question in enumerate(stream):
+            if i == len(stream) // 2:
+                bump_data_version()
+            latencies.append(timed(process_chat, question, vector_store)[0])
+        name = "cached" if enabled else "uncached"
+        results[name] = summarize(latencies)
+        if enabled:
+            results[name]["hit_rate"] = round(cache.stats()["hit_rate"], 3)
+    return results
+
+
+def bench_search_documents(vector_store, queries: list[str]) -> dict:
+    from app.agents.search_agent import search_documents
+
+    samples = [timed(search_documents, vector_store, query)[0] for query in queries]
+    return summarize(samples)
+
+
+class _PrecomputedEmbeddingFunction:
+    """Serves vectors computed up front, so both backends index identical embeddings"""
+
+    def __init__(self, embedding_function, texts: list[str]):
+        self.embedding_function = embedding_function
+        self.vectors = {}
+        for i in range(0, len(texts), 256):
+            batch = texts[i:i + 256]
+            self.vectors.update(zip(batch, embedding_function(batch)))
+
+    def __call__(self, input):
+        missing = [text for text in input if text not in self.vectors]
+        if missing:
+            self.vectors.update(zip(missing, self.embedding_function(missing)))
+        return [list(map(float, self.vectors[text])) for text in input]
+
+
+def bench_vector_backends(
+    embedding_function,
+    workdir: Path,
+    chunk_count: int,
+    queries: int,
+    top_k: int = 10
+) -> dict:
+    """
+    Index the same chunks in the Chroma and NumPy backends and compare them
+
+    For each backend: indexing time, p50/p95 latency of plain queries and
+    of queries filtered to a handful of documents, and recall@k against
+    exact brute-force search. The NumPy engine runs with float and int8
+    storage, and reports the bytes a search scans.
+    """
+    import chromadb
+    from app.config import get_settings
+    from app.db.numpy_store import NumpyVectorStore
+    from app.db.vector_backend import ChromaVectorStore
+    from app.utils.chunker import chunk_structured_text
+
+    settings = get_settings()
+    rng = random.Random(5)
+    chunks, metadatas = [], []
+    while len(chunks) < chunk_count:
+        document_id = len(metadatas) and metadatas[-1]["document_id"] + 1
+        sections = make_sections(rng, 8)
+        text = "\n\n".join(f"## {heading}\n\n" + "\n\n".join(paragraphs) for heading, paragraphs in sections)
+        for index, chunk in enumerate(chunk_structured_text(text, settings.chunk_max_tokens, settings.chunk_overlap_tokens)):
+            chunks.append(chunk.text)
+            metadatas.append({"document_id": document_id, "chunk_index": index})
+    chunks, metadatas = chunks[:chunk_count], metadatas[:chunk_count]
+    ids = [f"chunk_{i}" for i in range(len(chunks))]
+
+    samples = make_sentence_queries(chunks, queries)
+    query_texts = [query for _, _, query in samples]
+    precomputed = _PrecomputedEmbeddingFunction(embedding_function, chunks + query_texts)
+
+    # Exact top-k over normalized vectors as ground truth
+    vectors = np.asarray([precomputed.vectors[chunk] for chunk in chunks], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    query_vectors = np.asarray([precomputed.vectors[query] for query in query_texts], dtype=np.float32)
+    query_vectors /= np.maximum(np.linalg.norm(query_vectors, axis=1, keepdims=True), 1e-12)
+    exact = [set(np.argsort(-(vectors @ query))[:top_k].tolist()) for query in query_vectors]
+
+    document_ids = sorted({metadata["document_id"] for metadata in metadatas})
+    where = {"document_id": {"$in": rng.sample(document_ids, min(5, len(document_ids)))}}
+
+    client = chromadb.PersistentClient(path=str(workdir / "backend_chroma"))
+    backends = {
+        "chroma": ChromaVectorStore(
+            client.get_or_create_collection("backends", embedding_function=precomputed), precomputed
+        ),
+        "numpy": NumpyVectorStore(str(workdir / "backend_numpy"), "backends", precomputed),
+        "numpy_int8": NumpyVectorStore(str(workdir / "backend_numpy"), "backends_int8", precomputed, quantization="int8")
+    }
+
+    results = {"chunks": len(chunks), "queries": len(query_texts), "top_k": top_k}
+    for name, store in backends.items():
+        batch_size = min(store.max_batch_size or 5000, 5000)
+        start = time.perf_counter()
+        for i in range(0, len(chunks), batch_size):
+            store.add(ids[i:i + batch_size], chunks[i:i + batch_size], metadatas[i:i + batch_size])
+        index_seconds = time.perf_counter() - start
+
+        plain, filtered, recall = [], [], 0
+        for query, truth in zip(query_texts, exact):
+            elapsed, hits = timed(store.search, query, top_k)
+            plain.append(elapsed)
+            recall += len(truth & {int(hit.id.split("_")[1]) for hit in hits}) / top_k
+            filtered.append(timed(store.search, query, top_k, where)[0])
+
+        results[name] = {
+            "index_seconds": round(index_seconds, 3),
+            "search": summarize(plain),
+            "filtered_search": summarize(filtered),
+            f"recall@{top_k}": round(recall / max(1, len(query_texts)), 3)
+        }
+        if isinstance(store, NumpyVectorStore):
+            stats = store.stats()
+            results[name]["scan_mb"] = round(stats["scan_bytes"] / 1024 / 1024, 2)
+            results[name]["vector_file_mb"] = round(stats["vector_file_bytes"] / 1024 / 1024, 2)
+    return results
+
+
+def make_topical_documents(count: int, chunks_per_document: int, seed: int = 3) -> list[list[str]]:
+    """
+    Documents that each stick to their own topic, as real notes do
+
+    Every document draws most words from a small vocabulary of its own,
+    the rest from the shared corpus words, so centroids carry a signal
+    without making the chunks trivially separable.
+    """
+    from benchmarks.corpus import WORDS
+
+    rng = random.Random(seed)
+    documents = []
+    for index in range(count):
+        topic = [f"t{index}w{i}" for i in range(12)] + rng.sample(WORDS, 12)
+        documents.append([
+            " ".join(
+                rng.choice(topic) if rng.random() < 0.5 else rng.choice(WORDS)
+                for _ in range(rng.randint(40, 80))
+            ).capitalize() + "."
+            for _ in range(chunks_per_document)
+        ])
+    return documents
+
+
+def bench_two_stage(embedding_function, workdir: Path, documents: int, queries: int, top_k: int = 10) -> dict:
+    """
+    Flat chunk search vs document-then-chunk search on the NumPy backend
+
+    Queries are chunks with ~40% of their words dropped. recall@k is the
+    overlap with the flat (exact) top-k; source_hit_rate is how often the
+    chunk a query was made from comes back at all.
+    """
+    from app.db.document_index import DocumentIndex
+    from app.db.numpy_store import NumpyVectorStore
+
+    corpus = make_topical_documents(documents, 30)
+    store = NumpyVectorStore(str(workdir / "two_stage"), "two_stage", embedding_function)
+    records = [
+        (f"{document_id}_{index}", chunk, {"document_id": document_id, "chunk_index": index})
+        for document_id, chunks in enumerate(corpus)
+        for index, chunk in enumerate(chunks)
+    ]
+    for i in range(0, len(records), 5000):
+        batch = records[i:i + 5000]
+        store.add([r[0] for r in batch], [r[1] for r in batch], [r[2] for r in batch])
+
+    index = DocumentIndex(store, enabled=True, min_chunks=0, top_documents=20)
+    start = time.perf_counter()
+    for document_id in range(len(corpus)):
+        index.update(document_id, {"document_id": document_id})
+    index_seconds = time.perf_counter() - start
+
+    rng = random.Random(13)
+    samples = []
+    for chunk_id, chunk, _ in rng.sample(records, min(queries, len(records))):
+        words = chunk.rstrip(".").split()
+        samples.append((chunk_id, " ".join(word for word in words if rng.random() < 0.6) or words[0]))
+
+    flat_samples, flat_ids, flat_hits = [], [], 0
+    for chunk_id, query in samples:
+        elapsed, hits = timed(store.search, query, top_k)
+        flat_samples.append(elapsed)
+        flat_ids.append({hit.id for hit in hits})
+        flat_hits += chunk_id in flat_ids[-1]
+
+    results = {
+        "documents": len(corpus),
+        "chunks": store.count(),
+        "queries": len(samples),
+        "centroid_seconds": round(index_seconds, 3),
+        "flat": dict(summarize(flat_samples), source_hit_rate=round(flat_hits / max(1, len(samples)), 3))
+    }
+    for top_documents in (5, 20, 50):
+        index.top_documents = top_documents
+        latencies, recall, source_hits = [], 0.0, 0
+        for (chunk_id, query), exact in zip(samples, flat_ids):
+            elapsed, hits = timed(index.search, query, top_k)
+            latencies.append(elapsed)
+            found = {hit.id for hit in hits}
+            recall += len(found & exact) / max(1, len(exact))
+            source_hits += chunk_id in found
+        results[f"two_stage_top{top_documents}"] = dict(
+            summarize(latencies),
+            **{
+                f"recall@{top_k}": round(recall / max(1, len(samples)), 3),
+                "source_hit_rate": round(source_hits / max(1, len(samples)), 3)
+            }
+        )
+    return results
+
+
+def bench_hybrid(embedding_function, workdir: Path, chunks: int, queries: int, top_k: int = 5) -> dict:
+    """
+    Vector vs lexical vs hybrid retrieval on the NumPy backend
+
+    Every chunk carries a unique reference such as CS-01234. Identifier
+    queries ask about one reference; sentence queries are chunks with
+    ~40% of their words dropped. hit_rate is how often the chunk a query
+    targets comes back in the top_k.
+    """
+    from benchmarks.corpus import make_sentence
+    from app.agents.search_agent import retrieve_chunks
+    from app.db.lexical_index import get_lexical_index
+    from app.db.numpy_store import NumpyVectorStore
+
+    rng = random.Random(17)
+    records = []
+    for index in range(chunks):
+        reference = f"{rng.choice(['CS', 'MA', 'EE'])}-{index:05d}"
+        text = " ".join(make_sentence(rng) for _ in range(rng.randint(3, 6)))
+        records.append((f"{index // 20}_{index % 20}", f"{text} Reference {reference}.", reference, index // 20))
+
+    store = NumpyVectorStore(str(workdir / "hybrid"), "hybrid", embedding_function)
+    lexical = get_lexical_index(store)
+    for i in range(0, len(records), 5000):
+        batch = records[i:i + 5000]
+        store.add(
+            [r[0] for r in batch], [r[1] for r in batch],
+            [{"document_id": r[3], "chunk_index": int(r[0].split("_")[1])} for r in batch]
+        )
+    start = time.perf_counter()
+    by_document = {}
+    for chunk_id, text, _, document_id in records:
+        by_document.setdefault(document_id, []).append((chunk_id, text))
+    for document_id, document_chunks in by_document.items():
+        lexical.index_document(document_id, document_chunks)
+    lexical_seconds = time.perf_counter() - start
+
+    sample = rng.sample(records, min(queries, len(records)))
+    query_sets = {
+        "identifier": [(chunk_id, f"What did I write about {reference}?") for chunk_id, _, reference, _ in sample],
+        "sentence": [
+            (chunk_id, " ".join(word for word in text.split() if rng.random() < 0.6))
+            for chunk_id, text, _, _ in sample
+        ]
+    }
+
+    results = {"chunks": store.count(), "queries": len(sample), "lexical_index_seconds": round(lexical_seconds, 3)}
+    for mode in ("vector", "lexical", "hybrid"):
+        for kind, samples in query_sets.items():
+            latencies, hits = [], 0
+            for chunk_id, query in samples:
+                elapsed, found = timed(retrieve_chunks, store, query, top_k, None, mode)
+                latencies.append(elapsed)
+                hits += any(hit.id == chunk_id for hit in found)
+            results[f"{mode}_{kind}"] = dict(summarize(latencies), hit_rate=round(hits / max(1, len(samples)), 3))
+    return results
+
+
+def bench_context_packing(texts: list[str], embedding_function, workdir: Path, queries: int, top_k: int = 5) -> dict:
+    """
+    Answer context pasted as-is vs packed into the token budget
+
+    Every tenth text is ingested twice, as re-uploaded notes are. For each
+    chunking strategy: mean context tokens, tokens saved, merges and
+    duplicates per question, packing time, and how often the context still
+    contains the sentence a lossy query was made from.
+    """
+    from app.config import get_settings
+    from app.db.numpy_store import NumpyVectorStore
+    from app.utils.chunker import chunk_structured_text, estimate_tokens
+    from app.utils.context_packer import naive_context, pack_context
+    from app.utils.parser import chunk_text
+
+    settings = get_settings()
+    strategies = {
+        "fixed": lambda text: [(chunk, {}) for chunk in chunk_text(text, settings.chunk_size, settings.chunk_overlap)],
+        "structured": lambda text: [
+            (chunk.text, {"start_char": chunk.start, "end_char": chunk.end}) for chunk in
+            chunk_structured_text(text, settings.chunk_max_tokens, settings.chunk_overlap_tokens)
+        ]
+    }
+    documents = list(enumerate(texts)) + [(len(texts) + i, texts[i]) for i in range(0, len(texts), 10)]
+    samples = make_sentence_queries(texts, queries)
+
+    results = {"queries": len(samples), "top_k": top_k, "token_budget": settings.context_token_budget}
+    for name, chunker in strategies.items():
+        store = NumpyVectorStore(str(workdir / f"context_{name}"), f"context_{name}", embedding_function)
+        ids, chunks, metadatas = [], [], []
+        for document_id, text in documents:
+            for index, (chunk, extra) in enumerate(chunker(text)):
+                ids.append(f"doc_{document_id}_chunk_{index}")
+                chunks.append(chunk)
+                metadatas.append({"document_id": document_id, "chunk_index": index, **extra})
+        for i in range(0, len(ids), 5000):
+            store.add(ids[i:i + 5000], chunks[i:i + 5000], metadatas[i:i + 5000])
+
+        naive_tokens = packed_tokens = merged = duplicates = naive_hits = packed_hits = 0
+        latencies = []
+        for _, sentence, query in samples:
+            hits = store.search(query, top_k)
+            naive = naive_context(hits)
+            elapsed, packed = timed(pack_context, hits, settings.context_token_budget)
+            latencies.append(elapsed)
+            naive_tokens += estimate_tokens(naive)
+            packed_tokens += packed.tokens
+            merged += packed.merged
+            duplicates += packed.duplicates
+            naive_hits += sentence in " ".join(naive.split())
+            packed_hits += sentence in " ".join(packed.text.split())
+
+        count = max(1, len(samples))
+        results[name] = {
+            "chunks": len(ids),
+            "naive_tokens": round(naive_tokens / count, 1),
+            "packed_tokens": round(packed_tokens / count, 1),
+            "saved_pct": round(100 * (1 - packed_tokens / max(1, naive_tokens)), 1),
+            "merged_per_query": round(merged / count, 2),
+            "duplicates_per_query": round(duplicates / count, 2),
+            "naive_sentence_hit_rate": round(naive_hits / count, 3),
+            "packed_sentence_hit_rate": round(packed_hits / count, 3),
+            "pack": summarize(latencies)
+        }
+    return results
+
+
+def bench_mmr(embedding_function, workdir: Path, queries: list[str], top_k: int = 5, fetch_k: int = 30) -> dict:
+    """
+    Plain top-k vs MMR-diversified retrieval when one document dominates
+
+    One long document of general notes (2000 chunks) sits among 300 short
+    topical ones. Per diversity weight: distinct documents and share of
+    the dominant document in the top_k, mean query similarity of the
+    picks, and retrieval and reranking latency.
+    """
+    from benchmarks.corpus import make_sentence
+    from app.agents.search_agent import diversify, retrieve_chunks
+    from app.db.numpy_store import NumpyVectorStore
+
+    rng = random.Random(19)
+    documents = [[" ".join(make_sentence(rng) for _ in range(4)) for _ in range(2000)]]
+    documents += make_topical_documents(300, 5, seed=23)
+    store = NumpyVectorStore(str(workdir / "mmr"), "mmr", embedding_function)
+    records = [
+        (f"doc_{document_id}_chunk_{index}", chunk, {"document_id": document_id, "chunk_index": index})
+        for document_id, chunks in enumerate(documents)
+        for index, chunk in enumerate(chunks)
+    ]
+    for i in range(0, len(records), 5000):
+        batch = records[i:i + 5000]
+        store.add([r[0] for r in batch], [r[1] for r in batch], [r[2] for r in batch])
+
+    query_embeddings = store.embed(queries)
+    results = {"chunks": store.count(), "queries": len(queries), "fetch_k": fetch_k}
+    for diversity in (0.0, 0.3, 0.5):
+        retrieve_latencies, mmr_latencies = [], []
+        distinct = dominant = relevance = 0.0
+        for query, query_embedding in zip(queries, query_embeddings):
+            if diversity == 0.0:
+                elapsed, hits = timed(retrieve_chunks, store, query, top_k, None, "vector", query_embedding=query_embedding)
+                retrieve_latencies.append(elapsed)
+            else:
+                elapsed, candidates = timed(
+                    retrieve_chunks, store, query, fetch_k, None, "vector",
+                    include_embeddings=True, query_embedding=query_embedding
+                )
+                retrieve_latencies.append(elapsed)
+                elapsed, hits = timed(diversify, candidates, query_embedding, top_k, diversity)
+                mmr_latencies.append(elapsed)
+            owners = [hit.metadata["document_id"] for hit in hits]
+            distinct += len(set(owners))
+            dominant += owners.count(0) / max(1, len(owners))
+            relevance += float(np.mean([hit.score for hit in hits])) if hits else 0.0
+
+        count = max(1, len(queries))
+        name = "plain" if diversity == 0.0 else f"mmr_{diversity}"
+        results[name] = {
+            "distinct_documents": round(distinct / count, 2),
+            "dominant_share": round(dominant / count, 3),
+            "mean_similarity": round(relevance / count, 4),
+            "retrieve": summarize(retrieve_latencies)
+        }
+        if mmr_latencies:
+            results[name]["mmr"] = summarize(mmr_latencies)
+    return results
+
+
+def make_intent_examples(count: int, seed: int = 31) -> list[tuple[str, str]]:
+    """Labelled questions, worded differently from the classifier's seed examples"""
+    from benchmarks.corpus import WORDS, SUBJECTS, NAMES
+
+    rng = random.Random(seed)
+    search = [
+        lambda: f"what do my {rng.choice(SUBJECTS).lower()} notes say about {rng.choice(WORDS)}?",
+        lambda: f"Any documents mentioning the {rng.choice(WORDS)} {rng.choice(WORDS)}?",
+        lambda: f"When is the {rng.choice(WORDS)} {rng.choice(['deadline', 'exam', 'meeting'])} for {rng.choice(SUBJECTS)}?",
+        lambda: f"Summarize the {rng.choice(WORDS)} section of my {rng.choice(SUBJECTS)} notes",
+        lambda: f"What did {rng.choice(NAMES)} say about the {rng.choice(WORDS)}?",
+        lambda: f"Which {rng.choice(WORDS)} tasks are still open?",
+        lambda: f"{rng.choice(SUBJECTS)} {rng.choice(WORDS)} {rng.choice(WORDS)}",
+        lambda: f"How did I set up the {rng.choice(WORDS)} {rng.choice(WORDS)}?",
+    ]
+    general = [
+        "hello!", "hey there", "hi, good afternoon", "thanks a lot", "thank you!", "ok cool",
+        "who made you?", "what are you able to do?", "how do I use this?", "good evening",
+        "see you later", "you are helpful", "how are you doing today?", "tell me something funny",
+        "great, thanks", "morning!", "can you assist me?", "what's going on?", "nice work", "goodbye"
+    ]
+    examples = []
+    for i in range(count):
+        if i % 2:
+            examples.append((rng.choice(general), "GENERAL"))
+        else:
+            examples.append((rng.choice(search)(), "SEARCH"))
+    return examples
+
+
+def bench_intent(embedding_function, workdir: Path, examples: list[tuple[str, str]]) -> dict:
+    """
+    Keyword + LLM routing vs the local intent classifier
+
+    Offline accuracy on labelled questions (overall, and coverage and
+    accuracy of the questions decided locally at several margins), the
+    share of questions that still need the LLM, and route_intent latency
+    with the fake LLM.
+    """
+    from app.agents.intent_classifier import IntentClassifier
+    from app.agents.router import route_intent
+    from app.config import get_settings
+    from app.db.numpy_store import NumpyVectorStore
+
+    settings = get_settings()
+    store = NumpyVectorStore(str(workdir / "intent"), "intent", embedding_function)
+    classifier = IntentClassifier(embedding_function)
+    embeddings = classifier.embed([question for question, _ in examples])
+
+    keywords = ["find", "search", "show me", "what", "where", "which", "list", "tell me about"]
+    keyword_decided = [(q, label) for q, label in examples if any(k in q.lower() for k in keywords)]
+    results = {
+        "examples": len(examples),
+        "keyword": {
+            "llm_share": round(1 - len(keyword_decided) / max(1, len(examples)), 3),
+            "keyword_accuracy": round(
+                sum(label == "SEARCH" for _, label in keyword_decided) / max(1, len(keyword_decided)), 3
+            )
+        },
+        "classifier": {
+            f"margin_{margin}": classifier.evaluate(examples, margin)
+            for margin in (0.0, 0.02, settings.intent_min_margin, 0.1)
+        }
+    }
+
+    latencies = {"route_keyword_llm": [], "route_classifier": [], "route_classifier_with_embedding": []}
+    settings.intent_classifier_enabled = False
+    for question, _ in examples:
+        latencies["route_keyword_llm"].append(timed(route_intent, question)[0])
+    settings.intent_classifier_enabled = True
+    for (question, _), embedding in zip(examples, embeddings):
+        latencies["route_classifier"].append(timed(route_intent, question, store, embedding)[0])
+        latencies["route_classifier_with_embedding"].append(timed(route_intent, question, store)[0])
+    for name, samples in latencies.items():
+        results[name] = summarize(samples)
+    return results
+
+
+def make_queries(count: int, seed: int = 7) -> list[str]:
+    import random
+    from benchmarks.corpus import WORDS, SUBJECTS
+
+    rng = random.Random(seed)
+    return [
+        f"What do my notes say about {rng.choice(SUBJECTS).lower()} {rng.choice(WORDS)} {rng.choice(WORDS)}?"
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and retrieval benchmarks")
+    parser.add_argument("--files", type=int, default=40, help="Corpus size")
+    parser.add_argument("--size-kb", type=float, default=8.0, help="Approximate text per file")
+    parser.add_argument("--process-files", type=int, default=10, help="Files for the process_document benchmark")
+    parser.add_argument("--pdf-pages", type=int, default=300, help="Pages in the parse_pdf benchmark file")
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--vector-chunks", type=int, default=20000, help="Chunks in the vector_backends benchmark")
+    parser.add_argument("--two-stage-documents", type=int, default=2000,
+                        help="Documents (30 chunks each) in the two_stage benchmark")
+    parser.add_argument("--hybrid-chunks", type=int, default=20000, help="Chunks in the hybrid benchmark")
+    parser.add_argument("--repeat", type=int, default=1, help="ingest_folder repetitions")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fake LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=10.0, help="Fake LLM latency jitter")
+    parser.add_argument("--embedding", choices=["hash", "default"], default="hash",
+                        help="hash runs offline; default uses Chroma's ONNX model")
+    parser.add_argument("--llm-cache", action="store_true", help="Leave the LLM cache enabled")
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="Run a subset")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch directory")
+    parser.add_argument("--out", help="Write JSON results to this file")
+    args = parser.parse_args()
+
+    selected = args.only or BENCHMARKS
+    workdir = Path(tempfile.mkdtemp(prefix="pm_bench_"))
+    server, groq_url = start_fake_groq(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms)
+    configure_environment(workdir, groq_url, args.llm_cache)
+
+    try:
+        from app.utils.parser import parse_document
+        from app.services.bulk_ingestion import get_doc_type
+
+        corpus_dir = workdir / "corpus"
+        paths = generate_corpus(str(corpus_dir), args.files, args.size_kb)
+        texts = [parse_document(str(p), get_doc_type(p)) for p in paths]
+        embedding_function = get_embedding_function(args.embedding)
+        collection_name = os.environ["COLLECTION_NAME"]
+
+        results = {}
+        if "chunk_text" in selected:
+            results["chunk_text"] = bench_chunk_text(texts)
+        if "extract_dates" in selected:
+            results["extract_dates"] = bench_extract_dates(texts)
+        if "chunking" in selected:
+            results["chunking"] = bench_chunking(texts, embedding_function, max(args.queries, 100))
+        if "embedding_cache" in selected:
+            results["embedding_cache"] = bench_embedding_cache(texts, embedding_function, workdir)
+        if "embedding_service" in selected:
+            results["embedding_service"] = bench_embedding_service(
+                make_queries(max(args.queries, 200)), args.embedding, workdir
+            )
+        if "parse_pdf" in selected:
+            large_pdf = workdir / "large.pdf"
+            # ~4.5 KB of text per 50-line page
+            write_pdf(large_pdf, make_sections(random.Random(7), args.pdf_pages * 4.5))
+            results["parse_pdf"] = bench_parse_pdf(large_pdf)
+        if "process_document" in selected:
+            vector_store = reset_stores(collection_name, embedding_function)
+            results["process_document"] = bench_process_document(paths[:args.process_files], vector_store)
+        if "ingest_folder" in selected or "search_documents" in selected or "answer_cache" in selected:
+            # search_documents and answer_cache need the full corpus indexed
+            results_ingest = bench_ingest_folder(
+                corpus_dir, len(paths), max(1, args.repeat), collection_name, embedding_function
+            )
+            if "ingest_folder" in selected:
+                results["ingest_folder"] = results_ingest
+        if "search_documents" in selected:
+            from app.db.vector_backend import ChromaVectorStore
+            from app.db.vector_store import get_chroma_client
+            vector_store = ChromaVectorStore(
+                get_chroma_client().get_collection(collection_name, embedding_function=embedding_function),
+                embedding_function
+            )
+            results["search_documents"] = bench_search_documents(vector_store, make_queries(args.queries))
+        if "answer_cache" in selected:
+            from app.db.vector_backend import ChromaVectorStore
+            from app.db.vector_store import get_chroma_client
+            vector_store = ChromaVectorStore(
+                get_chroma_client().get_collection(collection_name, embedding_function=embedding_function),
+                embedding_function
+            )
+            results["answer_cache"] = bench_answer_cache(vector_store, make_queries(40), max(args.queries, 200))
+        if "vector_backends" in selected:
+            results["vector_backends"] = bench_vector_backends(
+                embedding_function, workdir, args.vector_chunks, max(args.queries, 100)
+            )
+        if "two_stage" in selected:
+            results["two_stage"] = bench_two_stage(
+                embedding_function, workdir, args.two_stage_documents, max(args.queries, 200)
+            )
+        if "hybrid" in selected:
+            results["hybrid"] = bench_hybrid(embedding_function, workdir, args.hybrid_chunks, max(args.queries, 200))
+        if "mmr" in selected:
+            results["mmr"] = bench_mmr(embedding_function, workdir, make_queries(max(args.queries, 200)))
+        if "intent" in selected:
+            results["intent"] = bench_intent(embedding_function, workdir, make_intent_examples(max(args.queries, 200)))
+        if "context_packing" in selected:
+            results["context_packing"] = bench_context_packing(
+                texts, embedding_function, workdir, max(args.queries, 200)
+            )
+
+        write_results({
+            "meta": run_metadata({k: v for k, v in vars(args).items() if k not in ("out", "keep")}),
+            "results": results
+        }, args.out)
+    finally:
+        server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from app.utils.chunker import CHARS_PER_TOKEN, chunk_document, chunk_structured_text
+
+WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu".split()
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def random_page(rng: random.Random) -> str:
+    """Paragraphs, Markdown headings (some very long), short lines and lists"""
+    blocks = []
+    for _ in range(rng.randint(1, 10)):
+        kind = rng.random()
+        if kind < 0.15:
+            blocks.append("#" * rng.randint(1, 3) + " " + words(rng, rng.choice([2, 5, 40, 90])))
+        elif kind < 0.3:
+            blocks.append(words(rng, rng.randint(1, 6)))
+        elif kind < 0.4:
+            blocks.append("\n".join(f"- {words(rng, rng.randint(1, 12))}." for _ in range(rng.randint(2, 6))))
+        else:
+            blocks.append(" ".join(
+                words(rng, rng.choice([1, 3, 8, 20, 60, 150])) + rng.choice([".", "!", "?", ""])
+                for _ in range(rng.randint(1, 6))
+            ))
+    return rng.choice(["\n\n", "\n", "\n \n"]).join(blocks)
+
+
+def document_text(pages) -> str:
+    return "".join(f"{text}\n" for _, text in pages)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_chunk_invariants(seed):
+    rng = random.Random(seed)
+    pages = [(number, random_page(rng)) for number in range(1, rng.randint(1, 4) + 1)]
+    max_tokens, overlap_tokens = rng.choice([10, 25, 50, 200]), rng.choice([0, 8, 32])
+    text = document_text(pages)
+    chunks = list(chunk_document(pages, max_tokens, overlap_tokens))
+    covered = bytearray(len(text))
+    for chunk in chunks:
+        # Within the token budget
+        assert len(chunk.text) <= max_tokens * CHARS_PER_TOKEN
+        # Offsets locate the chunk in the joined page text
+        assert text[chunk.start:chunk.end] == chunk.text
+        covered[chunk.start:chunk.end] = b"\1" * (chunk.end - chunk.start)
+    # No text is lost
+    assert all(covered[i] or char.isspace() for i, char in enumerate(text))
+    assert [chunk.start for chunk in chunks] == sorted(chunk.start for chunk in chunks)
+
+
+def test_long_markdown_heading_is_split_within_budget():
+    heading = "# " + " ".join(["word"] * 100)
+    chunks = chunk_structured_text(f"{heading}\n\nBody text follows the heading.", max_tokens=50, overlap_tokens=0)
+    assert all(len(chunk.text) <= 200 for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks).split() == f"{heading} Body text follows the heading.".split()
+
+
+def test_heading_starts_chunk_and_labels_section():
+    text = "Intro paragraph. " * 20 + "\n\n# Grading\n\nHomework is 40% of the grade."
+    chunks = chunk_structured_text(text, max_tokens=100)
+    graded = [chunk for chunk in chunks if chunk.section == "Grading"]
+    assert graded and graded[0].text.startswith("# Grading")
+
+
+def test_short_lines_without_body_pack_together():
+    text = "\n\n".join(f"Item number {i}" for i in range(30))
+    assert len(chunk_structured_text(text, max_tokens=200)) == 1
+
+
+def test_page_numbers_follow_offsets():
+    pages = [(1, "First page sentence."), (2, "Second page sentence.")]
+    chunks = list(chunk_document(pages, max_tokens=6, overlap_tokens=0))
+    assert [chunk.page for chunk in chunks] == [1, 2]
@@ -65,6 +65,17 @@ export interface Insight {
   date: string;
 }
 
+export interface Job {
+  id: string;
+  kind: string;
+  status: 'queued' | 'running' | 'cancelling' | 'completed' | 'failed' | 'cancelled';
+  progress: number;
+  stage?: string;
+  result?: any;
+  error?: string;
+  attempts: number;
+}
+
 export interface GraphNode {
   id: string;
   label: string;
@@ -162,7 +173,16 @@ export const api = {
         throw new Error(`Failed to upload document: ${error}`);
       }
       
-      const result = await response.json();
+      // Processing happens in a background job; wait for it to finish
+      const job = await response.json();
+      console.log('Upload job:', job.id);
+      const finishedJob = await api.waitForJob(job.id);
+      
+      if (finishedJob.status !== 'completed') {
+        throw new Error(`Failed to process document: ${finishedJob.error || 'unknown error'}`);
+      }
+      
+      const result = finishedJob.result;
       console.log('Upload result:', result);
       
       // Map PARA type to category
@@ -188,6 +208,47 @@ export const api = {
     }
   },
 
+  getJob: async (jobId: string): Promise<Job> => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+    if (!response.ok) throw new Error('Failed to fetch job status');
+    return response.json();
+  },
+
+  waitForJob: async (jobId: string, intervalMs = 1000): Promise<Job> => {
+    while (true) {
+      const job = await api.getJob(jobId);
+      if (['completed', 'failed', 'cancelled'].includes(job.status)) return job;
+      await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+  },
+
+  watchJob: (jobId: string, onUpdate: (job: Job) => void): Promise<Job> => {
+    // Follow a job over Server-Sent Events, resolving with the finished job
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`${API_BASE_URL}/jobs/${jobId}/events`);
+      source.addEventListener('progress', (event) => {
+        onUpdate(JSON.parse((event as MessageEvent).data));
+      });
+      source.addEventListener('done', (event) => {
+        const job: Job = JSON.parse((event as MessageEvent).data);
+        source.close();
+        onUpdate(job);
+        resolve(job);
+      });
+      source.onerror = () => {
+        // Fall back to polling if the stream cannot be opened or drops
+        source.close();
+        api.waitForJob(jobId).then(resolve, reject);
+      };
+    });
+  },
+
+  cancelJob: async (jobId: string): Promise<Job> => {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/cancel`, { method: 'POST' });
+    if (!response.ok) throw new Error('Failed to cancel job');
+    return response.json();
+  },
+
   askBrain: async (question: string): Promise<ChatMessage> => {
     const response = await fetch(`${API_BASE_URL}/ask`, {
       method: 'POST',
@@ -238,7 +299,7 @@ export const api = {
     };
   },
 
-  ingestFolder: async (folderPath?: string): Promise<any> => {
+  ingestFolder: async (folderPath?: string, onProgress?: (job: Job) => void): Promise<any> => {
     const formData = new FormData();
     if (folderPath) {
       formData.append('folder_path', folderPath);
@@ -250,7 +311,13 @@ export const api = {
     });
     
     if (!response.ok) throw new Error('Failed to ingest folder');
-    return response.json();
+    const job: Job = await response.json();
+    
+    const finishedJob = await api.watchJob(job.id, onProgress || (() => {}));
+    if (finishedJob.status === 'failed') {
+      throw new Error(`Failed to ingest folder: ${finishedJob.error || 'unknown error'}`);
+    }
+    return finishedJob.result;
   },
 
   previewFolderIngestion: async (folderPath?: string): Promise<any> => {